@@ -8,34 +8,71 @@ import sys
 import ssl
 import time
 import cv2
-import json
 import numpy as np
 from pathlib import Path
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
 from flask_socketio import SocketIO, emit
-from ultralytics import YOLO
 import paho.mqtt.client as mqtt
-from smartcard.System import readers
-from smartcard.Exceptions import NoCardException, CardConnectionException
-import firebase_admin
-from firebase_admin import credentials, db
 import threading
-import math
+import uuid
 import signal
+import socket
 import base64
+import hmac
+import ipaddress
 from datetime import datetime
 import logging
+from pipeline import LatestFrameQueue, StageStats
+from state_store import StateStore
+from frame_hub import FrameHub
+from detector import crear_detector, calentar
+from inference_worker import InferenceWorker
+from overlay import Overlay, cajas_a_metadatos
+from motion_gate import MotionGate
+from governor import PerformanceGovernor
+from write_queue import WriteAheadQueue, aplanar, incremento
+from user_cache import UserCache
+from pin_index import PinIndex, PinRateLimiter
+from mqtt_ingest import MqttIngestor, DeviceTable, dispositivo_de_topic, validar_nivel
+from timeseries import TimeSeriesStore, RESOLUCIONES, DIA
+from forecast import FillForecaster
+from metrics import Metrics, NullMetrics
+from startup import BootSequence
+from server_mode import ServerMode
+from preview_encoder import PreviewEncoder
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from config.config import MQTT_TOPIC, ALLOWED_TARGETS, ALLOWED_STATES
+from config.app_config import Config, LiveConfig
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Ajustes en vivo (confianza, tamaño de inferencia, stride, FPS, calidad JPEG,
+# permanencia y puntos): se releen de config/environment.env al guardarlo y,
+# salvo los puntos, se cambian por POST /api/config, sin reiniciar cámara ni modelo
+ajustes = LiveConfig()
+CONFIG_TOKEN = os.getenv("CONFIG_TOKEN")  # POST /api/config lo exige en X-Config-Token; sin él, solo localhost
+
+# Arranque por etapas: el servidor web sale primero; Firebase, el modelo, la
+# cámara y MQTT se inician en paralelo y marcan cuándo quedan listos
+arranque = BootSequence()
+
+# Histogramas de latencia por etapa (/metrics). Con METRICS=False no se mide
+# ni se envuelve nada: las llamadas quedan como funciones vacías.
+METRICS = os.getenv("METRICS", "True").lower() == "true"
+metricas = Metrics() if METRICS else NullMetrics()
+
 # Crear aplicación Flask
 app = Flask(__name__, template_folder='../frontend/templates', static_folder='../frontend/static')
 app.config['SECRET_KEY'] = 'reciclaje_inteligente_2024'
 
-# Configurar SocketIO
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+# Configurar SocketIO: 'threading' (Werkzeug) o cooperativo ('eventlet' / 'gevent')
+servidor = ServerMode(Config.WEBSOCKET_ASYNC_MODE)
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=servidor.modo)
+# Cámara, NFC y MQTT emiten desde sus hilos; en modo cooperativo lo entrega el hub
+socketio.emit = servidor.puente_emit(socketio)
 
 # ---------- CONFIG MQTT ----------
 MQTT_BROKER = os.getenv("MQTT_BROKER", "2e139bb9a6c5438b89c85c91b8cbd53f.s1.eu.hivemq.cloud")
@@ -43,7 +80,9 @@ MQTT_PORT = int(os.getenv("MQTT_PORT", "8883"))
 MQTT_USER = os.getenv("MQTT_USER", "ramsi")
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD", "Erikram2025")
 MQTT_MATERIAL_TOPIC = os.getenv("MQTT_MATERIAL_TOPIC", "material/detectado")
-MQTT_NIVEL_TOPIC = "reciclaje/esp32-01/nivel"
+MQTT_NIVEL_TOPIC = MQTT_TOPIC  # reciclaje/+/nivel: todos los ESP32 del sitio
+# ESP32 de este kiosco: sus contenedores se reflejan también en contenedor/<target>
+MQTT_DEVICE_LOCAL = os.getenv("MQTT_DEVICE_LOCAL", "esp32-01")
 
 # Cliente MQTT
 mqtt_client = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
@@ -55,21 +94,74 @@ mqtt_client.tls_insecure_set(True)
 SERVICE_ACCOUNT_PATH = "config/resiclaje-39011-firebase-adminsdk-fbsvc-433ec62b6c.json"
 DATABASE_URL = "https://resiclaje-39011-default-rtdb.firebaseio.com"
 
-try:
+
+def es_local(direccion):
+    """True si la petición viene de la misma máquina (el navegador del kiosco)"""
+    try:
+        return ipaddress.ip_address(direccion or '').is_loopback
+    except ValueError:
+        return False
+
+
+def inicializar_firebase():
+    """Importa e inicializa el SDK de Firebase (segundos en la Pi: va en segundo plano)"""
+    import firebase_admin
+    from firebase_admin import credentials
+
     cred = credentials.Certificate(SERVICE_ACCOUNT_PATH)
     firebase_admin.initialize_app(cred, {'databaseURL': DATABASE_URL})
-
-    nfc_index_ref = db.reference('nfc_index')
-    usuarios_ref = db.reference('usuarios')
-    contenedor_ref = db.reference('contenedor')
     logger.info("✅ Firebase inicializado correctamente")
-except Exception as e:
-    logger.error(f"❌ Error inicializando Firebase: {e}")
+
+
+def referencia_firebase(ruta='/'):
+    """db.reference() una vez que Firebase terminó de arrancar"""
+    if not arranque.esperar('firebase', timeout=30):
+        raise RuntimeError("Firebase no está inicializado")
+    from firebase_admin import db
+    return db.reference(ruta)
+
+
+# ---------- COLA LOCAL DE ESCRITURAS ----------
+# Premios y contenedores se confirman en SQLite y se replican a Firebase en lotes
+DATA_DIR = Path(os.getenv("DATA_DIR", Path(__file__).resolve().parent.parent / "data"))
+DATA_DIR.mkdir(parents=True, exist_ok=True)
+
+
+# Cada llamada de red a Firebase se mide como firebase_<método>
+referencia_db = metricas.firebase(referencia_firebase)
+
+
+def aplicar_en_firebase(cambios):
+    """Aplica un lote de la cola como una sola actualización multi-ruta"""
+    referencia_db('/').update(cambios)
+
+
+def lote_confirmado(cambios):
+    """¿Llegó a Firebase un lote cuya respuesta se perdió? (los incrementos no se repiten)
+
+    La actualización multi-ruta es atómica: si existe un asiento del libro de
+    puntos del lote, existe todo el lote.
+    """
+    asientos = [ruta for ruta in cambios if ruta.startswith('puntos_ledger/')]
+    if not asientos:
+        return False
+    return referencia_db(asientos[0]).get() is not None
+
+
+outbox = WriteAheadQueue(DATA_DIR / 'outbox.db', aplicar_en_firebase, confirmado=lote_confirmado,
+                         observar=lambda tipo, segundos: metricas.observar(f"outbox_{tipo}", segundos))
+
+# Índice NFC, índice de PIN y perfiles en memoria, al día mediante listeners de Firebase
+user_cache = UserCache(referencia_db, pines=PinIndex(app.config['SECRET_KEY']))
+
+# Búsqueda por PIN: espera creciente tras fallos seguidos por cliente
+pin_limiter = PinRateLimiter()
 
 GET_UID_APDU = [0xFF, 0xCA, 0x00, 0x00, 0x00]
 
 # ---------- ESTADO GLOBAL ----------
-app_state = {
+# Lecturas sin bloqueo; las escrituras pasan por update()/transicion()
+app_state = StateStore({
     'material_detectado': None,
     'deteccion_activa': None,
     'inicio_deteccion': None,
@@ -77,6 +169,7 @@ app_state = {
     'usuario_actual': None,
     'puntos_ganados': 0,
     'fps': 0,
+    'fps_etapas': {},
     'camera_active': True,
     'nfc_active': True,
     'mqtt_connected': False,
@@ -90,9 +183,7 @@ app_state = {
     'nfc_linking_mode': False,
     'nfc_linking_user_id': None,
     'nfc_linking_user_name': None
-}
-
-lock = threading.Lock()
+})
 
 # ---------- COLORES Y CONFIGURACIÓN ----------
 COLORS = {
@@ -106,80 +197,97 @@ COLORS = {
     'aluminio': '#9E9E9E'
 }
 
-TARGET_W, TARGET_H = 320, 480
+
+# Motor de inferencia: 'onnxruntime' (directo, sin torch) o 'ultralytics'
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "onnxruntime")
+
+# YOLO en un proceso aparte (otro GIL, otros núcleos); los frames pasan por memoria compartida
+INFERENCE_WORKER = os.getenv("INFERENCE_WORKER", "True").lower() == "true"
 
 
 # ---------- FUNCIONES MQTT ----------
 def on_mqtt_connect(client, userdata, connect_flags, reason_code, properties):
     if reason_code == 0:
         logger.info("[MQTT] ✅ Conectado al broker")
+        arranque.marcar('mqtt')
         client.subscribe(MQTT_NIVEL_TOPIC, qos=1)
         logger.info(f"[MQTT] 📥 Suscrito a: {MQTT_NIVEL_TOPIC}")
-        with lock:
-            app_state['mqtt_connected'] = True
+        app_state.update(mqtt_connected=True)
         socketio.emit('mqtt_status', {'connected': True})
     else:
         logger.error(f"[MQTT] ❌ Error de conexión: {reason_code}")
-        with lock:
-            app_state['mqtt_connected'] = False
+        app_state.update(mqtt_connected=False)
         socketio.emit('mqtt_status', {'connected': False})
 
 
 def on_mqtt_message(client, userdata, msg):
+    """Hilo de red de paho: solo encola, la ingesta decodifica y escribe"""
+    ingestor_niveles.recibir(msg.topic, msg.payload)
+
+
+def decodificar_nivel(topic, data):
+    """Mensaje de un ESP32 -> (ruta en Firebase, datos del contenedor)"""
+    device_id = dispositivo_de_topic(MQTT_NIVEL_TOPIC, topic)
+    if device_id is None:
+        return None
+
     try:
-        payload = msg.payload.decode('utf-8')
-        topic = msg.topic
+        target, firebase_data = validar_nivel(data, device_id, ALLOWED_TARGETS, ALLOWED_STATES)
+    except ValueError:
+        dispositivos.invalido(device_id)
+        raise
 
-        logger.info(f"[MQTT] 📨 Mensaje recibido en {topic}")
-        data = json.loads(payload)
+    dispositivos.registrar(device_id, target, firebase_data)
+    serie = f"{device_id}/{target}"
+    historial.agregar(serie, firebase_data['updatedAt'],
+                      firebase_data['distance_cm'], firebase_data['porcentaje'], firebase_data['estado'])
+    pronostico.observar(serie, firebase_data['updatedAt'], firebase_data['porcentaje'])
+    return f"contenedores/{device_id}/{target}", firebase_data
 
-        if topic == MQTT_NIVEL_TOPIC:
-            handle_nivel_update(data)
 
-    except json.JSONDecodeError:
-        logger.error(f"[MQTT] ❌ Error al parsear JSON: {msg.payload}")
-    except Exception as e:
-        logger.error(f"[MQTT] ❌ Error procesando mensaje: {e}")
+def escribir_niveles(lote):
+    """Un solo evento multi-ruta por ventana con los contenedores que cambiaron"""
+    cambios = {}
+    locales = {}
+    for ruta, firebase_data in lote.items():
+        cambios.update(aplanar(ruta, firebase_data))
+        _, device_id, target = ruta.split('/')
+        if device_id == MQTT_DEVICE_LOCAL:
+            cambios.update(aplanar(f"contenedor/{target}", firebase_data))
+            locales[target] = firebase_data
+    outbox.encolar('contenedor', '', cambios)
 
+    # Actualizar estado local
+    for target, firebase_data in locales.items():
+        app_state.actualizar_en('contenedores', target, firebase_data)
 
-def handle_nivel_update(data):
-    try:
-        target = data.get('target')
-        device_id = data.get('deviceId')
-        distance_cm = data.get('distance_cm')
-        percent = data.get('percent')
-        state = data.get('state')
-        ts = data.get('ts')
-
-        if not target:
-            logger.error("[Firebase] ❌ Campo 'target' no encontrado")
-            return
+    logger.info(f"[Firebase] ✅ Encolados {len(lote)} contenedores")
 
-        firebase_data = {
-            'deviceId': device_id,
-            'distance_cm': round(distance_cm, 3) if distance_cm else 0,
-            'estado': state,
-            'porcentaje': percent,
-            'timestamp': ts,
-            'updatedAt': int(time.time() * 1000)
-        }
 
-        contenedor_ref.child(target).update(firebase_data)
+# Último estado de cada ESP32 de la flota
+dispositivos = DeviceTable()
 
-        # Actualizar estado local y notificar frontend
-        with lock:
-            app_state['contenedores'][target] = firebase_data
+# Historial de cada lectura (antes de agrupar), con resúmenes por minuto/hora/día
+historial = TimeSeriesStore(DATA_DIR / 'historial.db')
 
-        # Comentado: Ya no se muestra en el frontend
-        # socketio.emit('contenedor_update', {
-        #     'target': target,
-        #     'data': firebase_data
-        # })
+# Tasa de llenado y tiempo hasta "Lleno" por contenedor, actualizados con cada lectura
+pronostico = FillForecaster()
+UMBRAL_LLENO = 70  # El firmware marca "Lleno" desde 70 %
 
-        logger.info(f"[Firebase] ✅ Actualizado: contenedor/{target}")
 
-    except Exception as e:
-        logger.error(f"[Firebase] ❌ Error guardando datos: {e}")
+def precargar_pronostico(dias=7):
+    """Reproduce las lecturas crudas guardadas para no arrancar el pronóstico en frío"""
+    hasta = int(time.time() * 1000)
+    for serie in historial.series():
+        _, puntos = historial.consultar(serie, hasta - dias * DIA, hasta, 'raw', max_puntos=10000)
+        for punto in puntos:
+            pronostico.observar(serie, punto['t'], punto['porcentaje'])
+    logger.info(f"[HIST] 📈 Pronóstico precargado con {len(pronostico)} contenedores")
+
+# Niveles agrupados por contenedor: una escritura por ventana de 1 s
+ingestor_niveles = MqttIngestor(decodificar_nivel, escribir_niveles,
+                                ventana=float(os.getenv("MQTT_VENTANA", "1.0")),
+                                observar=lambda segundos: metricas.observar('mqtt_ingesta', segundos))
 
 
 def setup_mqtt():
@@ -188,7 +296,8 @@ def setup_mqtt():
 
     logger.info("[MQTT] 🔗 Intentando conectar...")
     try:
-        mqtt_client.connect(MQTT_BROKER, MQTT_PORT)
+        # Sin bloquear el arranque: el handshake TLS corre en el hilo de paho
+        mqtt_client.connect_async(MQTT_BROKER, MQTT_PORT)
         mqtt_client.loop_start()
     except Exception as e:
         logger.error(f"[MQTT] ❌ Error conectando: {e}")
@@ -197,6 +306,7 @@ def setup_mqtt():
 # ---------- FUNCIONES NFC ----------
 def get_reader():
     try:
+        from smartcard.System import readers
         r = readers()
         if not r:
             raise RuntimeError("No se detectaron lectores PC/SC.")
@@ -212,24 +322,172 @@ def bytes_to_hex_str(data_bytes):
 
 def buscar_usuario_por_uid(uid_hex):
     try:
-        mapping = nfc_index_ref.get() or {}
-        user_id = mapping.get(uid_hex.upper())
-        if not user_id:
-            return None, None
-        user = usuarios_ref.child(user_id).get()
-        return user_id, user
+        with metricas.medir('nfc_busqueda'):
+            return user_cache.buscar(uid_hex)
     except Exception as e:
         logger.error(f"[NFC] Error buscando usuario: {e}")
         return None, None
 
 
+def salir_vinculacion(estado, user_id=None):
+    """Transición: sale del modo vinculación (si sigue siendo para `user_id`)"""
+    if user_id is not None and estado['nfc_linking_user_id'] != user_id:
+        return
+    estado['nfc_linking_mode'] = False
+    estado['nfc_linking_user_id'] = None
+    estado['nfc_linking_user_name'] = None
+
+
+def reclamar_material(estado):
+    """Transición: toma el material pendiente para premiarlo (solo una vez)"""
+    material = estado['material_detectado']
+    estado['material_detectado'] = None
+    return material
+
+
+def devolver_material(estado, material):
+    """Transición: repone el material si el premio no se pudo guardar"""
+    if estado['material_detectado'] is None:
+        estado['material_detectado'] = material
+
+
+def registrar_premio(estado, usuario_actual, puntos):
+    """Transición: refleja un premio ya guardado en el estado local"""
+    stats = estado['stats']
+    estado['usuario_actual'] = usuario_actual
+    estado['puntos_ganados'] = puntos
+    estado['stats'] = {
+        **stats,
+        'puntos_totales': stats['puntos_totales'] + puntos,
+        'materiales_hoy': stats['materiales_hoy'] + 1
+    }
+
+
+@metricas.cronometrar('nfc_vinculacion')
+def vincular_llavero(uid, user_id, user_name):
+    """Vincula el UID leído al usuario en modo vinculación"""
+    logger.info(f"[NFC-LINK] Vinculando UID {uid} a usuario {user_name}")
+
+    try:
+        # Lecturas previas desde la caché local (sin ida y vuelta a Firebase)
+        uid_clave = uid.upper()
+        existing_user_id_in_index = user_cache.user_id_por_uid(uid_clave)
+
+        if existing_user_id_in_index and existing_user_id_in_index != user_id:
+            logger.warning(f"[NFC-LINK] UID {uid} ya está en uso por otro usuario")
+            socketio.emit('nfc_link_error', {
+                'message': 'Este llavero ya está vinculado a otro usuario'
+            })
+            return
+
+        user_data = user_cache.perfil(user_id)
+        old_uid = user_data.get('usuario_nfcUid') if user_data else None
+
+        # Una sola actualización multi-ruta: o se aplican todas o ninguna,
+        # así no quedan usuarios a medio vincular si falla la red
+        cambios = {
+            f"usuarios/{user_id}/usuario_nfcUid": uid,
+            f"nfc_index/{uid_clave}": user_id
+        }
+        if old_uid and old_uid.upper() != uid_clave:
+            cambios[f"nfc_index/{old_uid.upper()}"] = None
+
+        aplicar_en_firebase(cambios)
+        user_cache.vincular(uid, user_id, old_uid)
+
+        logger.info(f"[NFC-LINK] ✅ Vinculación exitosa: {user_name} -> {uid}")
+
+        # Salir del modo vinculación (si no se canceló mientras tanto)
+        app_state.transicion(lambda estado: salir_vinculacion(estado, user_id))
+
+        # Notificar éxito
+        socketio.emit('nfc_link_success', {
+            'userId': user_id,
+            'userName': user_name,
+            'nfcUid': uid,
+            'timestamp': datetime.now().isoformat()
+        })
+
+    except Exception as e:
+        logger.error(f"[NFC-LINK] Error vinculando: {e}")
+        socketio.emit('nfc_link_error', {
+            'message': 'Error interno al vincular llavero'
+        })
+
+
+@metricas.cronometrar('nfc_premio')
+def procesar_reciclaje(uid):
+    """Premia al dueño de la tarjeta por el material pendiente"""
+    user_id, user = buscar_usuario_por_uid(uid)
+
+    if not user:
+        logger.warning("[DB] UID no registrado")
+        socketio.emit('nfc_error', {'message': 'Tarjeta no registrada'})
+        return
+
+    nombre = user.get('usuario_nombre', 'Sin nombre')
+    logger.info(f"[DB] Usuario: {nombre}")
+
+    material = app_state.transicion(reclamar_material)
+    if not material:
+        return
+
+    # Calcular puntos
+    puntos = ajustes.PUNTOS_PLASTICO if material == "plastico" else ajustes.PUNTOS_ALUMINIO
+    puntos_actuales = user.get("usuario_puntos", 0)
+    nuevos_puntos = puntos_actuales + puntos
+
+    # Asiento en el libro de puntos + incremento en el servidor, en la misma
+    # actualización atómica: premios simultáneos (otros kioscos, la app) se
+    # suman en vez de pisarse. La cola junta los incrementos de cada usuario.
+    clave = uuid.uuid4().hex
+    try:
+        outbox.encolar('puntos', '', {
+            f"puntos_ledger/{user_id}/{clave}": {
+                'puntos': puntos,
+                'material': material,
+                'timestamp': int(time.time() * 1000)
+            },
+            f"usuarios/{user_id}/usuario_puntos": incremento(puntos)
+        }, clave=clave)
+    except Exception:
+        app_state.transicion(lambda estado: devolver_material(estado, material))
+        raise
+
+    # El siguiente toque debe ver los puntos nuevos aunque Firebase aún no los
+    # tenga; el listener traerá después el saldo real del servidor
+    user_cache.actualizar_perfil(user_id, {"usuario_puntos": nuevos_puntos})
+
+    # Actualizar estado local
+    usuario_actual = {
+        'id': user_id,
+        'nombre': nombre,
+        'puntos_anteriores': puntos_actuales,
+        'puntos_nuevos': nuevos_puntos,
+        'puntos_ganados': puntos
+    }
+    app_state.transicion(lambda estado: registrar_premio(estado, usuario_actual, puntos))
+
+    # Notificar al frontend
+    socketio.emit('material_procesado', {
+        'material': material,
+        'usuario': usuario_actual,
+        'puntos': puntos,
+        'timestamp': datetime.now().isoformat()
+    })
+
+    logger.info(f"[PROCESO] ✅ {nombre} ganó {puntos} puntos por {material}")
+
+
 def loop_nfc():
     """Thread para manejo de NFC"""
+    from smartcard.Exceptions import NoCardException, CardConnectionException
+
     lector = get_reader()
     if not lector:
         logger.warning("[NFC] ⚠️ Lector NFC no disponible - Modo simulación activado")
-        with lock:
-            app_state['nfc_active'] = False
+        app_state.update(nfc_active=False)
+        arranque.marcar('nfc', error="sin lector PC/SC")
 
         # Sin lector físico, solo esperar sin generar nada
         while True:
@@ -241,126 +499,32 @@ def loop_nfc():
     conn = lector.createConnection()
     last_uid = None
     logger.info("[NFC] ✅ Esperando tarjetas...")
+    arranque.marcar('nfc')
 
     while app_state['nfc_active']:
         try:
             conn.connect()
+            inicio_lectura = time.perf_counter()
             data, sw1, sw2 = conn.transmit(GET_UID_APDU)
+            metricas.observar('nfc_transmit', time.perf_counter() - inicio_lectura)
 
             if sw1 == 0x90 and sw2 == 0x00 and data:
                 uid = bytes_to_hex_str(data)
                 if uid != last_uid:
                     logger.info(f"[NFC] UID detectado: {uid}")
 
-                    with lock:
-                        # Modo vinculación NFC
-                        if app_state['nfc_linking_mode']:
-                            logger.info(
-                                f"[NFC-LINK] Vinculando UID {uid} a usuario {app_state['nfc_linking_user_name']}")
-
-                            try:
-                                # Actualizar usuario en Firebase
-                                usuarios_ref = db.reference('usuarios')
-                                user_id = app_state['nfc_linking_user_id']
-
-                                # Verificar si el UID ya está en uso consultando nfc_index
-                                uid_en_uso = False
-                                existing_user_id_in_index = nfc_index_ref.child(uid.upper()).get()
-
-                                if existing_user_id_in_index and existing_user_id_in_index != user_id:
-                                    uid_en_uso = True
-
-                                if uid_en_uso:
-                                    logger.warning(f"[NFC-LINK] UID {uid} ya está en uso por otro usuario")
-                                    socketio.emit('nfc_link_error', {
-                                        'message': 'Este llavero ya está vinculado a otro usuario'
-                                    })
-                                else:
-                                    # Obtener el UID anterior del usuario si existe
-                                    user_data = usuarios_ref.child(user_id).get()
-                                    old_uid = user_data.get('usuario_nfcUid') if user_data else None
-
-                                    # Actualizar usuario con nuevo UID
-                                    usuarios_ref.child(user_id).update({
-                                        "usuario_nfcUid": uid
-                                    })
-
-                                    # Actualizar nfc_index en la colección raíz
-                                    # Eliminar el UID anterior del índice si existe
-                                    if old_uid and old_uid != uid:
-                                        nfc_index_ref.child(old_uid).delete()
-
-                                    # Agregar el nuevo UID al índice
-                                    nfc_index_ref.child(uid.upper()).set(user_id)
-
-                                    logger.info(
-                                        f"[NFC-LINK] ✅ Vinculación exitosa: {app_state['nfc_linking_user_name']} -> {uid}")
-
-                                    # Notificar éxito
-                                    socketio.emit('nfc_link_success', {
-                                        'userId': user_id,
-                                        'userName': app_state['nfc_linking_user_name'],
-                                        'nfcUid': uid,
-                                        'timestamp': datetime.now().isoformat()
-                                    })
-
-                                    # Salir del modo vinculación
-                                    app_state['nfc_linking_mode'] = False
-                                    app_state['nfc_linking_user_id'] = None
-                                    app_state['nfc_linking_user_name'] = None
-
-                            except Exception as e:
-                                logger.error(f"[NFC-LINK] Error vinculando: {e}")
-                                socketio.emit('nfc_link_error', {
-                                    'message': 'Error interno al vincular llavero'
-                                })
-
-                        # Modo normal (reciclaje)
-                        else:
-                            user_id, user = buscar_usuario_por_uid(uid)
-
-                            if user:
-                                nombre = user.get('usuario_nombre', 'Sin nombre')
-                                logger.info(f"[DB] Usuario: {nombre}")
-
-                                if app_state['material_detectado']:
-                                    # Calcular puntos
-                                    puntos = 3 if app_state['material_detectado'] == "plastico" else 4
-                                    puntos_actuales = user.get("usuario_puntos", 0)
-                                    nuevos_puntos = puntos_actuales + puntos
-
-                                    # Actualizar en Firebase
-                                    usuarios_ref.child(user_id).update({"usuario_puntos": nuevos_puntos})
-
-                                    # Actualizar estado local
-                                    app_state['usuario_actual'] = {
-                                        'id': user_id,
-                                        'nombre': nombre,
-                                        'puntos_anteriores': puntos_actuales,
-                                        'puntos_nuevos': nuevos_puntos,
-                                        'puntos_ganados': puntos
-                                    }
-                                    app_state['puntos_ganados'] = puntos
-                                    app_state['stats']['puntos_totales'] += puntos
-                                    app_state['stats']['materiales_hoy'] += 1
-
-                                    # Notificar al frontend
-                                    socketio.emit('material_procesado', {
-                                        'material': app_state['material_detectado'],
-                                        'usuario': app_state['usuario_actual'],
-                                        'puntos': puntos,
-                                        'timestamp': datetime.now().isoformat()
-                                    })
-
-                                    # Limpiar estado
-                                    app_state['material_detectado'] = None
-
-                                    logger.info(
-                                        f"[PROCESO] ✅ {nombre} ganó {puntos} puntos por {app_state['material_detectado']}")
-                            else:
-                                logger.warning("[DB] UID no registrado")
-                                socketio.emit('nfc_error', {'message': 'Tarjeta no registrada'})
+                    estado = app_state.snapshot()
+
+                    # Modo vinculación NFC
+                    if estado['nfc_linking_mode']:
+                        vincular_llavero(uid, estado['nfc_linking_user_id'], estado['nfc_linking_user_name'])
+
+                    # Modo normal (reciclaje)
+                    else:
+                        procesar_reciclaje(uid)
 
+                    # Toque completo: lectura -> búsqueda -> premio/vinculación
+                    metricas.observar('nfc_total', time.perf_counter() - inicio_lectura)
                     last_uid = uid
             else:
                 last_uid = None
@@ -377,137 +541,401 @@ def loop_nfc():
 
 
 # ---------- FUNCIONES YOLO ----------
-def frame_to_base64(frame):
-    """Convierte frame de OpenCV a base64 para envío por WebSocket"""
-    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
-    frame_base64 = base64.b64encode(buffer).decode('utf-8')
+# Codificador de la vista previa: reduce al tamaño de la pantalla del kiosco
+# (PREVIEW_WIDTH x PREVIEW_HEIGHT, 0 = nativo) antes de codificar.
+# PREVIEW_ENCODER: 'auto' (simplejpeg / PyTurboJPEG si están), 'simplejpeg', 'turbojpeg' u 'opencv'
+preview_encoder = PreviewEncoder((Config.PREVIEW_WIDTH, Config.PREVIEW_HEIGHT),
+                                 backend=os.getenv("PREVIEW_ENCODER", "auto"))
+
+
+@metricas.cronometrar('jpeg')
+def codificar_preview(frame, resolucion='alta'):
+    """JPEG de la vista previa en un escalón; calidad y escala según el gobernador"""
+    return preview_encoder.codificar(frame, resolucion, governor.ajustes['calidad_jpeg'],
+                                     governor.ajustes['escala_preview'])
+
+
+def jpeg_to_data_url(jpeg):
+    """Envuelve un JPEG en data URL base64 (transporte legado)"""
+    frame_base64 = base64.b64encode(jpeg).decode('utf-8')
     return f"data:image/jpeg;base64,{frame_base64}"
 
 
-def loop_yolo():
-    """Thread principal para detección YOLO y cámara"""
+def cargar_modelo():
+    """Carga el modelo YOLO si existe"""
     weights = Path("../modelo/best.onnx")
-    model = None
 
-    if weights.exists():
-        try:
-            model = YOLO(str(weights), task="detect")
-            logger.info("✅ Modelo YOLO cargado")
-        except Exception as e:
-            logger.error(f"❌ Error cargando modelo YOLO: {e}")
-            model = None
-    else:
+    if not weights.exists():
         logger.warning(f"⚠️ Modelo YOLO no encontrado: {weights.resolve()}")
         logger.info("📹 Continuando solo con cámara (sin detección)")
+        return None
 
-    logger.info("📷 Intentando abrir cámara...")
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        logger.error("❌ No se pudo abrir la cámara")
-        with lock:
-            app_state['camera_active'] = False
+    try:
+        if INFERENCE_WORKER:
+            model = InferenceWorker(weights.resolve(), backend=INFERENCE_BACKEND,
+                                    imgsz=ajustes.YOLO_IMG_SIZE, conf=ajustes.YOLO_CONFIDENCE)
+            model.start()
+        else:
+            model = crear_detector(weights, backend=INFERENCE_BACKEND,
+                                   imgsz=ajustes.YOLO_IMG_SIZE, conf=ajustes.YOLO_CONFIDENCE)
+            logger.info("✅ Modelo YOLO cargado")
+        return model
+    except Exception as e:
+        logger.error(f"❌ Error cargando modelo YOLO: {e}")
+        return None
+
+
+def preparar_modelo():
+    """Carga el modelo y lo calienta con frames vacíos antes de ponerlo en línea"""
+    model = cargar_modelo()
+    if isinstance(model, InferenceWorker):
+        # El proceso hijo carga y calienta el modelo por su cuenta
+        if not model.esperar_listo(timeout=model.timeout_carga):
+            model.stop()
+            raise RuntimeError(f"el proceso de inferencia no arrancó: {model.ultimo_error}")
+        duraciones = model.calentamiento
+    elif model is not None:
+        duraciones = calentar(model)
+    if model is not None:
+        logger.info(f"🔥 Modelo calentado: primera pasada {duraciones[0] * 1000:.0f} ms, "
+                    f"luego {duraciones[-1] * 1000:.0f} ms")
+    return model
+
+
+# ---------- PIPELINE DE CÁMARA ----------
+# Captura -> (último frame) -> Inferencia -> (últimas cajas) -> Codificación/Envío
+# Cada etapa corre en su propio hilo; una etapa lenta descarta frames viejos
+# en lugar de encolarlos, así la vista previa no depende de la velocidad de YOLO.
+# Transporte de la vista previa:
+#   'binary' -> JPEG crudo como adjunto binario de Socket.IO en 'camera_frame'
+#   'mjpeg'  -> solo la ruta /video_feed (multipart/x-mixed-replace)
+#   'base64' -> data URL dentro del JSON (transporte legado)
+# En todos los modos los metadatos viajan en 'camera_meta', por cliente y al ritmo de sus frames.
+PREVIEW_TRANSPORT = os.getenv("PREVIEW_TRANSPORT", "binary")
+
+# Dibujo de detecciones:
+#   'servidor' -> cajas dibujadas en el JPEG
+#   'cliente'  -> cajas como metadatos en 'camera_meta'; app.js las pinta en un canvas
+OVERLAY_MODE = os.getenv("OVERLAY_MODE", "servidor")
+overlay = Overlay(COLORS)
+
+# Compuerta de movimiento: con la escena quieta y vacía no se corre YOLO
+MOTION_GATE = os.getenv("MOTION_GATE", "True").lower() == "true"
+motion_gate = MotionGate() if MOTION_GATE else None
+
+frames_captura = LatestFrameQueue('captura')
+detecciones = LatestFrameQueue('detecciones')
+jpeg_preview = LatestFrameQueue('jpeg')
+
+stats_etapas = {
+    'captura': StageStats('captura'),
+    'inferencia': StageStats('inferencia'),
+    'codificacion': StageStats('codificacion')
+}
+
+# Gobernador: FPS de captura, stride de inferencia, calidad JPEG y escala de la
+# vista previa según CPU, temperatura del SoC y latencia de inferencia
+GOVERNOR = os.getenv("GOVERNOR", "True").lower() == "true"
+
+
+def limites_gobernador():
+    """Los ajustes en vivo son el mejor nivel del gobernador; el peor baja desde ahí"""
+    fps, stride, calidad = ajustes.CAMERA_FPS, ajustes.INFERENCE_STRIDE, ajustes.JPEG_QUALITY
+    return {
+        'fps': (min(10, fps), fps),
+        'stride': (stride, max(4, stride)),
+        'calidad': (min(50, calidad), calidad)
+    }
+
+
+governor = PerformanceGovernor(latencia_inferencia=lambda: stats_etapas['inferencia'].latencia_ms,
+                               **limites_gobernador())
+
+
+@metricas.cronometrar('emision_frame')
+def emitir_frame(sid, jpeg, meta, callback):
+    """Entrega un frame y sus metadatos a un solo cliente pidiendo confirmación (ack)"""
+    if jpeg is None:
+        # Modo mjpeg: el video va por /video_feed; el ack lo da camera_meta
+        socketio.emit('camera_meta', meta, to=sid, callback=callback)
         return
+    if meta is not None:
+        socketio.emit('camera_meta', {**meta, 'bytes': len(jpeg)}, to=sid)
+    datos = jpeg if PREVIEW_TRANSPORT == 'binary' else {'frame': jpeg_to_data_url(jpeg)}
+    socketio.emit('camera_frame', datos, to=sid, callback=callback)
 
-    logger.info("✅ Cámara abierta correctamente")
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
 
-    prev_time = time.time()
-    frame_count = 0
-    logger.info("🎥 Iniciando bucle de cámara...")
+# Codifica una vez por resolución y entrega a cada cliente solo el frame más nuevo
+preview_hub = FrameHub(codificar_preview, emitir_frame, fps_max=ajustes.PREVIEW_FPS)
+
+
+def aplicar_ajustes(cambios):
+    """Lleva los ajustes que cambiaron a las etapas ya en marcha"""
+    if cambios.keys() & {'CAMERA_FPS', 'INFERENCE_STRIDE', 'JPEG_QUALITY'}:
+        governor.configurar(**limites_gobernador())
+    if 'PREVIEW_FPS' in cambios:
+        preview_hub.limitar_fps(ajustes.PREVIEW_FPS)
+    if cambios.keys() & {'YOLO_CONFIDENCE', 'YOLO_IMG_SIZE'}:
+        modelo = arranque.resultado('modelo')
+        if modelo is not None:
+            # InferenceWorker espera el lock de una inferencia en curso: fuera del hub
+            servidor.en_hilo(modelo.ajustar, conf=cambios.get('YOLO_CONFIDENCE'),
+                             imgsz=cambios.get('YOLO_IMG_SIZE'))
+    # Permanencia y puntos se leen de `ajustes` en cada uso
+
+
+ajustes.suscribir(aplicar_ajustes)
+
+metricas.indicador('fps', 'FPS por etapa del pipeline de cámara',
+                   lambda: {nombre: round(st.fps, 2) for nombre, st in stats_etapas.items()})
+metricas.indicador('outbox_pendientes', 'Eventos esperando replicarse a Firebase', outbox.pendientes)
+metricas.indicador('mqtt_tasa', 'Mensajes MQTT de nivel por segundo', lambda: ingestor_niveles.tasa)
+metricas.indicador('gobernador_nivel', 'Nivel de degradación del gobernador', lambda: governor.nivel)
+metricas.indicador('arranque_segundos', 'Segundos desde el inicio del proceso hasta cada subsistema listo',
+                   arranque.tiempos)
+
+
+def loop_captura(cap):
+    """Etapa 1: lee la cámara y publica siempre el frame más reciente"""
+    stats = stats_etapas['captura']
+    siguiente = 0.0
 
     while app_state['camera_active']:
-        ret, frame = cap.read()
-        if not ret:
+        # grab() vacía el buffer del driver; solo se decodifica al ritmo pedido
+        if not cap.grab():
             logger.error("❌ Error leyendo frame de cámara")
             break
 
+        ahora = time.monotonic()
+        if ahora < siguiente:
+            continue
+        siguiente = ahora + 1.0 / governor.ajustes['fps_captura']
+
+        inicio_captura = time.perf_counter()
+        ret, frame = cap.retrieve()
+        if not ret:
+            continue
+        metricas.observar('captura', time.perf_counter() - inicio_captura)
+
+        frames_captura.put(frame)
+        if stats.frames == 0:
+            arranque.marcar('camara')
+        stats.tick()
+
+    frames_captura.close()
+    cap.release()
+    logger.info("✅ Cámara liberada")
+
+
+def avanzar_deteccion(estado, clase_detectada, current_time):
+    """Transición de la máquina de detección; devuelve el material confirmado o None"""
+    if estado['material_detectado'] is not None:
+        return None
+
+    if clase_detectada:
+        if estado['deteccion_activa'] == clase_detectada:
+            tiempo_transcurrido = current_time - estado['inicio_deteccion']
+            permanencia = ajustes.DETECTION_TIME_THRESHOLD
+            estado['progreso_deteccion'] = min(tiempo_transcurrido / permanencia, 1.0)
+
+            if tiempo_transcurrido >= permanencia:
+                estado['material_detectado'] = clase_detectada
+                return clase_detectada
+        else:
+            estado['deteccion_activa'] = clase_detectada
+            estado['inicio_deteccion'] = current_time
+            estado['progreso_deteccion'] = 0
+    else:
+        estado['deteccion_activa'] = None
+        estado['inicio_deteccion'] = None
+        estado['progreso_deteccion'] = 0
+
+    return None
+
+
+def loop_inferencia(model):
+    """Etapa 2: YOLO sobre el frame más reciente y máquina de estados de detección"""
+    stats = stats_etapas['inferencia']
+    ultimo_seq = 0
+    contador = 0
+
+    while not frames_captura.cerrada:
+        seq, frame = frames_captura.get(ultimo_seq, timeout=1.0)
+        if frame is None:
+            continue
+
+        saltados = seq - ultimo_seq - 1 if ultimo_seq else 0
+        ultimo_seq = seq
         current_time = time.time()
 
-        with lock:
-            if app_state['material_detectado'] is None and model is not None:
-                # Realizar detección (solo si hay modelo)
-                try:
-                    results = model.predict(frame, conf=0.5, imgsz=320, verbose=False)
-                    annotated = results[0].plot()
-
-                    clase_detectada = None
-                    detection_boxes = []
-
-                    for r in results:
-                        for box in r.boxes:
-                            cls_id = int(box.cls[0])
-                            class_name = model.names[cls_id]
-                            if class_name in ["plastico", "aluminio"]:
-                                clase_detectada = class_name
-                                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                                detection_boxes.append((x1, y1, x2, y2, class_name))
-
-                    # Procesar detección
-                    if clase_detectada:
-                        if app_state['deteccion_activa'] == clase_detectada:
-                            tiempo_transcurrido = current_time - app_state['inicio_deteccion']
-                            app_state['progreso_deteccion'] = min(tiempo_transcurrido / 5.0, 1.0)
-
-                            if tiempo_transcurrido >= 5:
-                                app_state['material_detectado'] = clase_detectada
-                                logger.info(f"[YOLO] {clase_detectada} detectado por 5s")
-
-                                # Publicar a MQTT
-                                mqtt_client.publish(MQTT_MATERIAL_TOPIC, clase_detectada, qos=1)
-
-                                # Notificar al frontend
-                                socketio.emit('material_detectado', {
-                                    'material': clase_detectada,
-                                    'timestamp': datetime.now().isoformat()
-                                })
-                        else:
-                            app_state['deteccion_activa'] = clase_detectada
-                            app_state['inicio_deteccion'] = current_time
-                            app_state['progreso_deteccion'] = 0
-                    else:
-                        app_state['deteccion_activa'] = None
-                        app_state['inicio_deteccion'] = None
-                        app_state['progreso_deteccion'] = 0
-
-                except Exception as e:
-                    logger.error(f"[YOLO] Error en detección: {e}")
-                    # Enviar frame sin detección en caso de error
-                    annotated = frame
-            else:
-                # Sin modelo YOLO, usar frame original
-                annotated = frame
-
-            # Calcular FPS y enviar frame (siempre)
-            fps = 1 / (current_time - prev_time) if prev_time > 0 else 0
-            app_state['fps'] = fps
-            prev_time = current_time
-
-            # Enviar frame al frontend
-            frame_data = frame_to_base64(annotated)
-            socketio.emit('camera_frame', {
-                'frame': frame_data,
-                'fps': round(fps, 1),
-                'deteccion_activa': app_state['deteccion_activa'],
-                'progreso': app_state['progreso_deteccion'],
+        # Stride del gobernador: inferir solo uno de cada N frames nuevos
+        contador += 1
+        if contador % governor.ajustes['stride_inferencia']:
+            continue
+
+        if app_state['material_detectado'] is not None:
+            # Esperando NFC: no se infiere y no se dibujan cajas
+            detecciones.put([])
+            continue
+
+        clase_detectada = None
+        detection_boxes = []
+        duracion = None
+
+        # Escena sin cambios: se reutiliza el último resultado (vacío) sin inferir
+        if motion_gate is not None:
+            with metricas.medir('compuerta'):
+                inferir = motion_gate.evaluar(frame)
+        else:
+            inferir = True
+        if inferir:
+            # Inferencia fuera de cualquier lock
+            try:
+                inicio_inferencia = time.perf_counter()
+
+                for class_name, (x1, y1, x2, y2), conf in model.detectar(frame):
+                    if class_name in ["plastico", "aluminio"]:
+                        clase_detectada = class_name
+                        detection_boxes.append((x1, y1, x2, y2, class_name, conf))
+
+                duracion = time.perf_counter() - inicio_inferencia
+                metricas.observar('inferencia', duracion)
+                if motion_gate is not None:
+                    motion_gate.resultado(bool(detection_boxes), duracion)
+
+            except Exception as e:
+                logger.error(f"[YOLO] Error en detección: {e}")
+                detecciones.put([])
+                continue
+
+        detecciones.put(detection_boxes)
+
+        # Procesar detección (transición corta) y notificar fuera del estado
+        confirmado = app_state.transicion(
+            lambda estado: avanzar_deteccion(estado, clase_detectada, current_time))
+
+        if confirmado:
+            logger.info(f"[YOLO] {confirmado} detectado por {ajustes.DETECTION_TIME_THRESHOLD:g}s")
+
+            # Publicar a MQTT
+            mqtt_client.publish(MQTT_MATERIAL_TOPIC, confirmado, qos=1)
+
+            # Notificar al frontend
+            socketio.emit('material_detectado', {
+                'material': confirmado,
+                'timestamp': datetime.now().isoformat()
+            })
+
+        stats.tick(saltados, duracion)
+
+
+def loop_codificacion():
+    """Etapa 3: dibuja las últimas cajas, codifica JPEG y envía al frontend"""
+    stats = stats_etapas['codificacion']
+    ultimo_seq = 0
+    frame_count = 0
+
+    while not frames_captura.cerrada:
+        inicio = time.monotonic()
+        seq, frame = frames_captura.get(ultimo_seq, timeout=1.0)
+        if frame is None:
+            continue
+
+        saltados = seq - ultimo_seq - 1 if ultimo_seq else 0
+        ultimo_seq = seq
+        inicio_codificacion = time.perf_counter()
+
+        _, cajas = detecciones.peek()
+        cajas = cajas or []
+        if OVERLAY_MODE == 'servidor':
+            with metricas.medir('anotacion'):
+                annotated = overlay.dibujar(frame, cajas)
+        else:
+            annotated = frame
+
+        fps = stats.fps
+        fps_etapas = {nombre: s.snapshot() for nombre, s in stats_etapas.items()}
+        estado = app_state.snapshot()
+        deteccion_activa = estado['deteccion_activa']
+        progreso = estado['progreso_deteccion']
+        material = estado['material_detectado']
+
+        # Los metadatos viajan con el frame de cada cliente (mismo FPS y mismo ack);
+        # los frames los entrega preview_hub (o /video_feed en modo mjpeg)
+        current_time = time.time()
+        meta = {
+            'fps': round(fps, 1),
+            'fps_etapas': fps_etapas,
+            'deteccion_activa': deteccion_activa,
+            'progreso': progreso,
+            'timestamp': current_time
+        }
+        if OVERLAY_MODE == 'cliente':
+            meta['cajas'] = cajas_a_metadatos(cajas, frame.shape[1], frame.shape[0])
+
+        # La escala del gobernador se aplica al codificar, en un solo redimensionado
+        jpeg = preview_hub.publicar(annotated, meta=meta)['alta']
+        jpeg_preview.put(jpeg)
+        if frame_count == 0:
+            arranque.marcar('vista_previa')
+
+        stats.tick(saltados, time.perf_counter() - inicio_codificacion)
+        app_state.update(fps=stats.fps, fps_etapas=fps_etapas)
+
+        frame_count += 1
+        if frame_count % 30 == 0:  # Log cada 30 frames
+            resumen = ', '.join(f"{n}: {s['fps']}" for n, s in fps_etapas.items())
+            logger.info(f"📹 Enviados {frame_count} frames, FPS {resumen}")
+            if motion_gate is not None and frame_count % 300 == 0:
+                gate = motion_gate.snapshot()
+                logger.info(f"🚦 Compuerta: {gate['fraccion_omitida'] * 100:.0f}% frames sin inferir, "
+                            f"~{gate['cpu_ahorrado_s']}s de CPU ahorrados")
+
+        # Modo esperando NFC (solo mostrar mensaje)
+        if material:
+            socketio.emit('waiting_nfc', {
+                'material': material,
                 'timestamp': current_time
             })
 
-            frame_count += 1
-            if frame_count % 30 == 0:  # Log cada 30 frames
-                logger.info(f"📹 Enviados {frame_count} frames, FPS: {round(fps, 1)}")
+        # Control de FPS de la vista previa
+        restante = 1.0 / ajustes.PREVIEW_FPS - (time.monotonic() - inicio)
+        if restante > 0:
+            time.sleep(restante)
+
 
-            # Modo esperando NFC (solo mostrar mensaje)
-            if app_state['material_detectado']:
-                socketio.emit('waiting_nfc', {
-                    'material': app_state['material_detectado'],
-                    'timestamp': current_time
-                })
+def loop_camara():
+    """Thread principal de cámara: arranca captura y vista previa; YOLO se suma cuando el modelo está listo"""
+    logger.info("📷 Intentando abrir cámara...")
+    cap = cv2.VideoCapture(Config.CAMERA_INDEX)
+    if not cap.isOpened():
+        logger.error("❌ No se pudo abrir la cámara")
+        app_state.update(camera_active=False)
+        arranque.marcar('camara', error="no se pudo abrir la cámara")
+        arranque.marcar('vista_previa', error="sin cámara")
+        return
 
-        time.sleep(0.1)  # Control de FPS
+    logger.info("✅ Cámara abierta correctamente")
+    cap.set(cv2.CAP_PROP_FRAME_WIDTH, Config.CAMERA_WIDTH)
+    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, Config.CAMERA_HEIGHT)
 
-    cap.release()
-    logger.info("✅ Cámara liberada")
+    etapas = [
+        threading.Thread(target=loop_captura, args=(cap,), name='captura', daemon=True),
+        threading.Thread(target=loop_codificacion, name='codificacion', daemon=True)
+    ]
+    logger.info("🎥 Iniciando pipeline de cámara...")
+    for etapa in etapas:
+        etapa.start()
+
+    # El modelo carga y se calienta en paralelo; mientras tanto ya hay vista previa
+    model = arranque.resultado('modelo') if arranque.esperar('modelo') else None
+    if model is not None:
+        inferencia = threading.Thread(target=loop_inferencia, args=(model,), name='inferencia', daemon=True)
+        inferencia.start()
+        etapas.append(inferencia)
+
+    for etapa in etapas:
+        etapa.join()
 
 
 # ---------- RUTAS API REST ----------
@@ -517,41 +945,174 @@ def index():
     return render_template('index.html')
 
 
+@app.route('/video_feed')
+def video_feed():
+    """Vista previa MJPEG: cada cliente recibe siempre el JPEG más reciente"""
+    def generar():
+        ultimo_seq = 0
+        while not frames_captura.cerrada:
+            if servidor.cooperativo:
+                # Sin ocupar un hilo del pool por cliente: se consulta sin esperar y se cede el hub
+                seq, jpeg = jpeg_preview.get(ultimo_seq, timeout=0)
+                if jpeg is None:
+                    servidor.dormir(0.5 / ajustes.PREVIEW_FPS)
+                    continue
+            else:
+                seq, jpeg = jpeg_preview.get(ultimo_seq, timeout=1.0)
+                if jpeg is None:
+                    continue
+            ultimo_seq = seq
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                   + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+
+    return Response(generar(), mimetype='multipart/x-mixed-replace; boundary=frame')
+
+
+@app.route('/api/preview/clientes')
+def api_preview_clientes():
+    """Profundidad de cola, frames enviados y descartados por cliente de la vista previa"""
+    return jsonify(preview_hub.snapshot())
+
+
+@app.route('/api/dispositivos')
+def api_dispositivos():
+    """Último estado reportado por cada ESP32 (contenedores, mensajes, inválidos)"""
+    return jsonify(dispositivos.snapshot())
+
+
+@app.route('/api/contenedores/series')
+def api_contenedores_series():
+    """Series con historial (`<deviceId>/<target>`) y su última lectura"""
+    return jsonify(servidor.en_hilo(historial.series))
+
+
+@app.route('/api/contenedores/historial')
+def api_contenedores_historial():
+    """Historial de una serie: ?serie=esp32-01/contePlastico&desde=&hasta= (ms)&resolucion=&max_puntos="""
+    serie = request.args.get('serie')
+    resolucion = request.args.get('resolucion', 'auto')
+    if not serie:
+        return jsonify({'error': "Falta el parámetro 'serie'"}), 400
+    if resolucion != 'auto' and resolucion not in RESOLUCIONES:
+        return jsonify({'error': f"Resolución no válida; usa auto o {', '.join(RESOLUCIONES)}"}), 400
+
+    try:
+        hasta = int(request.args.get('hasta', time.time() * 1000))
+        desde = int(request.args.get('desde', hasta - DIA))
+        max_puntos = min(int(request.args.get('max_puntos', 1000)), 10000)
+    except ValueError:
+        return jsonify({'error': 'desde, hasta y max_puntos deben ser enteros'}), 400
+
+    resolucion, puntos = servidor.en_hilo(historial.consultar, serie, desde, hasta, resolucion, max_puntos)
+    return jsonify({
+        'serie': serie,
+        'desde': desde,
+        'hasta': hasta,
+        'resolucion': resolucion,
+        'puntos': puntos
+    })
+
+
+@app.route('/api/contenedores/forecast')
+def api_contenedores_forecast():
+    """Tiempo estimado hasta llenarse por contenedor: ?umbral=70 (%)&serie=<deviceId>/<target>"""
+    try:
+        umbral = float(request.args.get('umbral', UMBRAL_LLENO))
+    except ValueError:
+        return jsonify({'error': 'umbral debe ser numérico'}), 400
+
+    resultado = pronostico.pronostico(umbral)
+    serie = request.args.get('serie')
+    if serie:
+        if serie not in resultado:
+            return jsonify({'error': f"Sin lecturas para {serie}"}), 404
+        resultado = {serie: resultado[serie]}
+    return jsonify({'umbral': umbral, 'contenedores': resultado})
+
+
+@app.route('/metrics')
+def metrics_prometheus():
+    """Histogramas por etapa e indicadores en formato de texto de Prometheus"""
+    if not metricas.habilitado:
+        return Response("# Instrumentación desactivada (METRICS=False)\n", status=404, mimetype='text/plain')
+    return Response(metricas.prometheus(), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Los mismos datos que /metrics, con p50/p95/p99 en ms"""
+    return jsonify(metricas.snapshot())
+
+
 @app.route('/api/status')
 def api_status():
     """Estado general del sistema"""
-    with lock:
-        return jsonify({
-            'status': 'active',
-            'camera_active': app_state['camera_active'],
-            'nfc_active': app_state['nfc_active'],
-            'mqtt_connected': app_state['mqtt_connected'],
-            'material_detectado': app_state['material_detectado'],
-            'deteccion_activa': app_state['deteccion_activa'],
-            'progreso_deteccion': app_state['progreso_deteccion'],
-            'fps': app_state['fps'],
-            'stats': app_state['stats'],
-            'timestamp': datetime.now().isoformat()
-        })
+    estado = app_state.snapshot()
+    modelo = arranque.resultado('modelo')
+    return jsonify({
+        'status': 'active',
+        'camera_active': estado['camera_active'],
+        'nfc_active': estado['nfc_active'],
+        'mqtt_connected': estado['mqtt_connected'],
+        'material_detectado': estado['material_detectado'],
+        'deteccion_activa': estado['deteccion_activa'],
+        'progreso_deteccion': estado['progreso_deteccion'],
+        'fps': estado['fps'],
+        'fps_etapas': estado['fps_etapas'],
+        'preview': preview_hub.resumen(),
+        'motion_gate': motion_gate.snapshot() if motion_gate else None,
+        'governor': governor.snapshot(),
+        'jpeg': preview_encoder.snapshot(),
+        'ajustes': ajustes.snapshot(),
+        'servidor': servidor.snapshot(),
+        'inferencia': modelo.snapshot() if isinstance(modelo, InferenceWorker) else None,
+        'outbox': outbox.snapshot(),
+        'mqtt_ingesta': {**ingestor_niveles.snapshot(), 'dispositivos': len(dispositivos)},
+        'historial': historial.snapshot(),
+        'user_cache': user_cache.snapshot(),
+        'arranque': arranque.snapshot(),
+        'stats': estado['stats'],
+        'timestamp': datetime.now().isoformat()
+    })
+
+
+@app.route('/api/config', methods=['GET', 'POST'])
+def api_config():
+    """Ajustes en vivo: GET los muestra; POST {"JPEG_QUALITY": 70, ...} los cambia (null = volver al archivo)"""
+    if request.method == 'POST':
+        if CONFIG_TOKEN:
+            if not hmac.compare_digest(request.headers.get('X-Config-Token', ''), CONFIG_TOKEN):
+                return jsonify({'error': 'token inválido'}), 403
+        elif not es_local(request.remote_addr):
+            return jsonify({'error': 'sin CONFIG_TOKEN solo se acepta desde localhost'}), 403
+        valores = request.get_json(silent=True)
+        if not isinstance(valores, dict):
+            return jsonify({'error': 'se espera un objeto JSON {clave: valor}'}), 400
+        try:
+            cambios = ajustes.actualizar(valores)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify({'cambios': cambios, **ajustes.snapshot()})
+    return jsonify(ajustes.snapshot())
 
 
 # Comentado: Ya no se usa en el frontend simplificado
 # @app.route('/api/contenedores')
 # def api_contenedores():
 #     """Estado de contenedores"""
-#     with lock:
-#         return jsonify(app_state['contenedores'])
+#     return jsonify(app_state['contenedores'])
 
 @app.route('/api/reset', methods=['POST'])
 def api_reset():
     """Resetear estado del sistema"""
-    with lock:
-        app_state['material_detectado'] = None
-        app_state['deteccion_activa'] = None
-        app_state['inicio_deteccion'] = None
-        app_state['progreso_deteccion'] = 0
-        app_state['usuario_actual'] = None
-        app_state['puntos_ganados'] = 0
+    app_state.update(
+        material_detectado=None,
+        deteccion_activa=None,
+        inicio_deteccion=None,
+        progreso_deteccion=0,
+        usuario_actual=None,
+        puntos_ganados=0
+    )
 
     socketio.emit('system_reset')
     return jsonify({'status': 'reset_complete'})
@@ -563,36 +1124,51 @@ def handle_connect():
     """Cliente conectado"""
     logger.info(f"[WebSocket] Cliente conectado: {request.sid}")
 
+    # Registrar en el hub (la URL puede pedir ?fps=2&res=baja); en mjpeg solo recibe metadatos
+    preview_hub.registrar(request.sid, request.args.get('fps'), request.args.get('res'),
+                          frames=PREVIEW_TRANSPORT != 'mjpeg')
+
     # Enviar estado inicial
-    with lock:
-        emit('initial_state', {
-            'app_state': app_state,
-            'colors': COLORS,
-            'timestamp': datetime.now().isoformat()
-        })
+    emit('initial_state', {
+        'app_state': app_state.snapshot(),
+        'colors': COLORS,
+        'preview_transport': PREVIEW_TRANSPORT,
+        'overlay_mode': OVERLAY_MODE,
+        'timestamp': datetime.now().isoformat()
+    })
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
     """Cliente desconectado"""
     logger.info(f"[WebSocket] Cliente desconectado: {request.sid}")
+    preview_hub.eliminar(request.sid)
+
+
+@socketio.on('preview_config')
+def handle_preview_config(data):
+    """Cliente pide otro FPS máximo o resolución de vista previa"""
+    config = preview_hub.configurar(request.sid, data.get('fps'), data.get('resolucion'))
+    emit('preview_config', config or {})
 
 
 @socketio.on('request_status')
 def handle_request_status():
     """Solicitud de estado"""
-    with lock:
-        emit('status_update', app_state)
+    emit('status_update', app_state.snapshot())
 
 
 # ---------- EVENTOS VINCULACIÓN NFC ----------
 
 @socketio.on('search_user_by_pin')
 def handle_search_user_by_pin(data):
-    """Buscar usuario por PIN en Firebase"""
+    """Buscar usuario por PIN (índice local o consulta indexada en Firebase)"""
     pin = data.get('pin', '').strip()
+    # En el kiosco todos llegan desde localhost: ahí se distingue por sesión; desde la red, por IP
+    local = es_local(request.remote_addr)
+    cliente = request.sid if local else request.remote_addr
 
-    logger.info(f"[NFC-LINK] Buscando usuario con PIN: {pin}")
+    logger.info(f"[NFC-LINK] Buscando usuario por PIN (cliente {cliente})")
 
     try:
         if not pin or len(pin) != 6 or not pin.isdigit():
@@ -602,26 +1178,18 @@ def handle_search_user_by_pin(data):
             })
             return
 
-        # Buscar en Firebase por usuario_nip
-        usuarios_ref = db.reference('usuarios')
-        usuarios = usuarios_ref.get()
-
-        if not usuarios:
+        permitido, espera = pin_limiter.permitido(cliente, local)
+        if not permitido:
+            logger.warning(f"[NFC-LINK] ⛔ Demasiados intentos de PIN desde {cliente}")
             emit('user_found_by_pin', {
                 'success': False,
-                'message': 'No hay usuarios registrados'
+                'message': f'Demasiados intentos. Espera {espera} segundos'
             })
             return
 
-        # Buscar usuario con el PIN
-        found_user = None
-        found_user_id = None
-
-        for user_id, user_data in usuarios.items():
-            if user_data.get('usuario_nip') == pin:
-                found_user = user_data
-                found_user_id = user_id
-                break
+        # Puede consultar Firebase: fuera del hub en modo cooperativo
+        found_user_id, found_user = servidor.en_hilo(user_cache.buscar_por_pin, pin)
+        pin_limiter.registrar(cliente, exito=bool(found_user), local=local)
 
         if found_user:
             logger.info(f"[NFC-LINK] Usuario encontrado: {found_user.get('usuario_nombre', 'Sin nombre')}")
@@ -637,7 +1205,7 @@ def handle_search_user_by_pin(data):
                 }
             })
         else:
-            logger.warning(f"[NFC-LINK] Usuario no encontrado para PIN: {pin}")
+            logger.warning("[NFC-LINK] Usuario no encontrado para el PIN ingresado")
             emit('user_found_by_pin', {
                 'success': False,
                 'message': 'PIN no válido o usuario no encontrado'
@@ -659,10 +1227,11 @@ def handle_start_nfc_linking(data):
 
     logger.info(f"[NFC-LINK] Iniciando vinculación para usuario: {user_name} (ID: {user_id})")
 
-    with lock:
-        app_state['nfc_linking_mode'] = True
-        app_state['nfc_linking_user_id'] = user_id
-        app_state['nfc_linking_user_name'] = user_name
+    app_state.update(
+        nfc_linking_mode=True,
+        nfc_linking_user_id=user_id,
+        nfc_linking_user_name=user_name
+    )
 
     # Notificar estado inicial
     emit('nfc_link_status', {
@@ -676,10 +1245,7 @@ def handle_cancel_nfc_linking():
     """Cancelar proceso de vinculación NFC"""
     logger.info("[NFC-LINK] Cancelando vinculación NFC")
 
-    with lock:
-        app_state['nfc_linking_mode'] = False
-        app_state['nfc_linking_user_id'] = None
-        app_state['nfc_linking_user_name'] = None
+    app_state.transicion(salir_vinculacion)
 
 
 # ---------- MANEJO DE SEÑALES ----------
@@ -687,9 +1253,7 @@ def handle_sigterm(signum, frame):
     """Manejo de señal de terminación"""
     logger.info("🛑 Cerrando aplicación...")
 
-    with lock:
-        app_state['camera_active'] = False
-        app_state['nfc_active'] = False
+    app_state.update(camera_active=False, nfc_active=False)
 
     try:
         mqtt_client.loop_stop()
@@ -697,30 +1261,77 @@ def handle_sigterm(signum, frame):
     except:
         pass
 
+    user_cache.stop()
+    modelo = arranque.resultado('modelo')
+    if isinstance(modelo, InferenceWorker):
+        modelo.stop()
+    ingestor_niveles.stop()  # Su último lote entra a la cola antes de vaciarla
+    historial.stop()
+
+    # Último intento de replicar lo pendiente; lo que no salga se envía al reiniciar
+    outbox.stop()
+    try:
+        outbox.vaciar()
+    except Exception:
+        logger.warning(f"[OUTBOX] ⚠️ {outbox.pendientes()} eventos quedan pendientes")
+
     sys.exit(0)
 
 
-# ---------- MAIN ----------
-if __name__ == "__main__":
-    signal.signal(signal.SIGTERM, handle_sigterm)
+# ---------- ARRANQUE ----------
+def iniciar_historial():
+    """Historial y pronóstico precargado; recién entonces se consumen los niveles MQTT"""
+    historial.start()
+    try:
+        precargar_pronostico()
+    except Exception as e:
+        logger.error(f"[HIST] ❌ No se pudo precargar el pronóstico: {e}")
+    # Lo que llegó por MQTT mientras tanto espera en la cola del ingestor
+    ingestor_niveles.start()
+
+
+def iniciar_cache_usuarios():
+    user_cache.start()
+    if not user_cache.escuchando:
+        raise RuntimeError("sin listeners de Firebase")
+
+
+def esperar_servidor(puerto):
+    """Vuelve cuando el servidor web ya acepta conexiones"""
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+
+
+def iniciar_servicios(puerto=5000):
+    """Lanza todo en segundo plano; lo lento (SDKs, modelo, TLS) no retrasa al servidor web"""
+    for nombre in ('camara', 'vista_previa', 'nfc', 'mqtt'):
+        arranque.pendiente(nombre)
+    arranque.tarea('servidor', lambda: esperar_servidor(puerto))
+    arranque.tarea('firebase', inicializar_firebase)
+    arranque.tarea('usuarios', iniciar_cache_usuarios, depende=('firebase',))
+    arranque.tarea('modelo', preparar_modelo)
+    arranque.tarea('historial', iniciar_historial)
 
-    # Inicializar servicios
     setup_mqtt()
+    ajustes.vigilar()
+    preview_hub.start()
+    outbox.start()
+    if GOVERNOR:
+        governor.start()
+
+    threading.Thread(target=loop_nfc, name='nfc', daemon=True).start()
+    threading.Thread(target=loop_camara, name='camara', daemon=True).start()
 
-    # Iniciar threads
-    nfc_thread = threading.Thread(target=loop_nfc, daemon=True)
-    yolo_thread = threading.Thread(target=loop_yolo, daemon=True)
 
-    nfc_thread.start()
-    yolo_thread.start()
+# ---------- MAIN ----------
+if __name__ == "__main__":
+    signal.signal(signal.SIGTERM, handle_sigterm)
 
-    logger.info("🚀 Iniciando servidor web...")
+    iniciar_servicios()
 
     # Iniciar servidor
-    socketio.run(
-        app,
-        host='0.0.0.0',
-        port=5000,
-        debug=False,
-        allow_unsafe_werkzeug=True
-    )
+    servidor.ejecutar(socketio, app, host='0.0.0.0', puerto=5000)
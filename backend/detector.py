@@ -0,0 +1,216 @@
+"""
+Motores de inferencia YOLO: ONNX Runtime directo (por defecto) y ultralytics (respaldo)
+
+Ambos devuelven una lista de detecciones `(clase, (x1, y1, x2, y2), confianza)`
+en coordenadas del frame original.
+"""
+import ast
+import logging
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def nms(boxes, scores, iou=0.45):
+    """Non-maximum suppression vectorizada; devuelve índices conservados"""
+    x1, y1, x2, y2 = boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3]
+    areas = (x2 - x1).clip(0) * (y2 - y1).clip(0)
+    orden = scores.argsort()[::-1]
+    keep = []
+
+    while orden.size:
+        i = orden[0]
+        keep.append(i)
+        resto = orden[1:]
+
+        xx1 = np.maximum(x1[i], x1[resto])
+        yy1 = np.maximum(y1[i], y1[resto])
+        xx2 = np.minimum(x2[i], x2[resto])
+        yy2 = np.minimum(y2[i], y2[resto])
+        inter = (xx2 - xx1).clip(0) * (yy2 - yy1).clip(0)
+        iou_resto = inter / (areas[i] + areas[resto] - inter + 1e-9)
+
+        orden = resto[iou_resto <= iou]
+
+    return np.asarray(keep, dtype=np.int64)
+
+
+class OnnxDetector:
+    """YOLOv8 exportado a ONNX ejecutado directamente con onnxruntime.
+
+    El letterbox se escribe en un lienzo uint8 preasignado y la conversión a
+    tensor NCHW float32 se hace sobre un buffer de entrada reutilizado, así
+    que cada frame no asigna memoria nueva para la entrada del modelo.
+    """
+
+    def __init__(self, ruta, imgsz=320, conf=0.5, iou=0.45, nombres=None, hilos=None):
+        import onnxruntime as ort
+
+        opciones = ort.SessionOptions()
+        opciones.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if hilos:
+            opciones.intra_op_num_threads = hilos
+
+        self.session = ort.InferenceSession(str(ruta), opciones, providers=['CPUExecutionProvider'])
+        entrada = self.session.get_inputs()[0]
+        self._input_name = entrada.name
+
+        # Modelos exportados con tamaño fijo mandan sobre `imgsz`
+        forma = entrada.shape
+        self.tamano_fijo = isinstance(forma[2], int) and isinstance(forma[3], int)
+        if self.tamano_fijo:
+            imgsz = forma[2]
+
+        self.conf = conf
+        self.iou = iou
+        self.names = nombres or self._leer_nombres()
+        self._imgsz_pedido = None
+        self._reservar_entrada(imgsz)
+
+    def _reservar_entrada(self, imgsz):
+        self.imgsz = imgsz
+        self._canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+        self._input = np.empty((1, 3, imgsz, imgsz), dtype=np.float32)
+        self._ultimo_tamano = None
+
+    def ajustar(self, conf=None, imgsz=None):
+        """Cambia confianza y/o tamaño de entrada; el tamaño se aplica en el próximo frame"""
+        if conf is not None:
+            self.conf = conf
+        if imgsz is not None and imgsz != self.imgsz:
+            if self.tamano_fijo:
+                logger.warning(f"[ONNX] ⚠️ Modelo exportado a {self.imgsz}px: se ignora imgsz={imgsz}")
+            else:
+                self._imgsz_pedido = imgsz
+
+    def _leer_nombres(self):
+        """Nombres de clase desde los metadatos que escribe ultralytics al exportar"""
+        meta = self.session.get_modelmeta().custom_metadata_map
+        try:
+            return ast.literal_eval(meta['names'])
+        except (KeyError, ValueError, SyntaxError):
+            logger.warning("[ONNX] ⚠️ Modelo sin nombres de clase en metadatos")
+            return {}
+
+    def _letterbox(self, frame):
+        """Redimensiona conservando proporción dentro del lienzo preasignado"""
+        h, w = frame.shape[:2]
+        s = self.imgsz
+        r = min(s / h, s / w)
+        nw, nh = int(round(w * r)), int(round(h * r))
+        left, top = (s - nw) // 2, (s - nh) // 2
+
+        # Solo se repinta el borde si cambia el tamaño de entrada
+        if self._ultimo_tamano != (w, h):
+            self._canvas.fill(114)
+            self._ultimo_tamano = (w, h)
+
+        self._canvas[top:top + nh, left:left + nw] = cv2.resize(frame, (nw, nh), interpolation=cv2.INTER_LINEAR)
+
+        # BGR HWC uint8 -> RGB CHW float32 [0, 1] sobre el buffer reutilizado
+        np.multiply(self._canvas[:, :, ::-1].transpose(2, 0, 1), 1.0 / 255.0,
+                    out=self._input[0], casting='unsafe')
+        return r, left, top
+
+    def detectar(self, frame):
+        if self._imgsz_pedido is not None:
+            self._reservar_entrada(self._imgsz_pedido)
+            self._imgsz_pedido = None
+        r, left, top = self._letterbox(frame)
+        salida = self.session.run(None, {self._input_name: self._input})[0]
+
+        # YOLOv8: (1, 4 + clases, N) -> (N, 4 + clases)
+        pred = salida[0].T
+        scores_clase = pred[:, 4:]
+        cls_ids = scores_clase.argmax(axis=1)
+        scores = scores_clase[np.arange(len(cls_ids)), cls_ids]
+
+        mascara = scores >= self.conf
+        if not mascara.any():
+            return []
+
+        pred, cls_ids, scores = pred[mascara], cls_ids[mascara], scores[mascara]
+
+        # cx, cy, w, h (espacio letterbox) -> x1, y1, x2, y2 (espacio del frame)
+        boxes = np.empty((len(pred), 4), dtype=np.float32)
+        boxes[:, 0] = pred[:, 0] - pred[:, 2] / 2
+        boxes[:, 1] = pred[:, 1] - pred[:, 3] / 2
+        boxes[:, 2] = pred[:, 0] + pred[:, 2] / 2
+        boxes[:, 3] = pred[:, 1] + pred[:, 3] / 2
+        boxes -= (left, top, left, top)
+        boxes /= r
+
+        h, w = frame.shape[:2]
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, w)
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, h)
+
+        # NMS por clase: desplazar cada clase para que no se solapen entre sí
+        desplazadas = boxes + (cls_ids * 4096.0)[:, None]
+        keep = nms(desplazadas, scores, self.iou)
+
+        return [
+            (self.names.get(int(cls_ids[i]), str(int(cls_ids[i]))),
+             tuple(int(v) for v in boxes[i]),
+             float(scores[i]))
+            for i in keep
+        ]
+
+
+class UltralyticsDetector:
+    """Adaptador sobre ultralytics.YOLO (ruta anterior, más pesada)"""
+
+    def __init__(self, ruta, imgsz=320, conf=0.5):
+        from ultralytics import YOLO
+
+        self.model = YOLO(str(ruta), task="detect")
+        self.names = self.model.names
+        self.imgsz = imgsz
+        self.conf = conf
+
+    def ajustar(self, conf=None, imgsz=None):
+        if conf is not None:
+            self.conf = conf
+        if imgsz is not None:
+            self.imgsz = imgsz
+
+    def detectar(self, frame):
+        results = self.model.predict(frame, conf=self.conf, imgsz=self.imgsz, verbose=False)
+        detecciones = []
+        for r in results:
+            for box in r.boxes:
+                cls_id = int(box.cls[0])
+                x1, y1, x2, y2 = map(int, box.xyxy[0])
+                detecciones.append((self.names[cls_id], (x1, y1, x2, y2), float(box.conf[0])))
+        return detecciones
+
+
+def crear_detector(ruta, backend='onnxruntime', imgsz=320, conf=0.5):
+    """Crea el motor pedido; si onnxruntime no está instalado usa ultralytics"""
+    if backend == 'onnxruntime':
+        try:
+            detector = OnnxDetector(ruta, imgsz=imgsz, conf=conf)
+            logger.info("✅ Motor de inferencia: onnxruntime")
+            return detector
+        except ImportError:
+            logger.warning("⚠️ onnxruntime no instalado, usando ultralytics")
+
+    detector = UltralyticsDetector(ruta, imgsz=imgsz, conf=conf)
+    logger.info("✅ Motor de inferencia: ultralytics")
+    return detector
+
+
+def calentar(detector, alto=480, ancho=640, repeticiones=2):
+    """Corre el modelo sobre frames vacíos para pagar la inicialización antes del primer frame real
+
+    Devuelve la duración de cada pasada en segundos (la primera es la cara).
+    """
+    frame = np.zeros((alto, ancho, 3), dtype=np.uint8)
+    duraciones = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        detector.detectar(frame)
+        duraciones.append(time.perf_counter() - inicio)
+    return duraciones
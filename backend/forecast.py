@@ -0,0 +1,163 @@
+"""
+Pronóstico de llenado por contenedor: tasa EWMA con estacionalidad por día y hora
+"""
+import math
+import threading
+import time
+from datetime import datetime
+
+HORA_S = 3600.0
+
+
+def franja(ts_s):
+    """(día de la semana, hora) locales"""
+    momento = datetime.fromtimestamp(ts_s)
+    return momento.weekday(), momento.hour
+
+
+class _Serie:
+    __slots__ = ('t_ancla', 'p_ancla', 'ultimo_t', 'ultimo_p', 'tasa', 'subida', 'esperado',
+                 'por_hora', 'por_dia', 'n', 'vaciados')
+
+    def __init__(self, t, p):
+        self.t_ancla = self.ultimo_t = t
+        self.p_ancla = self.ultimo_p = p
+        self.tasa = None  # %/hora, sin estacionalidad
+        self.subida = 0.0    # Σ puntos subidos (con decaimiento)
+        self.esperado = 0.0  # Σ horas x factor estacional (con decaimiento)
+        self.por_hora = [1.0] * 24
+        self.por_dia = [1.0] * 7
+        self.n = 0
+        self.vaciados = 0
+
+
+class FillForecaster:
+    """Estima cuánto falta para que se llene cada contenedor.
+
+    Cada lectura cuesta O(1): cuando pasaron al menos `paso_min` segundos
+    desde el último ancla, la subida (nunca negativa) y las horas ponderadas
+    por el factor estacional (hora del día x día de la semana) se suman a dos
+    acumuladores que decaen con constante `tau_h`; la tasa base es su
+    cociente, así que las horas en que casi nadie recicla no la arrastran a
+    cero. Cada factor se mueve `beta` por hora observada (el diario, 8 veces
+    más lento) para que el horario no absorba las diferencias entre días.
+    Una caída mayor a `vaciado` puntos se toma como un vaciado y reinicia
+    el ancla sin tocar la tasa.
+
+    La predicción recorre las horas siguientes multiplicando la tasa base por
+    el factor de cada franja hasta llegar al `umbral` (como máximo `horizonte_h`).
+    """
+
+    def __init__(self, tau_h=48.0, beta=0.1, paso_min=600.0, vaciado=20.0, horizonte_h=24 * 30):
+        self.tau_h = tau_h
+        self.beta = beta
+        self.paso_min = paso_min
+        self.vaciado = vaciado
+        self.horizonte_h = horizonte_h
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observar(self, serie, ts_ms, porcentaje):
+        """Incorpora una lectura (ts en ms, porcentaje 0..100)"""
+        t = ts_ms / 1000.0
+        p = float(porcentaje)
+        with self._lock:
+            s = self._series.get(serie)
+            if s is None:
+                self._series[serie] = _Serie(t, p)
+                return
+            if t <= s.ultimo_t:
+                return
+
+            if p < s.ultimo_p - self.vaciado:
+                s.t_ancla, s.p_ancla = t, p
+                s.ultimo_t, s.ultimo_p = t, p
+                s.vaciados += 1
+                return
+            s.ultimo_t, s.ultimo_p = t, p
+
+            dt = t - s.t_ancla
+            if dt < self.paso_min:
+                return
+
+            horas = dt / HORA_S
+            subida = max(p - s.p_ancla, 0.0)
+            observada = subida / horas
+            dia, hora = franja((s.t_ancla + t) / 2)
+            f_hora, f_dia = s.por_hora[hora], s.por_dia[dia]
+
+            if s.tasa is not None and s.tasa > 1e-3:
+                relativo_hora = min(observada / (s.tasa * max(f_dia, 0.05)), 10.0)
+                relativo_dia = min(observada / (s.tasa * max(f_hora, 0.05)), 10.0)
+                s.por_hora[hora] = f_hora + min(self.beta * horas, 1) * (relativo_hora - f_hora)
+                s.por_dia[dia] = f_dia + min(self.beta * horas / 8, 1) * (relativo_dia - f_dia)
+                # Escala en el factor horario y la tasa; el diario queda con media 1
+                media = sum(s.por_dia) / 7
+                s.por_dia = [f / media for f in s.por_dia]
+
+            decaimiento = math.exp(-horas / self.tau_h)
+            s.subida = s.subida * decaimiento + subida
+            s.esperado = s.esperado * decaimiento + horas * f_hora * f_dia
+            if s.esperado > 1e-6:
+                s.tasa = s.subida / s.esperado
+
+            s.t_ancla, s.p_ancla = t, p
+            s.n += 1
+
+    def _horas_hasta(self, ultimo_p, tasa, factores, umbral, desde):
+        """Horas hasta `umbral` integrando la tasa franja por franja (`factores[dia][hora]`)"""
+        if ultimo_p >= umbral:
+            return 0.0
+        if not tasa or tasa <= 0:
+            return None
+
+        faltante = umbral - ultimo_p
+        dia, hora = franja(desde)
+        fraccion = 1 - (desde % HORA_S) / HORA_S  # Lo que queda de la hora en curso
+        horas = 0.0
+        while horas < self.horizonte_h:
+            avance = tasa * factores[dia][hora] * fraccion
+            if avance >= faltante:
+                return horas + fraccion * faltante / avance
+            faltante -= avance
+            horas += fraccion
+            fraccion = 1.0
+            # Avance local de franja: sin datetime por paso (los cambios de horario se ignoran)
+            hora += 1
+            if hora == 24:
+                hora, dia = 0, (dia + 1) % 7
+        return None
+
+    def pronostico(self, umbral=70.0, ahora=None):
+        """Por serie: nivel actual, tasa actual y tiempo estimado hasta `umbral` %"""
+        ahora = ahora or time.time()
+        # Bajo el lock solo se copia el estado; la proyección no frena a observar()
+        with self._lock:
+            copias = [
+                (nombre, s.ultimo_t, s.ultimo_p, s.tasa, list(s.por_hora), list(s.por_dia), s.n, s.vaciados)
+                for nombre, s in self._series.items()
+            ]
+
+        dia_ahora, hora_ahora = franja(ahora)
+        resultado = {}
+        for nombre, ultimo_t, ultimo_p, tasa, por_hora, por_dia, n, vaciados in copias:
+            factores = [[f_dia * f_hora for f_hora in por_hora] for f_dia in por_dia]
+            # El nivel sigue subiendo desde la última lectura según la tasa
+            horas = self._horas_hasta(ultimo_p, tasa, factores, umbral, ultimo_t)
+            if horas is not None:
+                horas = max(horas - (ahora - ultimo_t) / HORA_S, 0.0)
+            tasa_actual = tasa * factores[dia_ahora][hora_ahora] if tasa is not None else None
+            resultado[nombre] = {
+                'porcentaje': ultimo_p,
+                'ultima_lectura': int(ultimo_t * 1000),
+                'tasa_pct_hora': round(tasa_actual, 3) if tasa_actual is not None else None,
+                'tasa_base_pct_hora': round(tasa, 3) if tasa is not None else None,
+                'horas_hasta_lleno': round(horas, 2) if horas is not None else None,
+                'lleno_en': int((ahora + horas * HORA_S) * 1000) if horas is not None else None,
+                'observaciones': n,
+                'vaciados': vaciados
+            }
+        return resultado
+
+    def __len__(self):
+        return len(self._series)
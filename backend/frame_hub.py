@@ -0,0 +1,214 @@
+"""
+Hub de difusión de la vista previa: codifica una vez y entrega por cliente
+"""
+import threading
+import time
+
+
+class _Cliente:
+    """Estado de entrega de un cliente de la vista previa"""
+
+    def __init__(self, sid, fps_max, resolucion, frames=True):
+        self.sid = sid
+        self.frames = frames        # False: solo metadatos (el video va por /video_feed)
+        self.fps_max = fps_max
+        self.fps_pedido = None      # Lo que pidió el cliente (?fps=), acotado por el hub
+        self.resolucion = resolucion
+        self.pendiente = None       # Único (jpeg, meta) en espera (el más nuevo)
+        self.en_vuelo = False       # Enviado y aún sin confirmación
+        self.enviado_en = 0.0
+        self.enviados = 0
+        self.confirmados = 0
+        self.descartados = 0
+        self.fps_entregado = 0.0
+        self._ultimo_ack = None
+
+    def snapshot(self):
+        return {
+            'fps_max': self.fps_max,
+            'resolucion': self.resolucion,
+            'profundidad': (1 if self.pendiente is not None else 0) + (1 if self.en_vuelo else 0),
+            'en_vuelo': self.en_vuelo,
+            'enviados': self.enviados,
+            'confirmados': self.confirmados,
+            'descartados': self.descartados,
+            'fps_entregado': round(self.fps_entregado, 1)
+        }
+
+
+class FrameHub:
+    """Difunde la vista previa con control de flujo por cliente.
+
+    Cada frame se codifica una sola vez por resolución solicitada. Cada
+    cliente tiene como máximo un frame en vuelo (hasta que lo confirma) y
+    uno pendiente; si llega otro frame mientras espera, el pendiente se
+    reemplaza por el nuevo y se cuenta como descartado. Así un navegador
+    lento recibe siempre lo más reciente y el servidor nunca acumula atraso.
+
+    `codificar(frame, resolucion)` devuelve bytes JPEG para uno de los
+    nombres de `RESOLUCIONES` (el tamaño de cada uno lo decide el
+    codificador) y `emitir(sid, jpeg, meta, callback)` entrega un frame con
+    sus metadatos y debe llamar a `callback` cuando el cliente lo confirme.
+    Los metadatos siguen el mismo FPS y la misma espera de confirmación que
+    el frame; un cliente registrado con `frames=False` recibe solo ellos
+    (`jpeg` None).
+    """
+
+    RESOLUCIONES = ('alta', 'media', 'baja')
+    ACK_TIMEOUT = 5.0  # Segundos antes de dar por perdido un frame sin confirmar
+
+    def __init__(self, codificar, emitir, fps_max=15):
+        self._codificar = codificar
+        self._emitir = emitir
+        self.fps_max = fps_max
+        self._cond = threading.Condition()
+        self._clientes = {}
+        self._activo = False
+
+    # ----- Registro de clientes -----
+    def registrar(self, sid, fps=None, resolucion=None, frames=True):
+        cliente = _Cliente(sid, self.fps_max, 'alta', frames)
+        with self._cond:
+            self._clientes[sid] = cliente
+        self.configurar(sid, fps, resolucion)
+
+    def configurar(self, sid, fps=None, resolucion=None):
+        """Cambia FPS máximo y/o resolución de un cliente (valores fuera de rango se ignoran)"""
+        with self._cond:
+            cliente = self._clientes.get(sid)
+            if cliente is None:
+                return None
+            try:
+                if fps is not None and float(fps) > 0:
+                    cliente.fps_pedido = float(fps)
+                    cliente.fps_max = min(cliente.fps_pedido, self.fps_max)
+            except (TypeError, ValueError):
+                pass
+            if resolucion in self.RESOLUCIONES:
+                cliente.resolucion = resolucion
+            return cliente.snapshot()
+
+    def limitar_fps(self, fps_max):
+        """Cambia el FPS máximo del hub; cada cliente conserva lo que pidió si entra en el nuevo límite"""
+        with self._cond:
+            self.fps_max = fps_max
+            for cliente in self._clientes.values():
+                cliente.fps_max = min(cliente.fps_pedido or fps_max, fps_max)
+
+    def eliminar(self, sid):
+        with self._cond:
+            self._clientes.pop(sid, None)
+
+    # ----- Publicación y entrega -----
+    def publicar(self, frame, siempre=('alta',), meta=None):
+        """Codifica el frame una vez por resolución en uso y lo deja pendiente por cliente,
+        junto con `meta`.
+
+        Devuelve `{resolucion: jpeg}`; las resoluciones de `siempre` se
+        codifican aunque no haya clientes (p. ej. para /video_feed).
+        """
+        with self._cond:
+            resoluciones = {c.resolucion for c in self._clientes.values() if c.frames}
+        resoluciones.update(siempre)
+
+        jpegs = {res: self._codificar(frame, res) for res in resoluciones}
+
+        with self._cond:
+            for cliente in self._clientes.values():
+                jpeg = jpegs.get(cliente.resolucion) if cliente.frames else None
+                if jpeg is None and (cliente.frames or meta is None):
+                    continue
+                if cliente.pendiente is not None:
+                    cliente.descartados += 1
+                cliente.pendiente = (jpeg, meta)
+            self._cond.notify()
+
+        return jpegs
+
+    def confirmar(self, sid):
+        """Callback de confirmación (ack) de un cliente"""
+        ahora = time.monotonic()
+        with self._cond:
+            cliente = self._clientes.get(sid)
+            if cliente is None:
+                return
+            cliente.en_vuelo = False
+            cliente.confirmados += 1
+            if cliente._ultimo_ack is not None:
+                dt = ahora - cliente._ultimo_ack
+                if dt > 0:
+                    cliente.fps_entregado += 0.2 * (1.0 / dt - cliente.fps_entregado)
+            cliente._ultimo_ack = ahora
+            self._cond.notify()
+
+    def _liberar(self, sid):
+        """Libera el envío en vuelo sin contarlo como entregado"""
+        with self._cond:
+            cliente = self._clientes.get(sid)
+            if cliente is not None:
+                cliente.en_vuelo = False
+                self._cond.notify()
+
+    def _tomar_listos(self):
+        """Saca los frames que ya pueden enviarse; devuelve (listos, espera)"""
+        ahora = time.monotonic()
+        listos = []
+        espera = 1.0
+
+        for cliente in self._clientes.values():
+            if cliente.pendiente is None:
+                continue
+            if cliente.en_vuelo:
+                if ahora - cliente.enviado_en < self.ACK_TIMEOUT:
+                    continue
+                cliente.en_vuelo = False  # Confirmación perdida
+
+            siguiente = cliente.enviado_en + 1.0 / cliente.fps_max
+            if ahora < siguiente:
+                espera = min(espera, siguiente - ahora)
+                continue
+
+            listos.append((cliente.sid, *cliente.pendiente))
+            cliente.pendiente = None
+            cliente.en_vuelo = True
+            cliente.enviado_en = ahora
+            cliente.enviados += 1
+
+        return listos, espera
+
+    def _loop_envio(self):
+        while self._activo:
+            with self._cond:
+                listos, espera = self._tomar_listos()
+                if not listos:
+                    self._cond.wait(espera)
+                    continue
+
+            # Envío fuera del lock
+            for sid, jpeg, meta in listos:
+                try:
+                    self._emitir(sid, jpeg, meta, lambda *args, sid=sid: self.confirmar(sid))
+                except Exception:
+                    self._liberar(sid)
+
+    def start(self):
+        self._activo = True
+        threading.Thread(target=self._loop_envio, name='preview_hub', daemon=True).start()
+
+    def stop(self):
+        with self._cond:
+            self._activo = False
+            self._cond.notify_all()
+
+    # ----- Métricas -----
+    def snapshot(self):
+        with self._cond:
+            return {sid: c.snapshot() for sid, c in self._clientes.items()}
+
+    def resumen(self):
+        clientes = self.snapshot()
+        return {
+            'clientes': len(clientes),
+            'descartados': sum(c['descartados'] for c in clientes.values()),
+            'profundidad_max': max((c['profundidad'] for c in clientes.values()), default=0)
+        }
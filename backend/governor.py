@@ -0,0 +1,143 @@
+"""
+Gobernador de rendimiento: ajusta la carga según CPU, temperatura y latencia
+"""
+import logging
+import threading
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+SENSORES_TEMPERATURA = ('cpu_thermal', 'soc_thermal', 'coretemp', 'k10temp')
+
+
+def leer_temperatura():
+    """Temperatura del SoC en °C, o None si no hay sensor"""
+    try:
+        temps = psutil.sensors_temperatures()
+        for clave in SENSORES_TEMPERATURA:
+            if temps.get(clave):
+                return temps[clave][0].current
+    except (AttributeError, OSError):
+        pass
+
+    try:
+        with open('/sys/class/thermal/thermal_zone0/temp') as f:
+            return int(f.read().strip()) / 1000.0
+    except (OSError, ValueError):
+        return None
+
+
+class PerformanceGovernor:
+    """Escalera de niveles de degradación entre límites configurados.
+
+    El nivel 0 usa los valores máximos (FPS de captura, calidad JPEG,
+    resolución de vista previa) e infiere cada frame; el último nivel usa
+    los mínimos. Cada `periodo` segundos se sube un nivel si la CPU, la
+    temperatura o la latencia de inferencia pasan su umbral alto, y se baja
+    uno si todo está por debajo de los umbrales bajos (histéresis).
+
+    Las etapas leen `ajustes`, que se reemplaza completo en cada decisión.
+    """
+
+    def __init__(self, latencia_inferencia=None, niveles=4, periodo=2.0,
+                 fps=(10, 30), stride=(1, 4), calidad=(50, 80), escala=(0.5, 1.0),
+                 cpu=(60.0, 85.0), temperatura=(65.0, 75.0), latencia_ms=(150.0, 400.0)):
+        self._latencia_inferencia = latencia_inferencia or (lambda: 0.0)
+        self.niveles = niveles
+        self.periodo = periodo
+        self.limites = {'fps': fps, 'stride': stride, 'calidad': calidad, 'escala': escala}
+        self.umbrales = {'cpu': cpu, 'temperatura': temperatura, 'latencia_ms': latencia_ms}
+
+        self.nivel = 0
+        self.ajustes = self._ajustes_para(0)
+        self.medidas = {}
+        self.ultima_decision = None
+        self._activo = False
+
+    def _ajustes_para(self, nivel):
+        """Interpola cada perilla entre su mejor y su peor valor"""
+        t = nivel / self.niveles if self.niveles else 0.0
+
+        def entre(minimo, maximo, invertido=False):
+            return minimo + (maximo - minimo) * t if invertido else maximo - (maximo - minimo) * t
+
+        fps_min, fps_max = self.limites['fps']
+        stride_min, stride_max = self.limites['stride']
+        cal_min, cal_max = self.limites['calidad']
+        esc_min, esc_max = self.limites['escala']
+        return {
+            'fps_captura': int(round(entre(fps_min, fps_max))),
+            'stride_inferencia': int(round(entre(stride_min, stride_max, invertido=True))),
+            'calidad_jpeg': int(round(entre(cal_min, cal_max))),
+            'escala_preview': round(entre(esc_min, esc_max), 2)
+        }
+
+    def configurar(self, **limites):
+        """Reemplaza límites (`fps`, `stride`, `calidad`, `escala`) y recalcula el nivel actual"""
+        self.limites = {**self.limites, **limites}
+        self.ajustes = self._ajustes_para(self.nivel)
+
+    def medir(self):
+        return {
+            'cpu': psutil.cpu_percent(interval=None),
+            'temperatura': leer_temperatura(),
+            'latencia_ms': self._latencia_inferencia()
+        }
+
+    def decidir(self, medidas):
+        """Calcula el siguiente nivel a partir de las medidas; devuelve el motivo"""
+        altos = [
+            clave for clave, valor in medidas.items()
+            if valor is not None and valor >= self.umbrales[clave][1]
+        ]
+        if altos and self.nivel < self.niveles:
+            self.nivel += 1
+            return f"sube por {', '.join(altos)}"
+
+        bajos = all(
+            valor is None or valor < self.umbrales[clave][0]
+            for clave, valor in medidas.items()
+        )
+        if bajos and self.nivel > 0:
+            self.nivel -= 1
+            return "baja: carga normal"
+
+        return None
+
+    def _loop(self):
+        psutil.cpu_percent(interval=None)  # La primera lectura siempre es 0
+        while self._activo:
+            time.sleep(self.periodo)
+            try:
+                medidas = self.medir()
+                motivo = self.decidir(medidas)
+                self.medidas = medidas
+                if motivo:
+                    self.ajustes = self._ajustes_para(self.nivel)
+                    self.ultima_decision = {
+                        'nivel': self.nivel,
+                        'motivo': motivo,
+                        'ajustes': self.ajustes,
+                        'timestamp': time.time()
+                    }
+                    logger.info(f"[GOV] ⚙️ Nivel {self.nivel} ({motivo}): {self.ajustes}")
+            except Exception as e:
+                logger.error(f"[GOV] Error midiendo carga: {e}")
+
+    def start(self):
+        self._activo = True
+        threading.Thread(target=self._loop, name='governor', daemon=True).start()
+
+    def stop(self):
+        self._activo = False
+
+    def snapshot(self):
+        return {
+            'nivel': self.nivel,
+            'niveles': self.niveles,
+            'ajustes': self.ajustes,
+            'medidas': self.medidas,
+            'ultima_decision': self.ultima_decision
+        }
@@ -0,0 +1,301 @@
+"""
+Inferencia YOLO en un proceso aparte: frames por memoria compartida, resultados por un socket local
+
+Se importa desde app.py (lado del kiosco) y también se ejecuta como script
+(el proceso hijo), así que solo depende de numpy, detector y la biblioteca estándar.
+"""
+import json
+import logging
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+from multiprocessing.connection import Connection
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+def _adjuntar(nombre):
+    """Abre un bloque de memoria compartida ajeno sin que el hijo lo borre al salir"""
+    try:
+        return shared_memory.SharedMemory(name=nombre, track=False)
+    except TypeError:
+        # Python < 3.13: el resource_tracker del hijo haría unlink al terminar
+        memoria = shared_memory.SharedMemory(name=nombre)
+        resource_tracker.unregister(memoria._name, 'shared_memory')
+        return memoria
+
+
+class InferenceWorker:
+    """Detector con la misma interfaz (`detectar(frame)`) que corre en otro proceso.
+
+    El frame se copia a uno de `slots` bloques de una memoria compartida que
+    el hijo ve como ndarray (sin pickle); por el socket solo viajan el slot,
+    la forma y las detecciones ya compactadas. Los slots rotan, así que un
+    frame cuya respuesta se dio por perdida no se pisa mientras el hijo
+    todavía podría estar leyéndolo.
+
+    Un hilo supervisor relanza el proceso si termina (espera creciente hasta
+    `espera_max` segundos si vuelve a fallar al cargar); una inferencia que
+    pasa de `timeout` segundos mata al hijo colgado. Mientras no hay proceso
+    listo, `detectar()` espera hasta `espera_listo` y luego falla.
+    """
+
+    def __init__(self, ruta, backend='onnxruntime', imgsz=320, conf=0.5, slots=3,
+                 forma=(480, 640, 3), timeout=10.0, timeout_carga=120.0, espera_listo=5.0,
+                 espera_max=60.0):
+        self.config = {'modelo': str(ruta), 'backend': backend, 'imgsz': imgsz, 'conf': conf}
+        self.slots = slots
+        self.timeout = timeout
+        self.timeout_carga = timeout_carga
+        self.espera_listo = espera_listo
+        self.espera_max = espera_max
+
+        self._lock = threading.Lock()
+        self._listo = threading.Event()
+        self._activo = False
+        self._proceso = None
+        self._conexion = None
+        self._memoria = None
+        self._capacidad = 0
+        self._siguiente = 0
+        self._seq = 0
+        self._reservar(int(np.prod(forma)))
+
+        self.calentamiento = []
+        self.inferencias = 0
+        self.reinicios = 0
+        self.fallos = 0
+        self.ultima_duracion = None
+        self.ultimo_error = None
+
+    # ----- Memoria compartida -----
+    def _reservar(self, capacidad):
+        """Crea el anillo de slots; el anterior se libera (el hijo ya no lo usa)"""
+        anterior = self._memoria
+        self._memoria = shared_memory.SharedMemory(create=True, size=capacidad * self.slots)
+        self._capacidad = capacidad
+        self._siguiente = 0
+        if anterior is not None:
+            anterior.close()
+            anterior.unlink()
+
+    # ----- Proceso hijo -----
+    def _lanzar(self):
+        """Arranca un hijo y espera a que cargue y caliente el modelo"""
+        padre, hijo = socket.socketpair()
+        argumentos = {**self.config, 'memoria': self._memoria.name, 'capacidad': self._capacidad}
+        try:
+            proceso = subprocess.Popen(
+                [sys.executable, __file__, json.dumps(argumentos), str(hijo.fileno())],
+                pass_fds=(hijo.fileno(),)
+            )
+        finally:
+            hijo.close()
+        conexion = Connection(padre.detach())
+
+        try:
+            if not conexion.poll(self.timeout_carga):
+                raise TimeoutError(f"sin respuesta en {self.timeout_carga:.0f} s")
+            mensaje = conexion.recv()
+            if mensaje[0] != 'listo':
+                raise RuntimeError(mensaje[-1])
+        except Exception as e:
+            self.ultimo_error = f"carga: {e}"
+            logger.error(f"[INFER] ❌ El proceso de inferencia no arrancó: {e}")
+            proceso.kill()
+            proceso.wait()
+            conexion.close()
+            return False
+
+        _, self.calentamiento = mensaje
+        with self._lock:
+            self._proceso, self._conexion = proceso, conexion
+        self._listo.set()
+        logger.info(f"[INFER] ✅ Proceso de inferencia listo (pid {proceso.pid})")
+        return True
+
+    def _descartar(self, motivo):
+        """Da por perdido al hijo actual (se llama con el lock tomado)"""
+        self._listo.clear()
+        self.fallos += 1
+        self.ultimo_error = motivo
+        if self._proceso is not None and self._proceso.poll() is None:
+            self._proceso.kill()
+        if self._conexion is not None:
+            self._conexion.close()
+            self._conexion = None
+
+    def _supervisar(self):
+        espera = 1.0
+        while self._activo:
+            proceso = self._proceso
+            if proceso is None or proceso.poll() is not None:
+                if proceso is not None:
+                    self.reinicios += 1
+                    self._listo.clear()
+                    logger.error(f"[INFER] ❌ El proceso de inferencia terminó (código {proceso.returncode}); "
+                                 f"relanzando en {espera:.0f} s")
+                    time.sleep(espera)
+                    with self._lock:
+                        self._proceso = None
+                if not self._activo:
+                    break
+                espera = 1.0 if self._lanzar() else min(espera * 2, self.espera_max)
+            time.sleep(0.5)
+
+    def start(self):
+        self._activo = True
+        threading.Thread(target=self._supervisar, name='inferencia_supervisor', daemon=True).start()
+
+    def esperar_listo(self, timeout=None):
+        return self._listo.wait(timeout)
+
+    def stop(self):
+        self._activo = False
+        self._listo.clear()
+        with self._lock:
+            if self._conexion is not None:
+                try:
+                    self._conexion.send(('salir',))
+                except OSError:
+                    pass
+                self._conexion.close()
+                self._conexion = None
+            if self._proceso is not None:
+                try:
+                    self._proceso.wait(timeout=3)
+                except subprocess.TimeoutExpired:
+                    self._proceso.kill()
+            if self._memoria is not None:
+                self._memoria.close()
+                self._memoria.unlink()
+                self._memoria = None
+
+    def ajustar(self, conf=None, imgsz=None):
+        """Cambia confianza y/o tamaño de entrada en el hijo actual y en los que se relancen"""
+        cambios = {clave: valor for clave, valor in (('conf', conf), ('imgsz', imgsz)) if valor is not None}
+        with self._lock:
+            self.config.update(cambios)
+            if self._conexion is not None:
+                try:
+                    self._conexion.send(('ajustes', cambios))
+                except OSError:
+                    pass  # El supervisor relanza el hijo con self.config
+
+    # ----- Inferencia -----
+    def detectar(self, frame):
+        if not self._listo.wait(self.espera_listo):
+            raise RuntimeError("proceso de inferencia no disponible")
+
+        with self._lock:
+            conexion = self._conexion
+            if conexion is None:
+                raise RuntimeError("proceso de inferencia no disponible")
+
+            try:
+                if frame.nbytes > self._capacidad:
+                    # Cámara con más resolución de la prevista: anillo nuevo
+                    self._reservar(frame.nbytes)
+                    conexion.send(('memoria', self._memoria.name, self._capacidad))
+
+                slot = self._siguiente
+                self._siguiente = (slot + 1) % self.slots
+                destino = np.ndarray(frame.shape, dtype=np.uint8, buffer=self._memoria.buf,
+                                     offset=slot * self._capacidad)
+                np.copyto(destino, frame)
+                del destino
+
+                self._seq += 1
+                seq = self._seq
+                conexion.send(('frame', slot, seq, frame.shape))
+                while True:
+                    if not conexion.poll(self.timeout):
+                        raise TimeoutError(f"inferencia de más de {self.timeout:.0f} s")
+                    mensaje = conexion.recv()
+                    if mensaje[1] == seq:  # Respuestas atrasadas de un frame abandonado se ignoran
+                        break
+            except (EOFError, OSError, TimeoutError) as e:
+                motivo = str(e) or type(e).__name__
+                self._descartar(motivo)
+                raise RuntimeError(f"proceso de inferencia caído: {motivo}")
+
+        if mensaje[0] == 'error':
+            raise RuntimeError(mensaje[2])
+        _, _, detecciones, duracion = mensaje
+        self.inferencias += 1
+        self.ultima_duracion = duracion
+        return detecciones
+
+    def snapshot(self):
+        proceso = self._proceso
+        return {
+            'pid': proceso.pid if proceso is not None else None,
+            'listo': self._listo.is_set(),
+            'inferencias': self.inferencias,
+            'reinicios': self.reinicios,
+            'fallos': self.fallos,
+            'ultima_duracion_ms': round(self.ultima_duracion * 1000, 1) if self.ultima_duracion else None,
+            'calentamiento_ms': [round(d * 1000, 1) for d in self.calentamiento],
+            'ultimo_error': self.ultimo_error
+        }
+
+
+def servir(conexion, config):
+    """Lado del hijo: carga el modelo y atiende frames hasta que el padre cierre el socket"""
+    from detector import crear_detector, calentar
+
+    try:
+        detector = crear_detector(config['modelo'], backend=config['backend'],
+                                  imgsz=config['imgsz'], conf=config['conf'])
+        duraciones = calentar(detector)
+    except Exception as e:
+        conexion.send(('error', 0, str(e)))
+        return
+
+    memoria = _adjuntar(config['memoria'])
+    capacidad = config['capacidad']
+    conexion.send(('listo', duraciones))
+
+    while True:
+        try:
+            mensaje = conexion.recv()
+        except (EOFError, OSError):
+            break  # El kiosco terminó
+
+        if mensaje[0] == 'salir':
+            break
+        if mensaje[0] == 'ajustes':
+            detector.ajustar(**mensaje[1])
+            continue
+        if mensaje[0] == 'memoria':
+            memoria.close()
+            memoria = _adjuntar(mensaje[1])
+            capacidad = mensaje[2]
+            continue
+
+        _, slot, seq, forma = mensaje
+        frame = np.ndarray(forma, dtype=np.uint8, buffer=memoria.buf, offset=slot * capacidad)
+        inicio = time.perf_counter()
+        try:
+            detecciones = [
+                (clase, tuple(int(v) for v in caja), float(confianza))
+                for clase, caja, confianza in detector.detectar(frame)
+            ]
+        except Exception as e:
+            conexion.send(('error', seq, str(e)))
+            continue
+        finally:
+            del frame
+        conexion.send(('resultado', seq, detecciones, time.perf_counter() - inicio))
+
+    memoria.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    servir(Connection(int(sys.argv[2])), json.loads(sys.argv[1]))
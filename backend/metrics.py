@@ -0,0 +1,231 @@
+"""
+Histogramas de latencia por etapa y exportación en formato Prometheus y JSON
+"""
+import bisect
+import threading
+import time
+
+# Límites superiores en segundos: 0.1 ms .. ~74 s, x√2 entre cubetas
+# (el error de un cuantil interpolado queda por debajo de ~20 %)
+CUBETAS = tuple(round(0.0001 * 2 ** (i / 2), 6) for i in range(40))
+
+# Métodos de Reference/Query de firebase_admin que hablan con la red
+METODOS_FIREBASE = ('get', 'set', 'update', 'delete', 'push', 'transaction', 'listen')
+
+
+class Histogram:
+    """Conteo por cubetas fijas; los cuantiles se interpolan dentro de la cubeta"""
+
+    def __init__(self, cubetas=CUBETAS):
+        self.cubetas = cubetas
+        self.conteos = [0] * (len(cubetas) + 1)
+        self.suma = 0.0
+        self.total = 0
+        self.maximo = 0.0
+        self._lock = threading.Lock()
+
+    def observar(self, segundos):
+        i = bisect.bisect_left(self.cubetas, segundos)
+        with self._lock:
+            self.conteos[i] += 1
+            self.suma += segundos
+            self.total += 1
+            if segundos > self.maximo:
+                self.maximo = segundos
+
+    def cuantil(self, q):
+        with self._lock:
+            conteos, total, maximo = list(self.conteos), self.total, self.maximo
+        if not total:
+            return None
+
+        objetivo = q * total
+        acumulado = 0
+        for i, n in enumerate(conteos):
+            if acumulado + n >= objetivo and n:
+                inferior = self.cubetas[i - 1] if i else 0.0
+                superior = self.cubetas[i] if i < len(self.cubetas) else self.cubetas[-1]
+                return min(inferior + (superior - inferior) * (objetivo - acumulado) / n, maximo)
+            acumulado += n
+        return maximo
+
+    def snapshot(self):
+        total = self.total
+        return {
+            'n': total,
+            'media_ms': round(self.suma / total * 1000, 3) if total else None,
+            **{
+                f"p{int(q * 100)}_ms": round(v * 1000, 3) if v is not None else None
+                for q, v in ((q, self.cuantil(q)) for q in (0.5, 0.95, 0.99))
+            }
+        }
+
+
+class _Cronometro:
+    __slots__ = ('_metricas', '_etapa', '_inicio')
+
+    def __init__(self, metricas, etapa):
+        self._metricas = metricas
+        self._etapa = etapa
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._metricas.observar(self._etapa, time.perf_counter() - self._inicio)
+        return False
+
+
+class _ProxyMedido:
+    """Envuelve una Reference/Query de Firebase y mide cada llamada de red"""
+
+    def __init__(self, objeto, metricas):
+        self._objeto = objeto
+        self._metricas = metricas
+
+    def __getattr__(self, nombre):
+        atributo = getattr(self._objeto, nombre)
+        if not callable(atributo):
+            return atributo
+
+        metricas = self._metricas
+        if nombre in METODOS_FIREBASE:
+            def medido(*args, **kwargs):
+                with metricas.medir(f"firebase_{nombre}"):
+                    return atributo(*args, **kwargs)
+            return medido
+
+        def encadenado(*args, **kwargs):
+            # child(), order_by_child(), equal_to()...: devuelven otra Reference/Query
+            resultado = atributo(*args, **kwargs)
+            return _ProxyMedido(resultado, metricas) if hasattr(resultado, 'get') else resultado
+        return encadenado
+
+
+class Metrics:
+    """Registro de histogramas por etapa y de indicadores instantáneos"""
+
+    habilitado = True
+
+    def __init__(self, prefijo='reciclaje'):
+        self.prefijo = prefijo
+        self._histogramas = {}
+        self._indicadores = {}
+        self._lock = threading.Lock()
+
+    def _histograma(self, etapa):
+        h = self._histogramas.get(etapa)
+        if h is None:
+            with self._lock:
+                h = self._histogramas.setdefault(etapa, Histogram())
+        return h
+
+    def observar(self, etapa, segundos):
+        self._histograma(etapa).observar(segundos)
+
+    def medir(self, etapa):
+        """Context manager que registra la duración del bloque en `etapa`"""
+        return _Cronometro(self, etapa)
+
+    def cronometrar(self, etapa):
+        """Decorador equivalente a `medir()` para una función completa"""
+        def decorador(fn):
+            def medido(*args, **kwargs):
+                with self.medir(etapa):
+                    return fn(*args, **kwargs)
+            medido.__name__ = fn.__name__
+            medido.__doc__ = fn.__doc__
+            return medido
+        return decorador
+
+    def firebase(self, referencia):
+        """`db.reference` con cada llamada de red medida como `firebase_<método>`"""
+        return lambda *args, **kwargs: _ProxyMedido(referencia(*args, **kwargs), self)
+
+    def indicador(self, nombre, ayuda, leer):
+        """Valor instantáneo; `leer()` devuelve un número o {etiqueta: número}"""
+        self._indicadores[nombre] = (ayuda, leer)
+
+    def _leer(self, leer):
+        try:
+            return leer()
+        except Exception:
+            return None
+
+    def snapshot(self):
+        return {
+            'etapas': {etapa: h.snapshot() for etapa, h in sorted(self._histogramas.items())},
+            'indicadores': {nombre: self._leer(leer) for nombre, (_, leer) in self._indicadores.items()}
+        }
+
+    def prometheus(self):
+        """Exposición en texto de Prometheus (formato 0.0.4)"""
+        nombre = f"{self.prefijo}_etapa_segundos"
+        lineas = [
+            f"# HELP {nombre} Latencia por etapa del pipeline",
+            f"# TYPE {nombre} histogram"
+        ]
+        for etapa, h in sorted(self._histogramas.items()):
+            with h._lock:
+                conteos, suma, total = list(h.conteos), h.suma, h.total
+            acumulado = 0
+            for limite, n in zip(h.cubetas, conteos):
+                acumulado += n
+                lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="{limite}"}} {acumulado}')
+            lineas.append(f'{nombre}_bucket{{etapa="{etapa}",le="+Inf"}} {total}')
+            lineas.append(f'{nombre}_sum{{etapa="{etapa}"}} {suma}')
+            lineas.append(f'{nombre}_count{{etapa="{etapa}"}} {total}')
+
+        for indicador, (ayuda, leer) in sorted(self._indicadores.items()):
+            valor = self._leer(leer)
+            completo = f"{self.prefijo}_{indicador}"
+            lineas.append(f"# HELP {completo} {ayuda}")
+            lineas.append(f"# TYPE {completo} gauge")
+            if isinstance(valor, dict):
+                for etiqueta, v in sorted(valor.items()):
+                    if v is not None:
+                        lineas.append(f'{completo}{{nombre="{etiqueta}"}} {v}')
+            elif valor is not None:
+                lineas.append(f"{completo} {valor}")
+        return '\n'.join(lineas) + '\n'
+
+
+class _CronometroNulo:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULO = _CronometroNulo()
+
+
+class NullMetrics:
+    """Instrumentación apagada: no mide nada y no envuelve nada"""
+
+    habilitado = False
+
+    def observar(self, etapa, segundos):
+        pass
+
+    def medir(self, etapa):
+        return _NULO
+
+    def cronometrar(self, etapa):
+        return lambda fn: fn
+
+    def firebase(self, referencia):
+        return referencia
+
+    def indicador(self, nombre, ayuda, leer):
+        pass
+
+    def snapshot(self):
+        return {'habilitado': False}
+
+    def prometheus(self):
+        return ''
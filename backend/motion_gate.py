@@ -0,0 +1,128 @@
+"""
+Compuerta de movimiento: evita correr YOLO cuando la escena no cambió
+"""
+import threading
+import time
+
+import cv2
+
+
+class MotionGate:
+    """Decide por frame si vale la pena correr la inferencia.
+
+    Compara una versión reducida en escala de grises del frame contra un
+    fondo de referencia. La inferencia se ejecuta si:
+      - la fracción de píxeles distintos al fondo supera `umbral_area`,
+      - la última inferencia encontró algo (un objeto quieto sigue contando
+        para los 5 s de permanencia),
+      - sigue vigente la ventana `retencion` tras el último movimiento, o
+      - pasaron `refresco` segundos sin inferir (red de seguridad).
+    El fondo solo se actualiza mientras la escena está vacía, así un objeto
+    apoyado frente a la cámara no se absorbe en el fondo.
+    """
+
+    def __init__(self, tamano=(160, 120), umbral_pixel=25, umbral_area=0.01,
+                 alpha_fondo=0.05, retencion=1.0, refresco=2.0):
+        self.tamano = tamano
+        self.umbral_pixel = umbral_pixel
+        self.umbral_area = umbral_area
+        self.alpha_fondo = alpha_fondo
+        self.retencion = retencion
+        self.refresco = refresco
+
+        self._fondo = None
+        self._gris = None
+        self._ultimo_movimiento = 0.0
+        self._ultima_inferencia = 0.0
+        self._ultimo_vacio = True
+        self._abierta_en = None
+        self._lock = threading.Lock()
+
+        # Métricas
+        self.frames = 0
+        self.omitidos = 0
+        self.costo_total = 0.0
+        self.inferencia_total = 0.0
+        self.inferencias = 0
+        self.latencia_apertura_total = 0.0
+        self.aperturas_con_deteccion = 0
+        self.detecciones_tardias = 0
+
+    def evaluar(self, frame):
+        """True si hay que correr la inferencia sobre este frame"""
+        t0 = time.perf_counter()
+        ahora = time.monotonic()
+
+        pequeno = cv2.resize(frame, self.tamano, interpolation=cv2.INTER_AREA)
+        gris = cv2.GaussianBlur(cv2.cvtColor(pequeno, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+        self._gris = gris
+
+        if self._fondo is None:
+            self._fondo = gris.astype('float32')
+            cambio = 1.0
+        else:
+            diff = cv2.absdiff(gris, cv2.convertScaleAbs(self._fondo))
+            _, mascara = cv2.threshold(diff, self.umbral_pixel, 255, cv2.THRESH_BINARY)
+            cambio = cv2.countNonZero(mascara) / mascara.size
+
+        movimiento = cambio >= self.umbral_area
+        if movimiento:
+            self._ultimo_movimiento = ahora
+            if self._abierta_en is None:
+                self._abierta_en = ahora
+
+        inferir = (
+            movimiento
+            or not self._ultimo_vacio
+            or ahora - self._ultimo_movimiento < self.retencion
+            or ahora - self._ultima_inferencia >= self.refresco
+        )
+
+        with self._lock:
+            self.frames += 1
+            self.costo_total += time.perf_counter() - t0
+            if not inferir:
+                self.omitidos += 1
+
+        if inferir:
+            self._ultima_inferencia = ahora
+        return inferir
+
+    def resultado(self, hubo_deteccion, segundos_inferencia):
+        """Retroalimenta la compuerta con el resultado de la inferencia"""
+        ahora = time.monotonic()
+
+        with self._lock:
+            self.inferencias += 1
+            self.inferencia_total += segundos_inferencia
+
+            if hubo_deteccion and self._ultimo_vacio:
+                if self._abierta_en is not None:
+                    self.latencia_apertura_total += ahora - self._abierta_en
+                    self.aperturas_con_deteccion += 1
+                else:
+                    # Se encontró algo sin que la compuerta viera movimiento
+                    self.detecciones_tardias += 1
+
+        if not hubo_deteccion:
+            self._abierta_en = None
+            # Escena vacía: adaptar el fondo a cambios lentos de luz
+            if self._gris is not None and self._fondo is not None:
+                cv2.accumulateWeighted(self._gris, self._fondo, self.alpha_fondo)
+
+        self._ultimo_vacio = not hubo_deteccion
+
+    def snapshot(self):
+        with self._lock:
+            media_inferencia = self.inferencia_total / self.inferencias if self.inferencias else 0.0
+            return {
+                'frames': self.frames,
+                'omitidos': self.omitidos,
+                'fraccion_omitida': round(self.omitidos / self.frames, 3) if self.frames else 0.0,
+                'costo_ms': round(self.costo_total / self.frames * 1000, 3) if self.frames else 0.0,
+                'cpu_ahorrado_s': round(self.omitidos * media_inferencia, 1),
+                'latencia_apertura_ms': round(
+                    self.latencia_apertura_total / self.aperturas_con_deteccion * 1000, 1
+                ) if self.aperturas_con_deteccion else None,
+                'detecciones_tardias': self.detecciones_tardias
+            }
@@ -0,0 +1,311 @@
+"""
+Ingesta de niveles MQTT: decodifica fuera del hilo de paho y agrupa escrituras por contenedor
+"""
+import json
+import logging
+import numbers
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Lo que aceptamos como id de ESP32: termina siendo una clave de Firebase y de DeviceTable
+DEVICE_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def dispositivo_de_topic(patron, topic):
+    """Segmento del topic que corresponde al '+' del patrón ('reciclaje/+/nivel'),
+    o None si el topic no coincide.
+
+    Lanza ValueError si el segmento no es un id de dispositivo válido.
+    """
+    partes_patron = patron.split('/')
+    partes = topic.split('/')
+    if len(partes) != len(partes_patron):
+        return None
+
+    capturado = None
+    for esperado, parte in zip(partes_patron, partes):
+        if esperado == '+':
+            if not parte:
+                return None
+            capturado = capturado or parte
+        elif esperado != parte:
+            return None
+    if capturado is not None and not DEVICE_ID.match(capturado):
+        raise ValueError(f"id de dispositivo no permitido: {capturado[:80]!r}")
+    return capturado
+
+
+def sin_acentos(texto):
+    """'Vacío' -> 'Vacio' (el firmware publica los estados sin tildes)"""
+    return ''.join(c for c in unicodedata.normalize('NFD', texto) if unicodedata.category(c) != 'Mn')
+
+
+def validar_nivel(datos, device_id, targets, estados):
+    """Payload de `Esp32-Codigo.ino` -> (target, datos del contenedor).
+
+    Lanza ValueError si no cumple el formato o los valores permitidos.
+    """
+    if not isinstance(datos, dict):
+        raise ValueError("el payload no es un objeto JSON")
+
+    target = datos.get('target')
+    if target not in targets:
+        raise ValueError(f"target no permitido: {target!r}")
+
+    state = datos.get('state')
+    if not isinstance(state, str) or sin_acentos(state) not in {sin_acentos(e) for e in estados}:
+        raise ValueError(f"estado no permitido: {state!r}")
+
+    percent = datos.get('percent')
+    distance_cm = datos.get('distance_cm')
+    if not isinstance(percent, numbers.Real) or isinstance(percent, bool):
+        raise ValueError(f"percent no numérico: {percent!r}")
+    if distance_cm is not None and not isinstance(distance_cm, numbers.Real):
+        raise ValueError(f"distance_cm no numérico: {distance_cm!r}")
+
+    if device_id is not None and not (isinstance(device_id, str) and DEVICE_ID.match(device_id)):
+        raise ValueError(f"id de dispositivo no permitido: {str(device_id)[:80]!r}")
+    payload_id = datos.get('deviceId')
+    if payload_id is not None and not (isinstance(payload_id, str) and DEVICE_ID.match(payload_id)):
+        raise ValueError(f"deviceId no permitido: {str(payload_id)[:80]!r}")
+    if payload_id and device_id and payload_id != device_id:
+        raise ValueError(f"deviceId {payload_id!r} no coincide con el topic ({device_id!r})")
+
+    return target, {
+        'deviceId': device_id or payload_id,
+        'distance_cm': round(distance_cm, 3) if distance_cm else 0,
+        'estado': state,
+        'porcentaje': min(max(percent, 0), 100),
+        'timestamp': datos.get('ts'),
+        'updatedAt': int(time.time() * 1000)
+    }
+
+
+class DeviceTable:
+    """Último estado conocido de cada ESP32 y de sus contenedores"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dispositivos = {}
+
+    def _entrada(self, device_id):
+        return self._dispositivos.setdefault(device_id, {
+            'contenedores': {},
+            'mensajes': 0,
+            'invalidos': 0,
+            'ultimo_mensaje': None
+        })
+
+    def registrar(self, device_id, target, valores):
+        with self._lock:
+            entrada = self._entrada(device_id)
+            entrada['contenedores'][target] = valores
+            entrada['mensajes'] += 1
+            entrada['ultimo_mensaje'] = time.time()
+
+    def invalido(self, device_id):
+        if device_id is None:
+            return
+        with self._lock:
+            entrada = self._entrada(device_id)
+            entrada['invalidos'] += 1
+            entrada['ultimo_mensaje'] = time.time()
+
+    def __len__(self):
+        return len(self._dispositivos)
+
+    def snapshot(self):
+        ahora = time.time()
+        with self._lock:
+            return {
+                device_id: {
+                    **entrada,
+                    'contenedores': dict(entrada['contenedores']),
+                    'hace_s': round(ahora - entrada['ultimo_mensaje'], 1) if entrada['ultimo_mensaje'] else None
+                }
+                for device_id, entrada in self._dispositivos.items()
+            }
+
+
+class MqttIngestor:
+    """Recibe mensajes en el hilo de red y los procesa en un hilo propio.
+
+    `recibir()` solo agrega el mensaje crudo a una cola acotada (si se llena
+    se descartan los más viejos), así que el keep-alive de paho nunca espera
+    a JSON ni a Firebase. El hilo de ingesta decodifica con
+    `decodificar(topic, datos) -> (ruta, valores)` (o None si no es válido) y
+    guarda solo el último valor de cada ruta. Cada `ventana` segundos entrega
+    a `escribir({ruta: valores})` un único lote con las rutas que cambiaron;
+    las que repiten su último valor enviado se omiten, salvo que hayan pasado
+    `refresco` segundos (para que `updatedAt` siga sirviendo como latido).
+    `observar(segundos)`, si se pasa, recibe el retraso recepción->escritura
+    de cada ruta escrita.
+    """
+
+    def __init__(self, decodificar, escribir, ventana=1.0, refresco=60.0, max_cola=10000,
+                 ignorar=('timestamp', 'updatedAt'), observar=None):
+        self._decodificar = decodificar
+        self._escribir = escribir
+        self._observar = observar
+        self.ventana = ventana
+        self.refresco = refresco
+        self.ignorar = set(ignorar)
+
+        self._cola = deque(maxlen=max_cola)
+        self._despertar = threading.Event()
+        self._activo = False
+        self._hilo = None
+        self._pendientes = {}  # ruta -> (valores, recibido_en)
+        self._enviados = {}    # ruta -> (valores comparables, enviado_en)
+
+        self.mensajes = 0
+        self.invalidos = 0
+        self.descartados = 0
+        self.lotes = 0
+        self.escrituras = 0
+        self.omitidos = 0
+        self.tasa = 0.0
+        self.lag_ms = 0.0
+        self.lag_max_ms = 0.0
+        self._mensajes_ventana = 0
+        self._ultimo_flush = time.monotonic()
+
+    # ----- Hilo de red (paho) -----
+    def recibir(self, topic, payload):
+        """Encola el mensaje crudo; no decodifica ni bloquea"""
+        if len(self._cola) == self._cola.maxlen:
+            self.descartados += 1
+        self._cola.append((time.monotonic(), topic, payload))
+        self._despertar.set()
+
+    # ----- Hilo de ingesta -----
+    def _consumir(self, hasta=None):
+        """Procesa la cola; con carga sostenida se corta en `hasta` para no
+        retrasar el lote de la ventana"""
+        while self._cola:
+            if hasta is not None and not self.mensajes % 256 and time.monotonic() >= hasta:
+                return
+            recibido, topic, payload = self._cola.popleft()
+            self.mensajes += 1
+            self._mensajes_ventana += 1
+            try:
+                datos = json.loads(payload)
+                resultado = self._decodificar(topic, datos)
+            except (ValueError, UnicodeDecodeError) as e:
+                self._invalido(f"[MQTT] ⚠️ Mensaje inválido en {topic}: {e}")
+                continue
+            except Exception as e:
+                self._invalido(f"[MQTT] ❌ Error procesando mensaje de {topic}: {e}")
+                continue
+
+            if resultado is None:
+                self._invalido(f"[MQTT] ⚠️ Mensaje ignorado en {topic}")
+                continue
+            ruta, valores = resultado
+            self._pendientes[ruta] = (valores, recibido)
+
+    def _invalido(self, mensaje):
+        """Cuenta el mensaje; con una flota grande, solo registra 1 de cada 1000"""
+        if self.invalidos % 1000 == 0:
+            logger.warning(f"{mensaje} ({self.invalidos + 1} inválidos en total)")
+        self.invalidos += 1
+
+    def _comparable(self, valores):
+        return {k: v for k, v in valores.items() if k not in self.ignorar}
+
+    def vaciar(self):
+        """Entrega el lote de la ventana; devuelve cuántas rutas se escribieron"""
+        ahora = time.monotonic()
+        dt = ahora - self._ultimo_flush
+        if dt > 0:
+            instantanea = self._mensajes_ventana / dt
+            self.tasa = instantanea if not self.lotes else self.tasa + 0.2 * (instantanea - self.tasa)
+        self._mensajes_ventana = 0
+        self._ultimo_flush = ahora
+
+        pendientes, self._pendientes = self._pendientes, {}
+        lote = {}
+        recepciones = {}
+        for ruta, (valores, recibido) in pendientes.items():
+            comparable = self._comparable(valores)
+            anterior = self._enviados.get(ruta)
+            if anterior and anterior[0] == comparable and ahora - anterior[1] < self.refresco:
+                self.omitidos += 1
+                continue
+            lote[ruta] = valores
+            recepciones[ruta] = recibido
+
+        if not lote:
+            return 0
+
+        try:
+            self._escribir(lote)
+        except Exception:
+            # Devolver lo no escrito, sin pisar valores más nuevos
+            for ruta, valores in lote.items():
+                self._pendientes.setdefault(ruta, (valores, recepciones[ruta]))
+            raise
+
+        fin = time.monotonic()
+        for ruta, valores in lote.items():
+            self._enviados[ruta] = (self._comparable(valores), fin)
+            lag = (fin - recepciones[ruta]) * 1000
+            if self._observar:
+                self._observar(lag / 1000)
+            self.lag_ms = lag if not self.escrituras else self.lag_ms + 0.2 * (lag - self.lag_ms)
+            self.lag_max_ms = max(self.lag_max_ms, lag)
+            self.escrituras += 1
+        self.lotes += 1
+        return len(lote)
+
+    def _loop(self):
+        proximo = time.monotonic() + self.ventana
+        while self._activo:
+            self._despertar.wait(max(proximo - time.monotonic(), 0))
+            self._despertar.clear()
+            self._consumir(hasta=proximo)
+
+            if time.monotonic() >= proximo:
+                proximo = time.monotonic() + self.ventana
+                try:
+                    self.vaciar()
+                except Exception as e:
+                    logger.error(f"[MQTT] ❌ Error escribiendo lote de niveles: {e}")
+
+        # Último lote al detenerse
+        self._consumir()
+        try:
+            self.vaciar()
+        except Exception as e:
+            logger.error(f"[MQTT] ❌ Error escribiendo último lote: {e}")
+
+    def start(self):
+        self._activo = True
+        self._hilo = threading.Thread(target=self._loop, name='mqtt_ingest', daemon=True)
+        self._hilo.start()
+
+    def stop(self, timeout=5.0):
+        self._activo = False
+        self._despertar.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout)
+
+    def snapshot(self):
+        return {
+            'mensajes': self.mensajes,
+            'invalidos': self.invalidos,
+            'descartados': self.descartados,
+            'en_cola': len(self._cola),
+            'lotes': self.lotes,
+            'escrituras': self.escrituras,
+            'omitidos_sin_cambio': self.omitidos,
+            'tasa_ingesta': round(self.tasa, 1),
+            'coalescencia': round(self.mensajes / self.escrituras, 2) if self.escrituras else None,
+            'lag_ms': round(self.lag_ms, 1),
+            'lag_max_ms': round(self.lag_max_ms, 1)
+        }
@@ -0,0 +1,73 @@
+"""
+Dibujo ligero de detecciones sobre la vista previa
+"""
+import cv2
+import numpy as np
+
+
+def hex_a_bgr(color):
+    """'#2196F3' -> (243, 150, 33)"""
+    color = color.lstrip('#')
+    r, g, b = (int(color[i:i + 2], 16) for i in (0, 2, 4))
+    return b, g, r
+
+
+class Overlay:
+    """Dibuja solo las cajas de las clases relevantes, en sitio.
+
+    Los colores BGR y las etiquetas se calculan una vez por clase. Como el
+    frame de captura lo comparten varias etapas, el dibujo se hace sobre un
+    buffer propio reutilizado (solo cuando hay cajas); sin detecciones el
+    frame pasa sin copiarse.
+    """
+
+    GROSOR = 2
+    FUENTE = cv2.FONT_HERSHEY_SIMPLEX
+    ESCALA_FUENTE = 0.5
+
+    def __init__(self, colores, clases=('plastico', 'aluminio')):
+        self.clases = frozenset(clases)
+        self._colores = {c: hex_a_bgr(colores[c]) for c in clases if c in colores}
+        self._por_defecto = hex_a_bgr(colores.get('primary', '#00BCD4'))
+        self._buffer = None
+
+    def _lienzo(self, frame):
+        """Copia el frame al buffer reutilizado (solo asigna si cambia la forma)"""
+        if self._buffer is None or self._buffer.shape != frame.shape:
+            self._buffer = np.empty_like(frame)
+        np.copyto(self._buffer, frame)
+        return self._buffer
+
+    def dibujar(self, frame, cajas):
+        """Devuelve el frame con las cajas `(x1, y1, x2, y2, clase, conf)` dibujadas"""
+        cajas = [c for c in cajas if c[4] in self.clases]
+        if not cajas:
+            return frame
+
+        lienzo = self._lienzo(frame)
+        for x1, y1, x2, y2, clase, conf in cajas:
+            color = self._colores.get(clase, self._por_defecto)
+            cv2.rectangle(lienzo, (x1, y1), (x2, y2), color, self.GROSOR)
+
+            etiqueta = f"{clase} {conf:.2f}"
+            (tw, th), base = cv2.getTextSize(etiqueta, self.FUENTE, self.ESCALA_FUENTE, 1)
+            y_texto = max(y1, th + base + 2)
+            cv2.rectangle(lienzo, (x1, y_texto - th - base - 2), (x1 + tw + 4, y_texto), color, cv2.FILLED)
+            cv2.putText(lienzo, etiqueta, (x1 + 2, y_texto - base - 1),
+                        self.FUENTE, self.ESCALA_FUENTE, (255, 255, 255), 1, cv2.LINE_AA)
+        return lienzo
+
+
+def cajas_a_metadatos(cajas, ancho, alto):
+    """Cajas normalizadas (0-1) para que el frontend las dibuje en un canvas"""
+    return [
+        {
+            'clase': clase,
+            'conf': round(conf, 3),
+            'x1': round(x1 / ancho, 4),
+            'y1': round(y1 / alto, 4),
+            'x2': round(x2 / ancho, 4),
+            'y2': round(y2 / alto, 4)
+        }
+        for x1, y1, x2, y2, clase, conf in cajas
+    ]
@@ -0,0 +1,117 @@
+"""
+Índice de PIN con hash y limitador de intentos para la búsqueda de usuarios
+"""
+import hashlib
+import hmac
+import threading
+import time
+
+
+class PinIndex:
+    """hash(PIN) -> user_ids, para resolver un PIN en O(1).
+
+    Los PIN no se guardan en claro: la clave del índice es un HMAC-SHA256
+    con el secreto de la aplicación.
+    """
+
+    def __init__(self, secreto):
+        self._secreto = secreto.encode() if isinstance(secreto, str) else secreto
+        self._lock = threading.Lock()
+        self._por_hash = {}
+        self._por_usuario = {}
+
+    def _hash(self, pin):
+        return hmac.new(self._secreto, str(pin).encode(), hashlib.sha256).digest()
+
+    def asignar(self, user_id, pin):
+        """Registra (o borra, con pin=None) el PIN de un usuario"""
+        with self._lock:
+            anterior = self._por_usuario.pop(user_id, None)
+            if anterior is not None:
+                usuarios = self._por_hash.get(anterior)
+                if usuarios:
+                    usuarios.discard(user_id)
+                    if not usuarios:
+                        del self._por_hash[anterior]
+
+            if pin:
+                h = self._hash(pin)
+                self._por_usuario[user_id] = h
+                self._por_hash.setdefault(h, set()).add(user_id)
+
+    def limpiar(self):
+        with self._lock:
+            self._por_hash.clear()
+            self._por_usuario.clear()
+
+    def buscar(self, pin):
+        """user_ids con ese PIN (normalmente uno)"""
+        with self._lock:
+            return sorted(self._por_hash.get(self._hash(pin), ()))
+
+    def __len__(self):
+        return len(self._por_usuario)
+
+
+class PinRateLimiter:
+    """Frena la fuerza bruta sobre PINs de 6 dígitos.
+
+    Por cliente: la IP remota, o la sesión Socket.IO si viene de localhost
+    (el navegador del kiosco, donde todos comparten dirección). Tras
+    `libres` fallos seguidos, cada fallo nuevo bloquea durante
+    `bloqueo_base * 2^n` segundos (hasta `bloqueo_max`); un acierto
+    reinicia el contador. Un cliente sin fallos durante `olvido` segundos y
+    sin bloqueo vigente se olvida. Como una sesión local nueva empieza de
+    cero, además hay un tope global de fallos por minuto, separado para
+    locales (`max_global_local`) y remotos (`max_global_remoto`): un
+    atacante en la red no puede bloquear la pantalla del kiosco.
+    """
+
+    def __init__(self, libres=3, bloqueo_base=30.0, bloqueo_max=900.0, max_global_local=30,
+                 max_global_remoto=30, olvido=900.0):
+        self.libres = libres
+        self.bloqueo_base = bloqueo_base
+        self.bloqueo_max = bloqueo_max
+        self.max_global = {True: max_global_local, False: max_global_remoto}
+        self.olvido = olvido
+        self._lock = threading.Lock()
+        self._clientes = {}  # (local, cliente) -> [fallos, bloqueado_hasta, ultimo_fallo]
+        self._fallos_globales = {True: [], False: []}
+
+    def _podar(self, ahora):
+        """Quita los clientes con el bloqueo vencido y sin fallos recientes (con el lock tomado)"""
+        vencidos = [c for c, (_, hasta, ultimo) in self._clientes.items()
+                    if ahora >= hasta and ahora - ultimo >= self.olvido]
+        for cliente in vencidos:
+            del self._clientes[cliente]
+
+    def permitido(self, cliente, local=False):
+        """(True, 0) si puede intentar; si no, (False, segundos de espera)"""
+        ahora = time.monotonic()
+        with self._lock:
+            recientes = [t for t in self._fallos_globales[local] if ahora - t < 60]
+            self._fallos_globales[local] = recientes
+            if len(recientes) >= self.max_global[local]:
+                return False, int(60 - (ahora - recientes[0])) + 1
+
+            _, bloqueado_hasta, _ = self._clientes.get((local, cliente), (0, 0.0, 0.0))
+            if ahora < bloqueado_hasta:
+                return False, int(bloqueado_hasta - ahora) + 1
+            return True, 0
+
+    def registrar(self, cliente, exito, local=False):
+        ahora = time.monotonic()
+        clave = (local, cliente)
+        with self._lock:
+            if exito:
+                self._clientes.pop(clave, None)
+                return
+
+            self._fallos_globales[local].append(ahora)
+            self._podar(ahora)
+            fallos, _, _ = self._clientes.get(clave, (0, 0.0, 0.0))
+            fallos += 1
+            bloqueo = 0.0
+            if fallos >= self.libres:
+                bloqueo = min(self.bloqueo_base * 2 ** (fallos - self.libres), self.bloqueo_max)
+            self._clientes[clave] = [fallos, ahora + bloqueo, ahora]
@@ -0,0 +1,103 @@
+"""
+Primitivas del pipeline de cámara: colas de "último frame" y contadores de FPS por etapa
+"""
+import threading
+import time
+
+
+class LatestFrameQueue:
+    """Cola acotada que solo conserva el elemento más reciente.
+
+    Cada consumidor lleva su propio cursor (número de secuencia), así que
+    varias etapas pueden leer de la misma cola sin robarse frames. Un
+    consumidor lento nunca acumula atraso: siempre recibe el frame más nuevo
+    y los intermedios se cuentan como descartados.
+    """
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self._cond = threading.Condition()
+        self._item = None
+        self._seq = 0
+        self._cerrada = False
+
+    def put(self, item):
+        """Publica un elemento reemplazando al anterior"""
+        with self._cond:
+            self._item = item
+            self._seq += 1
+            self._cond.notify_all()
+
+    def get(self, ultimo_seq=0, timeout=None):
+        """Espera un elemento más nuevo que `ultimo_seq`.
+
+        Devuelve `(seq, item)`, o `(ultimo_seq, None)` si vence el timeout o
+        la cola se cerró.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._seq > ultimo_seq or self._cerrada, timeout):
+                return ultimo_seq, None
+            if self._seq <= ultimo_seq:
+                return ultimo_seq, None
+            return self._seq, self._item
+
+    def peek(self):
+        """Último elemento publicado sin esperar"""
+        with self._cond:
+            return self._seq, self._item
+
+    def close(self):
+        """Despierta a todos los consumidores para que terminen"""
+        with self._cond:
+            self._cerrada = True
+            self._cond.notify_all()
+
+    @property
+    def cerrada(self):
+        return self._cerrada
+
+
+class StageStats:
+    """FPS y latencia suavizados, frames procesados y descartados de una etapa"""
+
+    def __init__(self, nombre, alpha=0.2):
+        self.nombre = nombre
+        self.alpha = alpha
+        self.fps = 0.0
+        self.frames = 0
+        self.descartados = 0
+        self.latencia_ms = 0.0
+        self._ultimo = None
+        self._lock = threading.Lock()
+
+    def tick(self, saltados=0, duracion=None):
+        """Registra un frame procesado, los `saltados` que se perdieron antes y
+        opcionalmente cuánto tardó la etapa en procesarlo (segundos)"""
+        ahora = time.monotonic()
+        with self._lock:
+            if self._ultimo is not None:
+                dt = ahora - self._ultimo
+                if dt > 0:
+                    instantaneo = 1.0 / dt
+                    if self.fps:
+                        self.fps += self.alpha * (instantaneo - self.fps)
+                    else:
+                        self.fps = instantaneo
+            self._ultimo = ahora
+            self.frames += 1
+            self.descartados += max(saltados, 0)
+            if duracion is not None:
+                ms = duracion * 1000
+                if self.latencia_ms:
+                    self.latencia_ms += self.alpha * (ms - self.latencia_ms)
+                else:
+                    self.latencia_ms = ms
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'fps': round(self.fps, 1),
+                'frames': self.frames,
+                'descartados': self.descartados,
+                'latencia_ms': round(self.latencia_ms, 1)
+            }
@@ -0,0 +1,130 @@
+"""
+Codificación JPEG de la vista previa: tamaño de pantalla, buffers reutilizados y libjpeg-turbo si está
+"""
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('simplejpeg', 'turbojpeg', 'opencv')
+
+# Escalera de la vista previa: fracción del tamaño objetivo y calidad relativa a la base
+ESCALERA = {
+    'alta': (1.0, 0),
+    'media': (0.75, -10),
+    'baja': (0.5, -20)
+}
+
+
+def _cargar_backend(nombre):
+    """Devuelve `codificar(frame_bgr, calidad) -> bytes` para el motor pedido"""
+    if nombre == 'simplejpeg':
+        import simplejpeg
+
+        def codificar(frame, calidad):
+            return simplejpeg.encode_jpeg(frame, quality=calidad, colorspace='BGR',
+                                          colorsubsampling='420', fastdct=True)
+        return codificar
+
+    if nombre == 'turbojpeg':
+        from turbojpeg import TurboJPEG, TJPF_BGR, TJSAMP_420
+
+        jpeg = TurboJPEG()  # Falla si no está libturbojpeg instalada en el sistema
+
+        def codificar(frame, calidad):
+            return jpeg.encode(frame, quality=calidad, pixel_format=TJPF_BGR, jpeg_subsample=TJSAMP_420)
+        return codificar
+
+    if nombre == 'opencv':
+        def codificar(frame, calidad):
+            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+            return buffer.tobytes()
+        return codificar
+
+    raise ValueError(f"Codificador desconocido: {nombre} (opciones: auto, {', '.join(BACKENDS)})")
+
+
+class PreviewEncoder:
+    """Reduce cada frame al tamaño de la pantalla y lo codifica en JPEG.
+
+    El frame se achica (nunca se agranda) para entrar en `objetivo`
+    (ancho, alto) conservando la proporción; cada escalón de `ESCALERA`
+    toma una fracción de ese tamaño y resta calidad. El redimensionado
+    escribe en un buffer preasignado por tamaño, así que a régimen no se
+    asigna memoria para la imagen reducida; solo se crean los bytes del
+    JPEG, que viajan a otros hilos.
+
+    `backend='auto'` prueba simplejpeg y PyTurboJPEG (libjpeg-turbo) y si
+    ninguno está disponible usa cv2.imencode.
+    """
+
+    def __init__(self, objetivo=(320, 480), backend='auto'):
+        self.objetivo = objetivo if objetivo and all(objetivo) else None
+        self._lock = threading.Lock()
+        self._buffers = {}
+
+        candidatos = BACKENDS if backend == 'auto' else (backend,)
+        for nombre in candidatos:
+            try:
+                self._codificar = _cargar_backend(nombre)
+                self.backend = nombre
+                break
+            except (ImportError, OSError, RuntimeError) as e:
+                if backend != 'auto':
+                    raise
+                logger.debug(f"[JPEG] {nombre} no disponible: {e}")
+        logger.info(f"✅ Codificador de vista previa: {self.backend}")
+
+        self.codificados = 0
+        self.segundos = 0.0
+        self.bytes = 0
+
+    def tamano_para(self, ancho, alto, resolucion='alta', escala=1.0):
+        """Tamaño final (ancho, alto) de un frame para el escalón pedido, en pares para 4:2:0"""
+        r = min(self.objetivo[0] / ancho, self.objetivo[1] / alto) if self.objetivo else 1.0
+        r = min(r * ESCALERA[resolucion][0] * escala, 1.0)
+        if r >= 1.0:
+            return ancho, alto
+        return max(int(ancho * r) & ~1, 16), max(int(alto * r) & ~1, 16)
+
+    def codificar(self, frame, resolucion='alta', calidad=80, escala=1.0):
+        """JPEG del frame en el escalón `resolucion`; `escala` y `calidad` vienen del gobernador"""
+        alto, ancho = frame.shape[:2]
+        tamano = self.tamano_para(ancho, alto, resolucion, escala)
+        calidad = int(min(max(calidad + ESCALERA[resolucion][1], 20), 95))
+
+        inicio = time.perf_counter()
+        with self._lock:
+            if tamano != (ancho, alto):
+                destino = self._buffers.get(tamano)
+                if destino is None:
+                    if len(self._buffers) >= 8:
+                        self._buffers.clear()  # Cambió la cámara o la escala: se rearma
+                    destino = self._buffers[tamano] = np.empty((tamano[1], tamano[0], 3), dtype=np.uint8)
+                # INTER_AREA solo tiene camino rápido a la mitad exacta; en otras escalas cuesta 10x
+                mitad = (ancho, alto) == (tamano[0] * 2, tamano[1] * 2)
+                cv2.resize(frame, tamano, dst=destino,
+                           interpolation=cv2.INTER_AREA if mitad else cv2.INTER_LINEAR)
+                frame = destino
+            elif not frame.flags['C_CONTIGUOUS']:
+                frame = np.ascontiguousarray(frame)
+            jpeg = self._codificar(frame, calidad)
+
+        self.codificados += 1
+        self.segundos += time.perf_counter() - inicio
+        self.bytes += len(jpeg)
+        return jpeg
+
+    def snapshot(self):
+        return {
+            'backend': self.backend,
+            'objetivo': list(self.objetivo) if self.objetivo else None,
+            'buffers': [list(t) for t in self._buffers],
+            'codificados': self.codificados,
+            'ms_medio': round(self.segundos / self.codificados * 1000, 2) if self.codificados else None,
+            'kb_medio': round(self.bytes / self.codificados / 1024, 1) if self.codificados else None
+        }
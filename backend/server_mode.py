@@ -0,0 +1,128 @@
+"""
+Modo del servidor Socket.IO: hilos con Werkzeug o cooperativo con eventlet / gevent
+"""
+import collections
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MODOS = ('threading', 'eventlet', 'gevent')
+
+
+class ServerMode:
+    """Cómo se sirve la aplicación según `WEBSOCKET_ASYNC_MODE`.
+
+    En modo cooperativo el servidor web y los handlers de Socket.IO corren
+    como green threads en el hub del hilo principal, sin monkey patching:
+    cámara, NFC, MQTT, Firebase y SQLite siguen en hilos del sistema y no
+    pueden trabar el hub. Lo bloqueante y breve que llaman los handlers pasa
+    por `en_hilo()` (pool de hilos de eventlet o gevent); las esperas largas,
+    como la de /video_feed, se hacen sondeando con `dormir()`. Los `emit` que salen
+    de otros hilos se encolan y los entrega una tarea del hub, despertada
+    por un pipe (`puente_emit()`). En modo `threading` todo queda directo.
+    """
+
+    def __init__(self, modo='threading'):
+        if modo not in MODOS:
+            raise ValueError(f"WEBSOCKET_ASYNC_MODE desconocido: {modo} (opciones: {', '.join(MODOS)})")
+        self.modo = modo
+        self.cooperativo = modo != 'threading'
+        self._cola = collections.deque()
+        self._hilo_hub = None
+        self._lectura = None
+        self._escritura = None
+        self.emitidos_puente = 0
+
+    # ----- Trabajo bloqueante -----
+    def en_hilo(self, fn, *args, **kwargs):
+        """Ejecuta `fn` en un hilo del sistema sin bloquear el hub (directo en modo threading)"""
+        if self.cooperativo and threading.get_ident() != self._hilo_hub:
+            return fn(*args, **kwargs)  # Ya es un hilo del sistema (cámara, vigilante de config)
+        if self.modo == 'eventlet':
+            from eventlet import tpool
+            return tpool.execute(fn, *args, **kwargs)
+        if self.modo == 'gevent':
+            import gevent
+            return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+        return fn(*args, **kwargs)
+
+    def dormir(self, segundos):
+        """Cede el hub (o duerme el hilo en modo threading)"""
+        if self.modo == 'eventlet':
+            import eventlet
+            eventlet.sleep(segundos)
+        elif self.modo == 'gevent':
+            import gevent
+            gevent.sleep(segundos)
+        else:
+            time.sleep(segundos)
+
+    # ----- Emisiones desde otros hilos -----
+    def _esperar_lectura(self, fd):
+        if self.modo == 'eventlet':
+            from eventlet.hubs import trampoline
+            trampoline(fd, read=True)
+        else:
+            from gevent.socket import wait_read
+            wait_read(fd)
+
+    def _despertar(self):
+        try:
+            os.write(self._escritura, b'\0')
+        except BlockingIOError:
+            pass  # Pipe lleno: el hub ya tiene despertares pendientes
+
+    def _despachar(self, emitir):
+        self._hilo_hub = threading.get_ident()
+        while True:
+            self._esperar_lectura(self._lectura)
+            try:
+                os.read(self._lectura, 4096)
+            except BlockingIOError:
+                pass
+            while self._cola:
+                args, kwargs = self._cola.popleft()
+                try:
+                    emitir(*args, **kwargs)
+                    self.emitidos_puente += 1
+                except Exception as e:
+                    logger.error(f"[WebSocket] ❌ Error emitiendo {args[:1]}: {e}")
+
+    def puente_emit(self, socketio):
+        """`socketio.emit` que se puede llamar desde cualquier hilo"""
+        emitir = socketio.emit
+        if not self.cooperativo:
+            return emitir
+
+        self._lectura, self._escritura = os.pipe()
+        os.set_blocking(self._lectura, False)
+        os.set_blocking(self._escritura, False)
+        # Se llama desde el hilo del hub: marcarlo ya, no cuando arranque la tarea,
+        # así los emits y `en_hilo` de antes no se toman por hilos del sistema
+        self._hilo_hub = threading.get_ident()
+        socketio.start_background_task(self._despachar, emitir)
+
+        def emitir_desde_hilo(*args, **kwargs):
+            if threading.get_ident() == self._hilo_hub:
+                return emitir(*args, **kwargs)
+            self._cola.append((args, kwargs))
+            self._despertar()
+        return emitir_desde_hilo
+
+    # ----- Servidor -----
+    def ejecutar(self, socketio, app, host='0.0.0.0', puerto=5000):
+        logger.info(f"🚀 Servidor web en modo {self.modo} (puerto {puerto})")
+        if self.cooperativo:
+            socketio.run(app, host=host, port=puerto, debug=False, use_reloader=False)
+        else:
+            socketio.run(app, host=host, port=puerto, debug=False, allow_unsafe_werkzeug=True)
+
+    def snapshot(self):
+        return {
+            'modo': self.modo,
+            'emitidos_desde_hilos': self.emitidos_puente,
+            'cola_emit': len(self._cola)
+        }
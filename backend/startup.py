@@ -0,0 +1,127 @@
+"""
+Arranque por etapas: subsistemas en segundo plano con marcas de "listo" y tiempos
+"""
+import logging
+import threading
+import time
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+
+class _Subsistema:
+    __slots__ = ('evento', 'estado', 'listo_en', 'duracion', 'error', 'resultado')
+
+    def __init__(self):
+        self.evento = threading.Event()
+        self.estado = 'pendiente'
+        self.listo_en = None
+        self.duracion = None
+        self.error = None
+        self.resultado = None
+
+
+class BootSequence:
+    """Registro de subsistemas que arrancan en paralelo.
+
+    `tarea()` corre la inicialización en su propio hilo (después de sus
+    dependencias) y guarda lo que devuelve; los subsistemas que quedan listos
+    por su cuenta (primer frame, conexión MQTT) se declaran con `pendiente()`
+    y se cierran con `marcar()`. Los tiempos se miden desde la creación del
+    proceso, así incluyen el arranque del intérprete y los imports.
+    """
+
+    def __init__(self):
+        try:
+            self.inicio = psutil.Process().create_time()
+        except Exception:
+            self.inicio = time.time()
+        self._lock = threading.Lock()
+        self._subsistemas = {}
+
+    def _subsistema(self, nombre):
+        with self._lock:
+            return self._subsistemas.setdefault(nombre, _Subsistema())
+
+    def pendiente(self, nombre):
+        self._subsistema(nombre)
+
+    def marcar(self, nombre, error=None, resultado=None, duracion=None):
+        """Cierra un subsistema como listo (o con `error`); solo cuenta la primera vez"""
+        s = self._subsistema(nombre)
+        with self._lock:
+            if s.evento.is_set():
+                return
+            s.listo_en = time.time() - self.inicio
+            s.duracion = duracion
+            s.resultado = resultado
+            s.error = str(error) if error is not None else None
+            s.estado = 'error' if error is not None else 'listo'
+            s.evento.set()
+
+        if error is not None:
+            logger.error(f"[ARRANQUE] ❌ {nombre}: {error}")
+        else:
+            logger.info(f"[ARRANQUE] ⏱️ {nombre} listo a los {s.listo_en:.2f} s")
+        if self.completo:
+            logger.info(f"[ARRANQUE] ✅ Todos los subsistemas iniciados en {s.listo_en:.2f} s")
+
+    def tarea(self, nombre, fn, depende=()):
+        """Ejecuta `fn()` en segundo plano cuando sus dependencias estén listas"""
+        self.pendiente(nombre)
+
+        def correr():
+            for dependencia in depende:
+                if not self.esperar(dependencia):
+                    self.marcar(nombre, error=f"depende de {dependencia}, que falló")
+                    return
+            inicio = time.perf_counter()
+            try:
+                resultado = fn()
+            except Exception as e:
+                self.marcar(nombre, error=e, duracion=time.perf_counter() - inicio)
+                return
+            self.marcar(nombre, resultado=resultado, duracion=time.perf_counter() - inicio)
+
+        threading.Thread(target=correr, name=f"arranque_{nombre}", daemon=True).start()
+
+    def esperar(self, nombre, timeout=None):
+        """True si el subsistema quedó listo; False si falló o se agotó `timeout`"""
+        s = self._subsistema(nombre)
+        return s.evento.wait(timeout) and s.estado == 'listo'
+
+    def listo(self, nombre):
+        s = self._subsistemas.get(nombre)
+        return s is not None and s.estado == 'listo'
+
+    def resultado(self, nombre):
+        s = self._subsistemas.get(nombre)
+        return s.resultado if s is not None else None
+
+    @property
+    def completo(self):
+        """Todos los subsistemas declarados terminaron (bien o con error)"""
+        return all(s.evento.is_set() for s in list(self._subsistemas.values()))
+
+    def tiempos(self):
+        """Segundos desde el inicio del proceso hasta que cada subsistema quedó listo"""
+        return {nombre: round(s.listo_en, 3) for nombre, s in list(self._subsistemas.items())
+                if s.estado == 'listo'}
+
+    def snapshot(self):
+        with self._lock:
+            subsistemas = {
+                nombre: {
+                    'estado': s.estado,
+                    'listo_en_s': round(s.listo_en, 3) if s.listo_en is not None else None,
+                    'duracion_s': round(s.duracion, 3) if s.duracion is not None else None,
+                    'error': s.error
+                }
+                for nombre, s in self._subsistemas.items()
+            }
+        return {
+            'completo': all(s['estado'] != 'pendiente' for s in subsistemas.values()),
+            'segundos': round(time.time() - self.inicio, 1),
+            'subsistemas': subsistemas
+        }
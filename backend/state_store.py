@@ -0,0 +1,61 @@
+"""
+Almacén de estado global con snapshots copy-on-write
+"""
+import copy
+import threading
+
+
+class StateStore:
+    """Estado de la aplicación con lecturas sin bloqueo.
+
+    Cada escritura construye un diccionario nuevo y lo publica reemplazando
+    la referencia anterior, así que los lectores (`snapshot()`, `store[k]`)
+    nunca esperan a nadie. El lock solo se toma durante la transición misma:
+    las funciones pasadas a `transicion()` deben ser cortas y no hacer I/O
+    (Firebase, MQTT, Socket.IO, cámara).
+
+    Los snapshots son de solo lectura. Los valores anidados (`stats`,
+    `contenedores`, ...) se reemplazan completos en lugar de mutarse.
+    """
+
+    def __init__(self, inicial):
+        self._lock = threading.Lock()
+        self._snapshot = copy.deepcopy(inicial)
+
+    def snapshot(self):
+        """Vista consistente del estado completo (no modificar)"""
+        return self._snapshot
+
+    def __getitem__(self, clave):
+        return self._snapshot[clave]
+
+    def get(self, clave, default=None):
+        return self._snapshot.get(clave, default)
+
+    def update(self, **cambios):
+        """Reemplaza varias claves de una sola vez"""
+        with self._lock:
+            nuevo = dict(self._snapshot)
+            nuevo.update(cambios)
+            self._snapshot = nuevo
+
+    def actualizar_en(self, clave, subclave, valor):
+        """Reemplaza `estado[clave][subclave]` copiando solo ese diccionario"""
+        with self._lock:
+            anidado = dict(self._snapshot[clave])
+            anidado[subclave] = valor
+            nuevo = dict(self._snapshot)
+            nuevo[clave] = anidado
+            self._snapshot = nuevo
+
+    def transicion(self, fn):
+        """Aplica `fn(borrador)` de forma atómica y devuelve su resultado.
+
+        `borrador` es una copia superficial del estado actual; lo que `fn`
+        escriba en él se publica al terminar.
+        """
+        with self._lock:
+            borrador = dict(self._snapshot)
+            resultado = fn(borrador)
+            self._snapshot = borrador
+            return resultado
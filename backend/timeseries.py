@@ -0,0 +1,258 @@
+"""
+Historial local de niveles de contenedores (SQLite) con resúmenes por minuto, hora y día
+"""
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MINUTO = 60 * 1000
+HORA = 60 * MINUTO
+DIA = 24 * HORA
+
+# Resolución -> tamaño del intervalo en ms (0 = lecturas crudas)
+RESOLUCIONES = {'raw': 0, '1m': MINUTO, '1h': HORA, '1d': DIA}
+
+# Cuánto se conserva cada resolución (None = para siempre)
+RETENCION = {'raw': 7 * DIA, '1m': 30 * DIA, '1h': 365 * DIA, '1d': None}
+
+
+class TimeSeriesStore:
+    """Serie temporal por contenedor (`<deviceId>/<target>`).
+
+    `agregar()` solo acumula en memoria; un hilo escribe cada `intervalo`
+    segundos el bloque completo en una transacción: las lecturas crudas y el
+    resumen por minuto, hora y día (n, suma, mínimo y máximo del porcentaje y
+    la distancia, último estado), que se actualiza sumando sobre la fila del
+    intervalo en vez de recalcularlo. Las tablas usan la clave (serie, tiempo)
+    como índice agrupado, así que un rango de una serie es una lectura
+    contigua. `consultar()` elige la resolución más fina que quepa en
+    `max_puntos`, y las filas más viejas que `retencion` se borran cada hora.
+    """
+
+    def __init__(self, ruta_db, retencion=None, intervalo=1.0):
+        self.ruta_db = str(ruta_db)
+        self.retencion = {**RETENCION, **(retencion or {})}
+        self.intervalo = intervalo
+
+        self._lock = threading.Lock()
+        self._buffer = []
+        self._activo = False
+        self._despertar = threading.Event()
+        self._ultima_purga = 0.0
+        self._conn = sqlite3.connect(self.ruta_db, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS lecturas (
+                serie TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                distance_cm REAL,
+                porcentaje REAL,
+                estado TEXT,
+                PRIMARY KEY (serie, ts)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS resumenes (
+                intervalo INTEGER NOT NULL,
+                serie TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                n INTEGER NOT NULL,
+                pct_suma REAL, pct_min REAL, pct_max REAL,
+                dist_suma REAL, dist_min REAL, dist_max REAL,
+                estado TEXT,
+                ts_ultimo INTEGER,
+                PRIMARY KEY (intervalo, serie, ts)
+            ) WITHOUT ROWID;
+        """)
+
+        self.lecturas = 0
+        self.repetidas = 0
+        self.escrituras = 0
+        self.ultimo_error = None
+
+    # ----- Escritura -----
+    def agregar(self, serie, ts, distance_cm, porcentaje, estado):
+        """Registra una lectura (ts en ms); se escribe en el siguiente bloque"""
+        with self._lock:
+            self._buffer.append((serie, int(ts), distance_cm, porcentaje, estado))
+
+    def _resumir(self, filas):
+        """Agrupa el bloque por (intervalo, serie, inicio del intervalo)"""
+        grupos = {}
+        for serie, ts, dist, pct, estado in filas:
+            for intervalo in (MINUTO, HORA, DIA):
+                clave = (intervalo, serie, ts - ts % intervalo)
+                g = grupos.get(clave)
+                if g is None:
+                    grupos[clave] = [1, pct, pct, pct, dist, dist, dist, estado, ts]
+                    continue
+                g[0] += 1
+                g[1] += pct
+                g[2] = min(g[2], pct)
+                g[3] = max(g[3], pct)
+                g[4] += dist
+                g[5] = min(g[5], dist)
+                g[6] = max(g[6], dist)
+                if ts >= g[8]:
+                    g[7], g[8] = estado, ts
+        return [clave + tuple(g) for clave, g in grupos.items()]
+
+    def vaciar(self):
+        """Escribe el bloque pendiente; devuelve cuántas lecturas se guardaron"""
+        with self._lock:
+            filas, self._buffer = self._buffer, []
+        if not filas:
+            return 0
+
+        filas = [(s, ts, d or 0.0, p or 0.0, e) for s, ts, d, p, e in filas]
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                # Una lectura repetida (reentrega QoS1, retenido tras reconectar) ya
+                # está en los resúmenes: solo las filas nuevas se suman
+                nuevas = [
+                    fila for fila in filas
+                    if self._conn.execute("INSERT OR IGNORE INTO lecturas VALUES (?, ?, ?, ?, ?)",
+                                          fila).rowcount
+                ]
+                resumenes = self._resumir(nuevas)
+                self._conn.executemany("""
+                    INSERT INTO resumenes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (intervalo, serie, ts) DO UPDATE SET
+                        n = n + excluded.n,
+                        pct_suma = pct_suma + excluded.pct_suma,
+                        pct_min = min(pct_min, excluded.pct_min),
+                        pct_max = max(pct_max, excluded.pct_max),
+                        dist_suma = dist_suma + excluded.dist_suma,
+                        dist_min = min(dist_min, excluded.dist_min),
+                        dist_max = max(dist_max, excluded.dist_max),
+                        estado = CASE WHEN excluded.ts_ultimo >= ts_ultimo THEN excluded.estado ELSE estado END,
+                        ts_ultimo = max(ts_ultimo, excluded.ts_ultimo)
+                """, resumenes)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+        self.lecturas += len(nuevas)
+        self.repetidas += len(filas) - len(nuevas)
+        self.escrituras += 1
+        return len(nuevas)
+
+    def purgar(self, ahora_ms=None):
+        """Borra lo que excede la retención de cada resolución"""
+        ahora_ms = ahora_ms or int(time.time() * 1000)
+        with self._lock:
+            for nombre, intervalo in RESOLUCIONES.items():
+                limite = self.retencion.get(nombre)
+                if limite is None:
+                    continue
+                if intervalo:
+                    self._conn.execute("DELETE FROM resumenes WHERE intervalo = ? AND ts < ?",
+                                       (intervalo, ahora_ms - limite))
+                else:
+                    self._conn.execute("DELETE FROM lecturas WHERE ts < ?", (ahora_ms - limite,))
+
+    def _loop(self):
+        while self._activo:
+            self._despertar.wait(self.intervalo)
+            self._despertar.clear()
+            try:
+                self.vaciar()
+                if time.time() - self._ultima_purga > 3600:
+                    self.purgar()
+                    self._ultima_purga = time.time()
+            except Exception as e:
+                self.ultimo_error = str(e)
+                logger.error(f"[HIST] ❌ Error guardando historial: {e}")
+
+    def start(self):
+        self._activo = True
+        threading.Thread(target=self._loop, name='timeseries', daemon=True).start()
+
+    def stop(self):
+        self._activo = False
+        self._despertar.set()
+        try:
+            self.vaciar()
+        except Exception as e:
+            logger.error(f"[HIST] ❌ Error guardando historial: {e}")
+
+    # ----- Consultas -----
+    def series(self):
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT serie, MAX(ts_ultimo) FROM resumenes WHERE intervalo = ? GROUP BY serie", (DIA,)
+            ).fetchall()
+        return {serie: ultimo for serie, ultimo in filas}
+
+    def elegir_resolucion(self, desde, hasta, max_puntos, ahora_ms=None, crudas=True):
+        """La resolución más fina que cubra el rango sin pasar de `max_puntos`"""
+        ahora_ms = ahora_ms or int(time.time() * 1000)
+        for nombre, intervalo in RESOLUCIONES.items():
+            if not intervalo and not crudas:
+                continue
+            limite = self.retencion.get(nombre)
+            if limite is not None and desde < ahora_ms - limite:
+                continue
+            if intervalo and (hasta - desde) / intervalo > max_puntos:
+                continue
+            if not intervalo and (hasta - desde) > max_puntos * 5 * MINUTO:
+                # Lecturas crudas: el ESP32 publica como máximo cada ~5 min sin cambios
+                continue
+            return nombre
+        return '1d'
+
+    def consultar(self, serie, desde, hasta, resolucion='auto', max_puntos=1000):
+        """Puntos de `serie` entre `desde` y `hasta` (ms); devuelve (resolución, puntos)"""
+        self.vaciar()
+        automatica = resolucion == 'auto'
+        if automatica:
+            resolucion = self.elegir_resolucion(desde, hasta, max_puntos)
+        intervalo = RESOLUCIONES[resolucion]
+
+        if not intervalo:
+            # Las más nuevas primero: si no entran todas, se pierden las viejas
+            with self._lock:
+                filas = self._conn.execute(
+                    "SELECT ts, porcentaje, distance_cm, estado FROM lecturas "
+                    "WHERE serie = ? AND ts BETWEEN ? AND ? ORDER BY ts DESC LIMIT ?",
+                    (serie, desde, hasta, max_puntos + 1)
+                ).fetchall()
+            if len(filas) <= max_puntos or not automatica:
+                return resolucion, [
+                    {'t': ts, 'porcentaje': pct, 'distance_cm': dist, 'estado': estado}
+                    for ts, pct, dist, estado in reversed(filas[:max_puntos])
+                ]
+            # Más lecturas crudas de las estimadas: pasar al primer resumen que quepa
+            resolucion = self.elegir_resolucion(desde, hasta, max_puntos, crudas=False)
+            intervalo = RESOLUCIONES[resolucion]
+
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT ts, n, pct_suma, pct_min, pct_max, dist_suma, dist_min, dist_max, estado "
+                "FROM resumenes WHERE intervalo = ? AND serie = ? AND ts BETWEEN ? AND ? ORDER BY ts",
+                (intervalo, serie, desde - desde % intervalo, hasta)
+            ).fetchall()
+        return resolucion, [
+            {
+                't': ts, 'n': n,
+                'porcentaje': round(pct_suma / n, 2), 'porcentaje_min': pct_min, 'porcentaje_max': pct_max,
+                'distance_cm': round(dist_suma / n, 3), 'distance_min': dist_min, 'distance_max': dist_max,
+                'estado': estado
+            }
+            for ts, n, pct_suma, pct_min, pct_max, dist_suma, dist_min, dist_max, estado in filas
+        ]
+
+    def snapshot(self):
+        with self._lock:
+            pendientes = len(self._buffer)
+        return {
+            'lecturas': self.lecturas,
+            'repetidas': self.repetidas,
+            'bloques': self.escrituras,
+            'pendientes': pendientes,
+            'ultimo_error': self.ultimo_error
+        }
@@ -0,0 +1,288 @@
+"""
+Caché local de usuarios y del índice NFC, sincronizada con listeners de Firebase
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def partes_ruta(ruta):
+    return [p for p in (ruta or '').split('/') if p]
+
+
+def aplicar_evento(arbol, tipo, ruta, datos):
+    """Aplica un evento 'put'/'patch' de Firebase sobre un dict local (en sitio)"""
+    partes = partes_ruta(ruta)
+
+    if not partes:
+        if tipo == 'put':
+            arbol.clear()
+            if isinstance(datos, dict):
+                arbol.update(datos)
+        elif isinstance(datos, dict):
+            # Las claves de un patch pueden ser rutas ("A/usuario_puntos")
+            for clave, valor in datos.items():
+                aplicar_evento(arbol, 'put', clave, valor)
+        return arbol
+
+    nodo = arbol
+    for parte in partes[:-1]:
+        if not isinstance(nodo.get(parte), dict):
+            nodo[parte] = {}
+        nodo = nodo[parte]
+
+    hoja = partes[-1]
+    if tipo == 'put':
+        if datos is None:
+            nodo.pop(hoja, None)
+        else:
+            nodo[hoja] = datos
+    else:
+        if not isinstance(nodo.get(hoja), dict):
+            nodo[hoja] = {}
+        aplicar_evento(nodo[hoja], 'patch', '', datos)
+    return arbol
+
+
+class UserCache:
+    """Resuelve UID NFC -> user_id -> perfil en memoria.
+
+    Al arrancar se suscribe con `listen()` a `nfc_index` y `usuarios`; el
+    primer evento trae el contenido completo y los siguientes solo los
+    cambios, así que cada toque de tarjeta se resuelve sin ir a la red.
+
+    Los perfiles se guardan en un LRU acotado (`max_perfiles`). Si el
+    listener no está activo, las entradas más viejas que `ttl` se refrescan
+    al consultarlas; si esa lectura falla (red caída) se usa la copia local.
+    `referencia(ruta)` es normalmente `firebase_admin.db.reference`.
+
+    Si se pasa un `PinIndex`, el mismo listener de `usuarios` lo mantiene al
+    día (incluidos los usuarios que ya salieron del LRU), así que buscar un
+    usuario por PIN no depende de cuántos haya.
+    """
+
+    def __init__(self, referencia, ttl=300.0, max_perfiles=5000, pines=None):
+        self._ref = referencia
+        self.ttl = ttl
+        self.max_perfiles = max_perfiles
+        self.pines = pines
+
+        self._lock = threading.Lock()
+        self._indice = {}
+        self._perfiles = OrderedDict()  # user_id -> (perfil, cargado_en)
+        self._registros = []
+        self.indice_listo = False
+        self.perfiles_listos = False
+        self.ultimo_evento = None
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.lecturas_red = 0
+
+    # ----- Listeners -----
+    @property
+    def escuchando(self):
+        """True mientras los listeners sigan vivos (si mueren, rige el TTL)"""
+        if not self._registros:
+            return False
+        for registro in self._registros:
+            hilo = getattr(registro, '_thread', None)
+            if hilo is not None and not hilo.is_alive():
+                return False
+        return True
+
+    def _on_indice(self, event):
+        with self._lock:
+            aplicar_evento(self._indice, event.event_type, event.path, event.data)
+            self.indice_listo = True
+            self.ultimo_evento = time.time()
+
+    def _on_usuarios(self, event):
+        partes = partes_ruta(event.path)
+        ahora = time.time()
+
+        with self._lock:
+            self.ultimo_evento = ahora
+
+            if partes:
+                self._aplicar_usuario(event.event_type, partes, event.data, ahora)
+                return
+
+            if event.event_type == 'put':
+                self._perfiles.clear()
+                if self.pines is not None:
+                    self.pines.limpiar()
+                self.perfiles_listos = True
+            # Un patch en la raíz puede traer claves multi-segmento ("A/usuario_puntos"):
+            # cada una equivale a un put en esa ruta
+            for clave, valor in (event.data or {}).items():
+                sub = partes_ruta(clave)
+                if sub:
+                    self._aplicar_usuario('put', sub, valor, ahora)
+
+    def _aplicar_usuario(self, tipo, partes, datos, ahora):
+        """Evento bajo `usuarios/<user_id>/...` (con el lock tomado)"""
+        user_id = partes[0]
+        if len(partes) == 1 and tipo == 'put':
+            if datos is None:
+                self._perfiles.pop(user_id, None)
+            else:
+                self._guardar(user_id, datos, ahora)
+            self._indexar_pin(user_id, datos)
+        elif user_id in self._perfiles:
+            perfil = dict(self._perfiles[user_id][0])
+            aplicar_evento(perfil, tipo, '/'.join(partes[1:]), datos)
+            self._guardar(user_id, perfil, ahora)
+            self._indexar_pin(user_id, perfil)
+        else:
+            # Usuarios fuera de la caché se cargan bajo demanda, pero su PIN
+            # se sigue indexando
+            resto = partes[1:]
+            if resto == ['usuario_nip']:
+                self._indexar_pin(user_id, {'usuario_nip': datos})
+            elif not resto and isinstance(datos, dict) and 'usuario_nip' in datos:
+                self._indexar_pin(user_id, datos)
+
+    def _indexar_pin(self, user_id, perfil):
+        if self.pines is None:
+            return
+        pin = perfil.get('usuario_nip') if isinstance(perfil, dict) else None
+        self.pines.asignar(user_id, pin)
+
+    def _guardar(self, user_id, perfil, cargado_en):
+        """Inserta en el LRU y expulsa lo menos usado (con el lock tomado)"""
+        self._perfiles[user_id] = (perfil, cargado_en)
+        self._perfiles.move_to_end(user_id)
+        while len(self._perfiles) > self.max_perfiles:
+            self._perfiles.popitem(last=False)
+
+    def start(self):
+        """Suscribe los listeners (la carga inicial llega como primer evento)"""
+        try:
+            self._registros = [
+                self._ref('nfc_index').listen(self._on_indice),
+                self._ref('usuarios').listen(self._on_usuarios)
+            ]
+            logger.info("[CACHE] ✅ Escuchando cambios de nfc_index y usuarios")
+        except Exception as e:
+            self.stop()
+            logger.error(f"[CACHE] ❌ No se pudo suscribir a Firebase: {e}")
+
+    def stop(self):
+        for registro in self._registros:
+            try:
+                registro.close()
+            except Exception:
+                pass
+        self._registros = []
+
+    # ----- Consultas -----
+    def _leer_red(self, ruta):
+        self.lecturas_red += 1
+        return self._ref(ruta).get()
+
+    def user_id_por_uid(self, uid_hex):
+        uid = uid_hex.upper()
+        with self._lock:
+            user_id = self._indice.get(uid)
+            listo = self.indice_listo and self.escuchando
+        if user_id or listo:
+            return user_id
+
+        # Índice aún no cargado o listener caído: consultar solo esa entrada
+        user_id = self._leer_red(f"nfc_index/{uid}")
+        if user_id:
+            with self._lock:
+                self._indice[uid] = user_id
+        return user_id
+
+    def perfil(self, user_id):
+        ahora = time.time()
+        with self._lock:
+            entrada = self._perfiles.get(user_id)
+            if entrada is not None:
+                self._perfiles.move_to_end(user_id)
+            vigente = entrada is not None and (self.escuchando or ahora - entrada[1] < self.ttl)
+
+        if vigente:
+            self.aciertos += 1
+            return entrada[0]
+
+        self.fallos += 1
+        try:
+            perfil = self._leer_red(f"usuarios/{user_id}")
+        except Exception as e:
+            if entrada is not None:
+                logger.warning(f"[CACHE] ⚠️ Sin red ({e}), usando perfil local de {user_id}")
+                return entrada[0]
+            raise
+
+        if perfil is not None:
+            with self._lock:
+                self._guardar(user_id, perfil, ahora)
+        return perfil
+
+    def user_id_por_pin(self, pin):
+        """PIN -> user_id, o None si ningún usuario lo tiene"""
+        with self._lock:
+            listo = self.pines is not None and self.perfiles_listos and self.escuchando
+        if listo:
+            user_ids = self.pines.buscar(pin)
+            return user_ids[0] if user_ids else None
+
+        # Sin índice local: consulta indexada en el servidor
+        # (requiere ".indexOn": ["usuario_nip"] en las reglas de `usuarios`)
+        self.lecturas_red += 1
+        encontrados = self._ref('usuarios').order_by_child('usuario_nip').equal_to(pin).limit_to_first(1).get()
+        if not encontrados:
+            return None
+        user_id, perfil = next(iter(encontrados.items()))
+        with self._lock:
+            self._guardar(user_id, perfil, time.time())
+        return user_id
+
+    def buscar_por_pin(self, pin):
+        """PIN -> (user_id, perfil), o (None, None)"""
+        user_id = self.user_id_por_pin(pin)
+        if not user_id:
+            return None, None
+        return user_id, self.perfil(user_id)
+
+    def buscar(self, uid_hex):
+        """UID -> (user_id, perfil), o (None, None) si no está registrado"""
+        user_id = self.user_id_por_uid(uid_hex)
+        if not user_id:
+            return None, None
+        return user_id, self.perfil(user_id)
+
+    # ----- Escrituras locales (antes de que las confirme el listener) -----
+    def actualizar_perfil(self, user_id, cambios):
+        with self._lock:
+            entrada = self._perfiles.get(user_id)
+            if entrada is not None:
+                self._guardar(user_id, {**entrada[0], **cambios}, entrada[1])
+
+    def vincular(self, uid_hex, user_id, uid_anterior=None):
+        with self._lock:
+            if uid_anterior and uid_anterior.upper() != uid_hex.upper():
+                self._indice.pop(uid_anterior.upper(), None)
+            self._indice[uid_hex.upper()] = user_id
+        self.actualizar_perfil(user_id, {'usuario_nfcUid': uid_hex})
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'escuchando': self.escuchando,
+                'indice_listo': self.indice_listo,
+                'perfiles_listos': self.perfiles_listos,
+                'uids': len(self._indice),
+                'perfiles': len(self._perfiles),
+                'pines': len(self.pines) if self.pines is not None else None,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'lecturas_red': self.lecturas_red,
+                'ultimo_evento': self.ultimo_evento
+            }
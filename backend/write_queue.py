@@ -0,0 +1,317 @@
+"""
+Cola local de escrituras (write-ahead) hacia Firebase sobre SQLite en modo WAL
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+
+def incremento(n):
+    """Valor de servidor de Firebase que suma `n` al valor actual"""
+    return {'.sv': {'increment': n}}
+
+
+def es_incremento(valor):
+    return isinstance(valor, dict) and isinstance(valor.get('.sv'), dict) and 'increment' in valor['.sv']
+
+
+def fusionar(cambios, ruta, valor):
+    """Agrega una ruta al lote: los incrementos a la misma ruta se suman,
+    cualquier otro valor reemplaza al anterior"""
+    anterior = cambios.get(ruta)
+    if es_incremento(anterior) and es_incremento(valor):
+        valor = incremento(anterior['.sv']['increment'] + valor['.sv']['increment'])
+    cambios[ruta] = valor
+
+
+def aplanar(ruta, datos):
+    """`update()` sobre `ruta` -> rutas hijas para una actualización multi-ruta en la raíz"""
+    ruta = ruta.strip('/')
+    if isinstance(datos, dict):
+        return {f"{ruta}/{clave}" if ruta else clave: valor for clave, valor in datos.items()}
+    return {ruta: datos}
+
+
+def error_permanente(e):
+    """Rechazos que no se arreglan reintentando: validación local (ValueError/TypeError)
+    y respuestas 400/403 del Admin SDK"""
+    if isinstance(e, (ValueError, TypeError)):
+        return True
+    return type(e).__name__ in ('InvalidArgumentError', 'PermissionDeniedError', 'FailedPreconditionError')
+
+
+class WriteAheadQueue:
+    """Registra cada escritura localmente y la replica a Firebase en segundo plano.
+
+    `encolar()` solo hace un INSERT en SQLite (WAL, synchronous=NORMAL): el
+    llamador no espera a la red. Un hilo vacía la cola en lotes, aplicando
+    todas las rutas del lote en una sola actualización multi-ruta, y borra
+    las filas únicamente cuando Firebase confirmó. Si falla, reintenta con
+    espera exponencial sin perder ni reordenar eventos.
+
+    Cada evento lleva una clave de idempotencia única: encolar dos veces la
+    misma clave no duplica el evento. Los valores absolutos se pueden repetir
+    sin cambiar el resultado; los incrementos (`incremento(n)`) a una misma
+    ruta se suman en un solo incremento por lote, y no se pueden repetir.
+    Por eso cada lote se marca en vuelo antes de enviarlo; si falla o el
+    proceso muere a mitad, se reintenta exactamente el mismo conjunto de
+    eventos y antes se pregunta a `confirmado(cambios)` si Firebase ya lo
+    aplicó (la respuesta pudo perderse después de escribir).
+    `aplicar(cambios)` recibe `{ruta: valor}` y debe lanzar excepción si la
+    escritura no se completó. `observar(tipo, segundos)`, si se pasa, recibe
+    cuánto tardó cada evento desde que se encoló hasta que Firebase lo confirmó.
+
+    Un error de red o de servidor reintenta el lote tal cual. Si
+    `permanente(error)` dice que Firebase lo rechazará siempre (ruta o valor
+    inválido, permiso), el lote se reenvía evento por evento y el culpable
+    pasa a la tabla `descartados`, así no traba a los que vienen detrás.
+    """
+
+    def __init__(self, ruta_db, aplicar, lote=100, intervalo=1.0, espera_max=60.0, confirmado=None,
+                 observar=None, permanente=None):
+        self.ruta_db = str(ruta_db)
+        self._aplicar = aplicar
+        self._confirmado = confirmado
+        self._permanente = permanente or error_permanente
+        self._observar = observar
+        self.lote = lote
+        self.intervalo = intervalo
+        self.espera_max = espera_max
+
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._activo = False
+        self._conn = sqlite3.connect(self.ruta_db, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS eventos (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                clave TEXT NOT NULL UNIQUE,
+                tipo TEXT NOT NULL,
+                ruta TEXT NOT NULL,
+                datos TEXT NOT NULL,
+                creado REAL NOT NULL,
+                intentos INTEGER NOT NULL DEFAULT 0,
+                ultimo_error TEXT
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS descartados (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                clave TEXT NOT NULL,
+                tipo TEXT NOT NULL,
+                ruta TEXT NOT NULL,
+                datos TEXT NOT NULL,
+                creado REAL NOT NULL,
+                error TEXT,
+                descartado REAL NOT NULL
+            )
+        """)
+
+        self.enviados = 0
+        self.lotes = 0
+        self.escrituras = 0
+        self.recuperados = 0
+        self.fallos = 0
+        self.ultimo_envio = None
+        self.ultimo_error = None
+
+    def encolar(self, tipo, ruta, datos, clave=None):
+        """Guarda un evento localmente; devuelve su clave de idempotencia"""
+        clave = clave or uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO eventos (clave, tipo, ruta, datos, creado) VALUES (?, ?, ?, ?, ?)",
+                (clave, tipo, ruta, json.dumps(datos), time.time())
+            )
+        self._despertar.set()
+        return clave
+
+    def _contar_descartados(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM descartados").fetchone()[0]
+
+    def pendientes(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+
+    def _tomar_lote(self):
+        """Siguiente lote; tras un fallo, exactamente el mismo lote que falló"""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT id, tipo, ruta, datos, creado FROM eventos WHERE intentos > 0 ORDER BY id LIMIT ?",
+                (self.lote,)
+            ).fetchall()
+            if filas:
+                return filas, True
+            return self._conn.execute(
+                "SELECT id, tipo, ruta, datos, creado FROM eventos ORDER BY id LIMIT ?", (self.lote,)
+            ).fetchall(), False
+
+    def _borrar(self, ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM eventos WHERE id = ?", [(i,) for i in ids])
+
+    def _fusionar(self, filas):
+        """En orden: si dos eventos tocan la misma ruta gana el más nuevo, salvo los incrementos"""
+        cambios = {}
+        for _id, _tipo, ruta, datos, _creado in filas:
+            for clave, valor in aplanar(ruta, json.loads(datos)).items():
+                fusionar(cambios, clave, valor)
+        return cambios
+
+    def _anotar_error(self, ids, e):
+        with self._lock:
+            self._conn.executemany("UPDATE eventos SET ultimo_error = ? WHERE id = ?",
+                                   [(str(e), i) for i in ids])
+        self.fallos += 1
+        self.ultimo_error = str(e)
+
+    def _confirmados(self, filas, cambios):
+        """Borra las filas que Firebase aceptó y actualiza contadores"""
+        self._borrar([fila[0] for fila in filas])
+        if self._observar:
+            ahora = time.time()
+            for _id, tipo, _ruta, _datos, creado in filas:
+                self._observar(tipo, ahora - creado)
+        self.enviados += len(filas)
+        self.lotes += 1
+        self.escrituras += len(cambios)
+        self.ultimo_envio = time.time()
+
+    def _descartar(self, fila, e):
+        """Mueve a `descartados` un evento que Firebase rechaza siempre"""
+        id_, tipo, ruta, datos, creado = fila
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO descartados (clave, tipo, ruta, datos, creado, error, descartado) "
+                    "SELECT clave, tipo, ruta, datos, creado, ?, ? FROM eventos WHERE id = ?",
+                    (str(e), time.time(), id_)
+                )
+                self._conn.execute("DELETE FROM eventos WHERE id = ?", (id_,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.ultimo_error = str(e)
+        logger.error(f"[OUTBOX] ❌ Evento {tipo} descartado (rechazo permanente): {e}")
+
+    def _uno_por_uno(self, filas, reintento):
+        """Tras un rechazo permanente del lote: cada evento solo, para aislar al culpable"""
+        procesados = 0
+        for fila in filas:
+            cambios = self._fusionar([fila])
+            try:
+                if reintento and self._confirmado and self._confirmado(cambios):
+                    self._borrar([fila[0]])
+                    self.recuperados += 1
+                    procesados += 1
+                    continue
+                self._aplicar(cambios)
+            except Exception as e:
+                if not self._permanente(e):
+                    # Red caída a mitad: lo que queda se reintenta como lote
+                    self._anotar_error([f[0] for f in filas[procesados:]], e)
+                    raise
+                self._descartar(fila, e)
+                procesados += 1
+                continue
+            self._confirmados([fila], cambios)
+            procesados += 1
+        return procesados
+
+    def vaciar(self):
+        """Envía un lote a Firebase; devuelve cuántos eventos salieron de la cola"""
+        filas, reintento = self._tomar_lote()
+        if not filas:
+            return 0
+
+        cambios = self._fusionar(filas)
+        ids = [fila[0] for fila in filas]
+        try:
+            if reintento and self._confirmado and self._confirmado(cambios):
+                # El intento anterior sí llegó: no volver a sumar
+                self._borrar(ids)
+                self.recuperados += len(ids)
+                return len(ids)
+            # En vuelo antes de enviar: si el proceso muere entre `aplicar` y
+            # `_borrar`, al reiniciar el lote vuelve como reintento y pasa por `confirmado`
+            with self._lock:
+                self._conn.executemany("UPDATE eventos SET intentos = intentos + 1 WHERE id = ?",
+                                       [(i,) for i in ids])
+            self._aplicar(cambios)
+        except Exception as e:
+            if not self._permanente(e):
+                # Red o servidor: se reintenta exactamente el mismo lote
+                self._anotar_error(ids, e)
+                raise
+            if len(filas) == 1:
+                self._descartar(filas[0], e)
+                return 1
+            # La actualización multi-ruta es atómica: nada del lote se aplicó
+            logger.warning(f"[OUTBOX] ⚠️ Lote rechazado ({e}); se envía evento por evento")
+            return self._uno_por_uno(filas, reintento=True)
+
+        self._confirmados(filas, cambios)
+        return len(ids)
+
+    def descartados(self, limite=20):
+        """Últimos eventos descartados, para revisarlos a mano"""
+        with self._lock:
+            filas = self._conn.execute(
+                "SELECT clave, tipo, ruta, datos, creado, error, descartado FROM descartados "
+                "ORDER BY id DESC LIMIT ?", (limite,)
+            ).fetchall()
+        return [
+            {'clave': clave, 'tipo': tipo, 'ruta': ruta, 'datos': json.loads(datos), 'creado': creado,
+             'error': error, 'descartado': descartado}
+            for clave, tipo, ruta, datos, creado, error, descartado in filas
+        ]
+
+    def _loop(self):
+        fallos_seguidos = 0
+        while self._activo:
+            espera = self.intervalo if not fallos_seguidos else min(2 ** fallos_seguidos, self.espera_max)
+            self._despertar.wait(espera)
+            self._despertar.clear()
+
+            try:
+                # Vaciar mientras haya lotes completos pendientes
+                while self._activo and self.vaciar() == self.lote:
+                    pass
+                fallos_seguidos = 0
+            except Exception as e:
+                fallos_seguidos += 1
+                logger.warning(f"[OUTBOX] ⚠️ Sin conexión con Firebase ({e}); "
+                               f"{self.pendientes()} eventos pendientes")
+
+    def start(self):
+        self._activo = True
+        threading.Thread(target=self._loop, name='outbox', daemon=True).start()
+        if self.pendientes():
+            self._despertar.set()
+
+    def stop(self):
+        self._activo = False
+        self._despertar.set()
+
+    def snapshot(self):
+        return {
+            'pendientes': self.pendientes(),
+            'enviados': self.enviados,
+            'lotes': self.lotes,
+            'rutas_escritas': self.escrituras,
+            'recuperados': self.recuperados,
+            'fallos': self.fallos,
+            'descartados': self._contar_descartados(),
+            'ultimo_envio': self.ultimo_envio,
+            'ultimo_error': self.ultimo_error
+        }
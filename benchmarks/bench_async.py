@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Benchmark del modo del servidor: threading (Werkzeug) vs eventlet vs gevent
+
+Para cada `WEBSOCKET_ASYNC_MODE` levanta backend/app.py en un subproceso con la cámara,
+el NFC, MQTT y Firebase simulados de `simulados.py` (escena quieta a `--fps-camara`),
+y lo carga con los clientes de `bench_socketio.py` por escalones. La tabla final compara,
+por modo y cantidad de clientes: conexiones logradas, FPS entregado, latencia de eventos
+y CPU/RSS del servidor.
+
+Uso:
+    python benchmarks/bench_async.py [--modos threading,eventlet,gevent] [--clientes 10,50,100,200]
+    python benchmarks/bench_async.py --video prueba.mp4 --segundos 20 --json modos.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import psutil
+
+import bench_socketio
+
+COLUMNAS = (
+    ('conectados', 'conect.'), ('fallidos', 'fallos'), ('fps_p50', 'fps p50'),
+    ('hueco_p95_ms', 'hueco p95'), ('meta_p95_ms', 'meta p95'), ('status_p95_ms', 'status p95'),
+    ('pin_p95_ms', 'pin p95'), ('servidor_cpu_pct', 'CPU %'), ('servidor_rss_mb', 'RSS MB')
+)
+
+
+def servir(args):
+    """Dentro del subproceso: backend simulado sirviendo en el modo pedido"""
+    import bench_e2e
+
+    os.environ['WEBSOCKET_ASYNC_MODE'] = args.servir
+    kiosco, _, _, _ = bench_e2e.levantar_backend(args, 'reposo')
+    kiosco.iniciar_servicios(args.puerto)
+    kiosco.servidor.ejecutar(kiosco.socketio, kiosco.app, host='127.0.0.1', puerto=args.puerto)
+
+
+def esperar_puerto(puerto, timeout=60.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            socket.create_connection(('127.0.0.1', puerto), timeout=0.5).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def medir_modo(args, modo):
+    cmd = [sys.executable, __file__, '--servir', modo, '--puerto', str(args.puerto),
+           '--fps-camara', str(args.fps_camara), '--usuarios', str(args.usuarios),
+           '--latencia-firebase', str(args.latencia_firebase)]
+    if args.video:
+        cmd += ['--video', args.video]
+    servidor = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not esperar_puerto(args.puerto):
+            print(f"{modo}: el servidor no arrancó")
+            return []
+        time.sleep(args.calentamiento)
+
+        carga = argparse.Namespace(
+            url=f"http://127.0.0.1:{args.puerto}", fps=args.fps, res=args.res,
+            intervalo_status=args.intervalo_status, intervalo_pin=args.intervalo_pin,
+            pines=[f"{100000 + i}" for i in range(min(args.usuarios, 50))],
+            procesos=args.procesos, rampa=args.rampa, segundos=args.segundos
+        )
+        proceso = psutil.Process(servidor.pid)
+        resultados = []
+        for n in (int(x) for x in args.clientes.split(',')):
+            r = bench_socketio.correr_escalon(carga, n, proceso)
+            r['modo'] = modo
+            resultados.append(r)
+            print(f"  {modo:9s} {n:5d} clientes: {r['conectados']} conectados, fps p50 {r['fps_p50']}, "
+                  f"status p95 {r['status_p95_ms']} ms, CPU {r['servidor_cpu_pct']} %")
+            time.sleep(2)
+        return resultados
+    finally:
+        servidor.terminate()
+        try:
+            servidor.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            servidor.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modos', default='threading,eventlet,gevent')
+    parser.add_argument('--clientes', default='10,50,100,200')
+    parser.add_argument('--segundos', type=float, default=20.0, help='Duración de cada escalón')
+    parser.add_argument('--calentamiento', type=float, default=3.0)
+    parser.add_argument('--puerto', type=int, default=5055)
+    parser.add_argument('--video', help='Video o directorio de imágenes; sin esto, frames sintéticos')
+    parser.add_argument('--fps-camara', type=float, default=15.0)
+    parser.add_argument('--usuarios', type=int, default=500)
+    parser.add_argument('--latencia-firebase', type=float, default=50.0, help='ms por llamada simulada')
+    parser.add_argument('--fps', default='15', help='?fps= de cada cliente')
+    parser.add_argument('--res', default='media', choices=('alta', 'media', 'baja'))
+    parser.add_argument('--intervalo-status', type=float, default=5.0)
+    parser.add_argument('--intervalo-pin', type=float, default=30.0)
+    parser.add_argument('--rampa', type=float, default=25.0, help='Conexiones nuevas por segundo')
+    parser.add_argument('--procesos', type=int, default=2)
+    parser.add_argument('--json', help='Guardar los resultados en este archivo')
+    parser.add_argument('--servir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.servir:
+        args.modelo = None
+        args.latencia_modelo = 0.0
+        servir(args)
+        return
+
+    resultados = []
+    for modo in args.modos.split(','):
+        print(f"== {modo}")
+        resultados += medir_modo(args, modo)
+
+    print(f"\n{'modo':9s} {'clientes':>8s} " + ' '.join(f"{titulo:>10s}" for _, titulo in COLUMNAS))
+    for r in resultados:
+        valores = ' '.join(f"{str(r.get(clave) if r.get(clave) is not None else '-'):>10s}"
+                           for clave, _ in COLUMNAS)
+        print(f"{r['modo']:9s} {r['clientes']:8d} {valores}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Benchmark de extremo a extremo de backend/app.py sin cámara, lector NFC, HiveMQ ni Firebase
+
+Arranca el backend real en proceso con los sustitutos de `simulados.py` y corre
+escenarios con guion, cada uno en un subproceso propio:
+
+- reposo:   escena quieta, sin materiales (la compuerta debería cerrar YOLO)
+- botellas: una botella tras otra; cada detección se premia acercando una tarjeta
+- toques:   tormenta de toques con tarjetas registradas y desconocidas
+- mqtt:     ráfaga de mensajes de nivel desde una flota de ESP32
+
+Reporta FPS por etapa, latencia detección->premio, CPU, RSS y p95 de las etapas
+instrumentadas. Con `--referencia` compara contra una corrida anterior guardada
+con `--json` y termina con código 1 si algo empeoró más que `--tolerancia`.
+
+Uso:
+    python benchmarks/bench_e2e.py [--video prueba.mp4 | --video carpeta/] [--escenarios reposo,botellas]
+    python benchmarks/bench_e2e.py --json base.json
+    python benchmarks/bench_e2e.py --referencia base.json --tolerancia 0.2
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.join(BENCH_DIR, '..', 'backend')
+
+ESCENARIOS = ('reposo', 'botellas', 'toques', 'mqtt')
+ETAPAS_REPORTADAS = ('captura', 'compuerta', 'inferencia', 'jpeg', 'nfc_total', 'mqtt_ingesta',
+                     'firebase_update')
+
+# Métricas en las que más es mejor; en el resto, menos es mejor
+MAYOR_ES_MEJOR = ('fps_captura', 'fps_inferencia', 'fps_codificacion', 'mqtt_tasa')
+
+
+def percentil(valores, q):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return round(valores[min(int(len(valores) * q), len(valores) - 1)], 1)
+
+
+def sembrar(base, usuarios):
+    """Usuarios con PIN y tarjeta; devuelve los UIDs registrados"""
+    uids = []
+    datos = {'usuarios': {}, 'nfc_index': {}, 'contenedor': {}}
+    for i in range(usuarios):
+        uid = f"04{i:012X}"
+        user_id = f"user{i:04d}"
+        datos['usuarios'][user_id] = {
+            'usuario_nombre': f"Usuario {i}",
+            'usuario_email': f"usuario{i}@ejemplo.com",
+            'usuario_nip': f"{100000 + i}",
+            'usuario_puntos': 0,
+            'usuario_nfcUid': uid
+        }
+        datos['nfc_index'][uid] = user_id
+        uids.append(uid)
+    base.raiz = datos
+    return uids
+
+
+def levantar_backend(args, escenario):
+    """Importa backend/app.py con cámara, NFC, MQTT y Firebase simulados (sin arrancar nada)"""
+    os.environ['DATA_DIR'] = tempfile.mkdtemp(prefix='bench_e2e_')
+    os.environ.setdefault('METRICS', 'True')
+    sys.path.insert(0, BENCH_DIR)
+    sys.path.insert(0, BACKEND_DIR)
+    import simulados
+
+    tarjetero = simulados.TarjeteroSimulado()
+    base = simulados.BaseSimulada(latencia=args.latencia_firebase / 1000)
+    simulados.instalar(tarjetero, base)
+    uids = sembrar(base, args.usuarios)
+
+    frames = simulados.cargar_frames(args.video)
+    if escenario in ('reposo', 'toques', 'mqtt'):
+        frames = frames[:1]
+
+    import app as kiosco
+
+    if args.modelo and kiosco.INFERENCE_WORKER:
+        detector = kiosco.InferenceWorker(os.path.abspath(args.modelo), backend=kiosco.INFERENCE_BACKEND)
+        detector.start()
+    elif args.modelo:
+        from detector import crear_detector
+        detector = crear_detector(args.modelo, backend=kiosco.INFERENCE_BACKEND, imgsz=320, conf=0.5)
+    else:
+        detector = simulados.DetectorSimulado(latencia=args.latencia_modelo / 1000)
+        detector.activo = escenario == 'botellas'
+    kiosco.cargar_modelo = lambda: detector
+    kiosco.cv2.VideoCapture = lambda *a, **k: simulados.CamaraSimulada(frames, fps=args.fps_camara)
+    return kiosco, tarjetero, base, uids
+
+
+def correr_escenario(args):
+    """Dentro del subproceso: levanta el backend, corre el guion y devuelve las medidas"""
+    import psutil
+    import resource
+
+    kiosco, tarjetero, base, uids = levantar_backend(args, args.solo)
+    import simulados
+    from bench_mqtt import Esp32Simulado
+
+    # Registrar cuándo se emite cada evento hacia el frontend
+    eventos = []
+    emitir_original = kiosco.socketio.emit
+
+    def emitir(evento, *a, **k):
+        if evento in ('material_detectado', 'material_procesado', 'nfc_error'):
+            eventos.append((time.monotonic(), evento))
+        return emitir_original(evento, *a, **k)
+    kiosco.socketio.emit = emitir
+
+    # Mismo arranque que el bloque __main__ de app.py, sin servidor web
+    kiosco.iniciar_servicios()
+
+    proceso = psutil.Process()
+    time.sleep(args.calentamiento)
+    cpu_inicial = proceso.cpu_times()
+    inicio = time.monotonic()
+    fin = inicio + args.segundos
+    eventos.clear()
+    toques = []
+
+    if args.solo == 'botellas':
+        # Cada material confirmado se premia acercando la tarjeta de un usuario
+        vistos = 0
+        while time.monotonic() < fin:
+            detectados = [t for t, e in eventos if e == 'material_detectado']
+            if len(detectados) > vistos:
+                vistos = len(detectados)
+                time.sleep(args.retardo_toque)
+                toques.append(time.monotonic())
+                tarjetero.presentar(random.choice(uids), segundos=1.0)
+            time.sleep(0.02)
+
+    elif args.solo == 'toques':
+        while time.monotonic() < fin:
+            uid = random.choice(uids) if random.random() < 0.8 else f"FF{random.getrandbits(48):012X}"
+            tarjetero.presentar(uid, segundos=args.intervalo_toque)
+            time.sleep(args.intervalo_toque)
+
+    elif args.solo == 'mqtt':
+        cliente = simulados.ClienteMqttSimulado.instancias[0]
+        flota = [Esp32Simulado(f"esp32-{i:03d}", inicio) for i in range(args.dispositivos)]
+        targets = ('contePlastico', 'conteAluminio')
+        enviados = 0
+        while time.monotonic() < fin:
+            esp = flota[enviados % len(flota)]
+            cliente.inyectar(esp.topic, esp.mensaje(targets[(enviados // len(flota)) % 2]))
+            enviados += 1
+            espera = inicio + enviados / args.tasa_mqtt - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+
+    else:
+        time.sleep(max(fin - time.monotonic(), 0))
+
+    segundos = time.monotonic() - inicio
+    cpu_final = proceso.cpu_times()
+    cpu = (cpu_final.user - cpu_inicial.user) + (cpu_final.system - cpu_inicial.system)
+
+    # Detección -> premio y toque -> premio
+    detectados = [t for t, e in eventos if e == 'material_detectado']
+    premios = [t for t, e in eventos if e == 'material_procesado']
+    deteccion_premio = [(p - d) * 1000 for d, p in zip(detectados, premios) if p >= d]
+    toque_premio = [(p - t) * 1000 for t, p in zip(toques, premios) if p >= t]
+
+    etapas = kiosco.metricas.snapshot().get('etapas', {})
+    fps = {nombre: st.fps for nombre, st in kiosco.stats_etapas.items()}
+    resultado = {
+        'escenario': args.solo,
+        'segundos': round(segundos, 1),
+        'fps_captura': round(fps['captura'], 1),
+        'fps_inferencia': round(fps['inferencia'], 1),
+        'fps_codificacion': round(fps['codificacion'], 1),
+        'cpu_pct': round(cpu / segundos * 100, 1),
+        'rss_mb': round(proceso.memory_info().rss / 2 ** 20, 1),
+        'rss_pico_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'premios': len(premios),
+        'deteccion_premio_p50_ms': percentil(deteccion_premio, 0.5),
+        'deteccion_premio_p95_ms': percentil(deteccion_premio, 0.95),
+        'toque_premio_p95_ms': percentil(toque_premio, 0.95),
+        'lecturas_nfc': tarjetero.lecturas,
+        'mqtt_tasa': kiosco.ingestor_niveles.snapshot()['tasa_ingesta'],
+        'llamadas_firebase': base.llamadas,
+        'outbox_pendientes': kiosco.outbox.pendientes()
+    }
+    for subsistema, segundos in kiosco.arranque.tiempos().items():
+        resultado[f"arranque_{subsistema}_s"] = segundos
+    for etapa in ETAPAS_REPORTADAS:
+        if etapa in etapas:
+            resultado[f"{etapa}_p95_ms"] = etapas[etapa]['p95_ms']
+    return resultado
+
+
+def comparar(resultados, referencia, tolerancia):
+    """Lista de regresiones respecto de una corrida anterior"""
+    regresiones = []
+    for r in resultados:
+        anterior = referencia.get(r['escenario'])
+        if not anterior:
+            continue
+        for clave, valor in r.items():
+            base = anterior.get(clave)
+            if not isinstance(valor, (int, float)) or not isinstance(base, (int, float)) or not base:
+                continue
+            if clave in ('segundos', 'premios', 'lecturas_nfc', 'llamadas_firebase'):
+                continue
+            cambio = (valor - base) / base
+            peor = -cambio if clave in MAYOR_ES_MEJOR else cambio
+            if peor > tolerancia:
+                regresiones.append(f"{r['escenario']}.{clave}: {base} -> {valor} ({cambio * 100:+.0f}%)")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--video', help='Video o directorio de imágenes; sin esto, frames sintéticos')
+    parser.add_argument('--modelo', help='Modelo ONNX real; sin esto, un detector simulado')
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS))
+    parser.add_argument('--segundos', type=float, default=30.0)
+    parser.add_argument('--calentamiento', type=float, default=3.0)
+    parser.add_argument('--fps-camara', type=float, default=30.0)
+    parser.add_argument('--latencia-modelo', type=float, default=80.0, help='ms por inferencia simulada')
+    parser.add_argument('--latencia-firebase', type=float, default=50.0, help='ms por llamada simulada')
+    parser.add_argument('--usuarios', type=int, default=500)
+    parser.add_argument('--retardo-toque', type=float, default=0.5, help='s entre la detección y el toque')
+    parser.add_argument('--intervalo-toque', type=float, default=0.3)
+    parser.add_argument('--dispositivos', type=int, default=50)
+    parser.add_argument('--tasa-mqtt', type=float, default=500.0, help='mensajes por segundo')
+    parser.add_argument('--json', help='Guardar los resultados en este archivo')
+    parser.add_argument('--referencia', help='Resultados anteriores (de --json) para comparar')
+    parser.add_argument('--tolerancia', type=float, default=0.15)
+    parser.add_argument('--solo', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.solo:
+        print(json.dumps(correr_escenario(args)))
+        os._exit(0)  # Los hilos del backend no terminan solos
+
+    resultados = []
+    for escenario in args.escenarios.split(','):
+        # --escenarios, --json y --referencia (y su valor) solo los usa el proceso padre
+        cmd = [sys.executable, __file__, '--solo', escenario]
+        saltar = False
+        for a in sys.argv[1:]:
+            if saltar:
+                saltar = False
+            elif a in ('--escenarios', '--json', '--referencia'):
+                saltar = True
+            elif not a.startswith(('--escenarios=', '--json=', '--referencia=')):
+                cmd.append(a)
+        salida = subprocess.run(cmd, capture_output=True, text=True)
+        if salida.returncode != 0 or not salida.stdout.strip():
+            print(f"{escenario:10s} error: {salida.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(salida.stdout.strip().splitlines()[-1])
+        resultados.append(r)
+
+        print(f"\n== {escenario} ({r['segundos']} s) ==")
+        for clave, valor in r.items():
+            if clave not in ('escenario', 'segundos') and valor is not None:
+                print(f"  {clave:26s} {valor}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({r['escenario']: r for r in resultados}, f, indent=2)
+
+    if args.referencia:
+        with open(args.referencia) as f:
+            regresiones = comparar(resultados, json.load(f), args.tolerancia)
+        if regresiones:
+            print("\nRegresiones:")
+            for linea in regresiones:
+                print(f"  {linea}")
+            sys.exit(1)
+        print("\nSin regresiones respecto de la referencia")
+
+
+if __name__ == "__main__":
+    main()
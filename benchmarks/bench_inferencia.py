@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inferencia: onnxruntime directo vs ultralytics
+
+Cada motor se mide en un subproceso propio para que el RSS refleje solo
+sus importaciones (torch incluido en el caso de ultralytics).
+
+Uso:
+    python benchmarks/bench_inferencia.py --modelo modelo/best.onnx [--video ruta.mp4] [--frames 200]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+
+def medir_motor(backend, modelo, video, frames, imgsz):
+    """Corre dentro del subproceso: carga el motor, calienta y mide latencia y RSS"""
+    import psutil
+    proceso = psutil.Process()
+    rss_inicial = proceso.memory_info().rss
+
+    t0 = time.perf_counter()
+    sys.path.insert(0, BACKEND_DIR)
+    import cv2
+    import numpy as np
+    from detector import OnnxDetector, UltralyticsDetector
+
+    if backend == 'onnxruntime':
+        detector = OnnxDetector(modelo, imgsz=imgsz)
+    else:
+        detector = UltralyticsDetector(modelo, imgsz=imgsz)
+    carga = time.perf_counter() - t0
+
+    lista = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(lista) < frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            lista.append(frame)
+        cap.release()
+    if not lista:
+        rng = np.random.default_rng(0)
+        lista = [rng.integers(0, 255, (480, 640, 3), dtype=np.uint8) for _ in range(min(frames, 20))]
+
+    # Calentamiento: la primera inferencia inicializa el grafo
+    for frame in lista[:3]:
+        detector.detectar(frame)
+
+    latencias = []
+    for i in range(frames):
+        frame = lista[i % len(lista)]
+        t = time.perf_counter()
+        detector.detectar(frame)
+        latencias.append((time.perf_counter() - t) * 1000)
+
+    latencias.sort()
+    return {
+        'backend': backend,
+        'carga_s': round(carga, 2),
+        'p50_ms': round(latencias[len(latencias) // 2], 2),
+        'p95_ms': round(latencias[int(len(latencias) * 0.95) - 1], 2),
+        'media_ms': round(sum(latencias) / len(latencias), 2),
+        'rss_mb': round(proceso.memory_info().rss / 2 ** 20, 1),
+        'rss_delta_mb': round((proceso.memory_info().rss - rss_inicial) / 2 ** 20, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--modelo', default='modelo/best.onnx')
+    parser.add_argument('--video', help='Video o directorio de prueba para cv2.VideoCapture')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--imgsz', type=int, default=320)
+    parser.add_argument('--backends', default='onnxruntime,ultralytics')
+    parser.add_argument('--solo', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.solo:
+        print(json.dumps(medir_motor(args.solo, args.modelo, args.video, args.frames, args.imgsz)))
+        return
+
+    print(f"{'motor':12s} {'carga s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'media ms':>9s} {'RSS MB':>8s}")
+    for backend in args.backends.split(','):
+        cmd = [sys.executable, __file__, '--solo', backend, '--modelo', args.modelo,
+               '--frames', str(args.frames), '--imgsz', str(args.imgsz)]
+        if args.video:
+            cmd += ['--video', args.video]
+        salida = subprocess.run(cmd, capture_output=True, text=True)
+        if salida.returncode != 0:
+            print(f"{backend:12s} error: {salida.stderr.strip().splitlines()[-1:]}")
+            continue
+        r = json.loads(salida.stdout.strip().splitlines()[-1])
+        print(f"{r['backend']:12s} {r['carga_s']:8.2f} {r['p50_ms']:8.2f} {r['p95_ms']:8.2f} "
+              f"{r['media_ms']:9.2f} {r['rss_mb']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
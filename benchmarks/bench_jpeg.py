@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark de codificación JPEG de la vista previa: camino anterior vs PreviewEncoder
+
+El camino anterior es cv2.imencode sobre el frame completo (640x480, calidad 80).
+Después se mide cada motor disponible de backend/preview_encoder.py (simplejpeg,
+PyTurboJPEG, OpenCV) en cada escalón de la escalera, con el tamaño de pantalla
+`--objetivo`. Reporta frames por segundo de un hilo, ms p50/p95 y KB por frame.
+
+Uso:
+    python benchmarks/bench_jpeg.py [--video ruta.mp4] [--frames 300] [--objetivo 320x480]
+    python benchmarks/bench_jpeg.py --motores opencv --calidad 70 --json jpeg.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import cv2
+
+from bench_transporte import cargar_frames
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from preview_encoder import BACKENDS, ESCALERA, PreviewEncoder
+
+
+def percentil(valores, q):
+    valores = sorted(valores)
+    return round(valores[min(int(len(valores) * q), len(valores) - 1)], 2)
+
+
+def medir(codificar, frames, repeticiones):
+    """Codifica todos los frames `repeticiones` veces; devuelve tiempos en ms y bytes"""
+    for frame in frames[:10]:
+        codificar(frame)  # Calentamiento: buffers y tablas del motor
+    tiempos, total = [], 0
+    for _ in range(repeticiones):
+        for frame in frames:
+            inicio = time.perf_counter()
+            jpeg = codificar(frame)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            total += len(jpeg)
+    return {
+        'fps': round(len(tiempos) / (sum(tiempos) / 1000), 1),
+        'ms_p50': percentil(tiempos, 0.5),
+        'ms_p95': percentil(tiempos, 0.95),
+        'kb': round(total / len(tiempos) / 1024, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--video', help='Video o dispositivo para cv2.VideoCapture')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--calidad', type=int, default=80)
+    parser.add_argument('--objetivo', default='320x480', help='Pantalla ANCHOxALTO (0x0 = nativo)')
+    parser.add_argument('--motores', default=','.join(BACKENDS))
+    parser.add_argument('--json', help='Guardar los resultados en este archivo')
+    args = parser.parse_args()
+
+    frames = cargar_frames(args.video, args.frames)
+    objetivo = tuple(int(v) for v in args.objetivo.lower().split('x'))
+    alto, ancho = frames[0].shape[:2]
+
+    def anterior(frame):
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, args.calidad])
+        return buffer.tobytes()
+
+    resultados = [{'motor': 'anterior', 'escalon': '-', 'tamano': f"{ancho}x{alto}",
+                   **medir(anterior, frames, args.repeticiones)}]
+
+    for motor in args.motores.split(','):
+        try:
+            encoder = PreviewEncoder(objetivo, backend=motor)
+        except (ImportError, OSError, RuntimeError) as e:
+            print(f"{motor}: no disponible ({e})")
+            continue
+        for escalon in ESCALERA:
+            tamano = 'x'.join(map(str, encoder.tamano_para(ancho, alto, escalon)))
+            r = medir(lambda f: encoder.codificar(f, escalon, args.calidad), frames, args.repeticiones)
+            resultados.append({'motor': motor, 'escalon': escalon, 'tamano': tamano, **r})
+
+    base = resultados[0]['fps']
+    print(f"\nFrames: {len(frames)} x {args.repeticiones}, calidad base {args.calidad}")
+    print(f"{'motor':11s} {'escalón':7s} {'tamaño':>9s} {'fps':>8s} {'p50 ms':>7s} {'p95 ms':>7s} "
+          f"{'KB':>6s} {'vs ant.':>7s}")
+    for r in resultados:
+        print(f"{r['motor']:11s} {r['escalon']:7s} {r['tamano']:>9s} {r['fps']:8.1f} {r['ms_p50']:7.2f} "
+              f"{r['ms_p95']:7.2f} {r['kb']:6.1f} {r['fps'] / base:6.1f}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Simulador de flota ESP32 y benchmark de la ingesta MQTT de niveles
+
+Reproduce el payload de `Esp32-Codigo.ino` desde N dispositivos publicando en
+`reciclaje/<deviceId>/nivel` y lo pasa por la misma ingesta del backend
+(wildcard, validación, tabla de dispositivos y agrupamiento). Por defecto usa
+un broker en memoria; con `--broker` publica a un broker local real (mosquitto).
+
+Por defecto cada dispositivo publica sus dos contenedores una vez por segundo
+(`--periodo`, 300 veces más seguido que el firmware). `--tasa 0` inunda tan
+rápido como se pueda: ahí el retraso mide la cola acumulada, no la ingesta, y
+la corrida se marca como saturada.
+
+Uso:
+    python benchmarks/bench_mqtt.py [--dispositivos 50] [--segundos 10] [--periodo 1]
+    python benchmarks/bench_mqtt.py --tasa 0                   # inundación: capacidad máxima
+    python benchmarks/bench_mqtt.py --broker localhost:1883 --dispositivos 200
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+RAIZ = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(RAIZ, 'backend'))
+sys.path.insert(0, RAIZ)
+from config.config import MQTT_TOPIC, ALLOWED_TARGETS, ALLOWED_STATES  # noqa: E402
+from mqtt_ingest import MqttIngestor, DeviceTable, dispositivo_de_topic, validar_nivel  # noqa: E402
+
+MAX_DISTANCE = 50.0
+MIN_DISTANCE = 5.0
+
+
+def calc_state(percent):
+    """Mismos umbrales que calcState() del firmware"""
+    if percent >= 70:
+        return "Lleno"
+    if percent >= 10:
+        return "Medio"
+    return "Vacio"  # Sin tilde, igual que el firmware
+
+
+class Esp32Simulado:
+    """Dos contenedores por dispositivo cuyo llenado avanza como una caminata aleatoria"""
+
+    def __init__(self, device_id, inicio):
+        self.device_id = device_id
+        self.topic = f"reciclaje/{device_id}/nivel"
+        self.inicio = inicio
+        self.niveles = {target: random.uniform(0, 60) for target in sorted(ALLOWED_TARGETS)}
+
+    def mensaje(self, target, invalido=False):
+        nivel = min(max(self.niveles[target] + random.uniform(-1, 3), 0), 100)
+        self.niveles[target] = nivel
+        percent = int(nivel)
+        doc = {
+            'deviceId': self.device_id,
+            'target': target,
+            'distance_cm': round(MAX_DISTANCE - nivel / 100 * (MAX_DISTANCE - MIN_DISTANCE), 2),
+            'percent': percent,
+            'state': calc_state(percent),
+            'ts': int((time.monotonic() - self.inicio) * 1000)
+        }
+        if invalido:
+            doc['state'] = 'Desbordado'
+        return json.dumps(doc).encode()
+
+
+class BrokerLocal:
+    """Sustituto en memoria: entrega en un hilo propio, como el loop de red de paho"""
+
+    def __init__(self, al_recibir):
+        self._al_recibir = al_recibir
+        self._cola = queue.SimpleQueue()
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def publish(self, topic, payload):
+        self._cola.put((topic, payload))
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    def _loop(self):
+        while True:
+            topic, payload = self._cola.get()
+            self._al_recibir(topic, payload)
+
+
+class BrokerReal:
+    """Broker MQTT local real mediante paho (publicador y suscriptor separados)"""
+
+    def __init__(self, direccion, al_recibir):
+        import paho.mqtt.client as mqtt
+
+        host, _, puerto = direccion.partition(':')
+        puerto = int(puerto or 1883)
+        conectado = threading.Event()
+
+        self._sub = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self._sub.on_connect = lambda c, u, f, rc, p: (c.subscribe(MQTT_TOPIC, qos=0), conectado.set())
+        self._sub.on_message = lambda c, u, msg: al_recibir(msg.topic, msg.payload)
+        self._sub.connect(host, puerto)
+        self._sub.loop_start()
+
+        self._pub = mqtt.Client(mqtt.CallbackAPIVersion.VERSION2)
+        self._pub.max_queued_messages_set(0)
+        self._pub.connect(host, puerto)
+        self._pub.loop_start()
+        conectado.wait(5)
+        time.sleep(0.5)  # Dar tiempo a que el SUBACK llegue
+
+    def publish(self, topic, payload):
+        self._pub.publish(topic, payload, qos=0)
+
+    def pendientes(self):
+        return 0  # Lo que retiene mosquitto no se ve desde aquí
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dispositivos', type=int, default=50)
+    parser.add_argument('--segundos', type=float, default=10.0)
+    parser.add_argument('--periodo', type=float, default=1.0,
+                        help='Segundos entre publicaciones de cada dispositivo (el firmware usa 300)')
+    parser.add_argument('--tasa', type=float,
+                        help='Mensajes por segundo en total; pisa a --periodo (0 = tan rápido como se pueda)')
+    parser.add_argument('--invalidos', type=float, default=0.01, help='Fracción de mensajes inválidos')
+    parser.add_argument('--ventana', type=float, default=1.0)
+    parser.add_argument('--broker', help='host:puerto de un broker local; sin esto se usa uno en memoria')
+    args = parser.parse_args()
+
+    random.seed(0)
+    tabla = DeviceTable()
+    escrituras = []
+
+    def decodificar(topic, datos):
+        device_id = dispositivo_de_topic(MQTT_TOPIC, topic)
+        if device_id is None:
+            return None
+        try:
+            target, valores = validar_nivel(datos, device_id, ALLOWED_TARGETS, ALLOWED_STATES)
+        except ValueError:
+            tabla.invalido(device_id)
+            raise
+        tabla.registrar(device_id, target, valores)
+        return f"contenedores/{device_id}/{target}", valores
+
+    targets = sorted(ALLOWED_TARGETS)
+    tasa = args.tasa if args.tasa is not None else args.dispositivos * len(targets) / args.periodo
+
+    ingestor = MqttIngestor(decodificar, lambda lote: escrituras.append(len(lote)),
+                            ventana=args.ventana, max_cola=100000)
+    ingestor.start()
+
+    broker = BrokerReal(args.broker, ingestor.recibir) if args.broker else BrokerLocal(ingestor.recibir)
+
+    inicio = time.monotonic()
+    flota = [Esp32Simulado(f"esp32-{i:03d}", inicio) for i in range(args.dispositivos)]
+    cpu0 = time.process_time()
+
+    def atraso():
+        """Mensajes publicados que la ingesta todavía no procesó"""
+        return broker.pendientes() + ingestor.snapshot()['en_cola']
+
+    publicados = 0
+    atraso_max = 0
+    proxima_muestra = inicio
+    fin = inicio + args.segundos
+    while time.monotonic() < fin:
+        esp = flota[publicados % len(flota)]
+        target = targets[(publicados // len(flota)) % len(targets)]
+        broker.publish(esp.topic, esp.mensaje(target, random.random() < args.invalidos))
+        publicados += 1
+        if time.monotonic() >= proxima_muestra:
+            atraso_max = max(atraso_max, atraso())
+            proxima_muestra += 0.1
+        if tasa:
+            espera = inicio + publicados / tasa - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+    tasa_publicada = publicados / (time.monotonic() - inicio)
+    atraso_fin = atraso()
+
+    # Esperar a que la ingesta alcance a lo publicado
+    limite = time.monotonic() + 10
+    while ingestor.mensajes + ingestor.descartados < publicados and time.monotonic() < limite:
+        time.sleep(0.05)
+    ingestor.stop()
+
+    segundos = time.monotonic() - inicio
+    cpu = time.process_time() - cpu0
+    r = ingestor.snapshot()
+
+    # Saturada: no se sostuvo la tasa pedida, se perdieron mensajes o al cortar la
+    # publicación quedaba más de una ventana de atraso
+    saturada = (not tasa or tasa_publicada < 0.95 * tasa or r['descartados'] > 0
+                or atraso_fin > max(tasa_publicada * args.ventana, 1))
+
+    print(f"Dispositivos: {args.dispositivos} ({len(tabla)} en la tabla)  broker: {args.broker or 'memoria'}")
+    print(f"Tasa pedida: {f'{tasa:,.0f} msg/s' if tasa else 'sin límite'}  "
+          f"publicada: {tasa_publicada:,.0f} msg/s")
+    print(f"Publicados: {publicados}  ingeridos: {r['mensajes']}  inválidos: {r['invalidos']}  "
+          f"descartados: {r['descartados']}")
+    print(f"Atraso: máx {atraso_max} mensajes, {atraso_fin} al cortar la publicación")
+    print(f"Tasa: {r['mensajes'] / segundos:,.0f} msg/s  CPU: {cpu / max(r['mensajes'], 1) * 1e6:.1f} µs/msg")
+    print(f"Escrituras: {r['escrituras']} rutas en {r['lotes']} lotes  "
+          f"agrupamiento: {r['coalescencia']} msg/escritura")
+    print(f"Retraso recepción->escritura: {r['lag_ms']} ms (máx {r['lag_max_ms']} ms)"
+          + ("  <- incluye la cola acumulada" if saturada else ""))
+    print("Resultado: SATURADA (la ingesta no alcanzó a la publicación)" if saturada
+          else "Resultado: OK (la ingesta sigue el ritmo)")
+
+
+if __name__ == "__main__":
+    main()
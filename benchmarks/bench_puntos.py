@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Benchmark de acumulación de puntos: leer-sumar-escribir vs libro de puntos + incrementos
+
+Simula varios kioscos premiando a los mismos usuarios a la vez contra una
+base en memoria con latencia de red y respuestas perdidas, y compara el saldo
+final con el esperado y cuántas escrituras cuesta cada premio.
+
+Uso:
+    python benchmarks/bench_puntos.py [--kioscos 4] [--premios 200] [--usuarios 5]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend'))
+from write_queue import WriteAheadQueue, es_incremento, incremento  # noqa: E402
+
+
+class BaseFalsa:
+    """Realtime Database mínima: get/update multi-ruta atómico con `.sv increment`"""
+
+    def __init__(self, latencia, perdidas):
+        self.latencia = latencia
+        self.perdidas = perdidas
+        self.datos = {}
+        self.llamadas = 0
+        self._lock = threading.Lock()
+
+    def get(self, ruta):
+        time.sleep(self.latencia)
+        with self._lock:
+            return self.datos.get(ruta)
+
+    def update(self, cambios):
+        time.sleep(self.latencia / 2)
+        with self._lock:
+            self.llamadas += 1
+            for ruta, valor in cambios.items():
+                if es_incremento(valor):
+                    valor = (self.datos.get(ruta) or 0) + valor['.sv']['increment']
+                self.datos[ruta] = valor
+        time.sleep(self.latencia / 2)
+        if random.random() < self.perdidas:
+            raise ConnectionError("respuesta perdida")
+
+
+def legado(base, usuarios, premios, kioscos):
+    """Como antes: leer el saldo, sumar localmente y escribir el valor absoluto"""
+    def kiosco():
+        for _ in range(premios):
+            ruta = f"usuarios/{random.choice(usuarios)}/usuario_puntos"
+            saldo = base.get(ruta) or 0
+            while True:
+                try:
+                    base.update({ruta: saldo + 3})
+                    break
+                except ConnectionError:
+                    pass
+
+    hilos = [threading.Thread(target=kiosco) for _ in range(kioscos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+
+def libro(base, usuarios, premios, kioscos, directorio):
+    """Nuevo: asiento idempotente + incremento, encolados y enviados en lotes"""
+    def confirmado(cambios):
+        asientos = [ruta for ruta in cambios if ruta.startswith('puntos_ledger/')]
+        return bool(asientos) and base.get(asientos[0]) is not None
+
+    def kiosco(n):
+        cola = WriteAheadQueue(os.path.join(directorio, f"kiosco{n}.db"), base.update,
+                               confirmado=confirmado)
+        for i in range(premios):
+            user_id = random.choice(usuarios)
+            clave = f"k{n}-{i}"
+            cola.encolar('puntos', '', {
+                f"puntos_ledger/{user_id}/{clave}": {'puntos': 3},
+                f"usuarios/{user_id}/usuario_puntos": incremento(3)
+            }, clave=clave)
+            if i % 10 == 9:
+                vaciar(cola)
+        vaciar(cola)
+
+    def vaciar(cola):
+        while cola.pendientes():
+            try:
+                cola.vaciar()
+            except ConnectionError:
+                pass
+
+    hilos = [threading.Thread(target=kiosco, args=(n,)) for n in range(kioscos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--kioscos', type=int, default=4)
+    parser.add_argument('--premios', type=int, default=200, help='Premios por kiosco')
+    parser.add_argument('--usuarios', type=int, default=5)
+    parser.add_argument('--latencia-ms', type=float, default=5.0)
+    parser.add_argument('--perdidas', type=float, default=0.05, help='Fracción de respuestas perdidas')
+    args = parser.parse_args()
+
+    usuarios = [f"user{i}" for i in range(args.usuarios)]
+    total = args.kioscos * args.premios
+    esperado = total * 3
+
+    print(f"{'esquema':10s} {'saldo':>8s} {'esperado':>9s} {'perdido':>8s} {'updates/premio':>15s} {'s':>6s}")
+    for nombre in ('legado', 'libro'):
+        random.seed(0)
+        base = BaseFalsa(args.latencia_ms / 1000, args.perdidas)
+        t0 = time.perf_counter()
+        if nombre == 'legado':
+            legado(base, usuarios, args.premios, args.kioscos)
+        else:
+            with tempfile.TemporaryDirectory() as directorio:
+                libro(base, usuarios, args.premios, args.kioscos, directorio)
+        segundos = time.perf_counter() - t0
+
+        saldo = sum(base.datos.get(f"usuarios/{u}/usuario_puntos") or 0 for u in usuarios)
+        print(f"{nombre:10s} {saldo:8d} {esperado:9d} {esperado - saldo:8d} "
+              f"{base.llamadas / total:15.2f} {segundos:6.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de Socket.IO: cientos de clientes de la vista en vivo contra el backend
+
+Cada cliente se comporta como frontend/static/js/app.js: se conecta con `?fps=&res=`,
+recibe `camera_frame` y lo confirma (ack), escucha `camera_meta`, pide `request_status`
+cada `--intervalo-status` segundos y hace búsquedas de PIN. La cantidad de clientes sube
+por escalones (`--clientes 10,50,100,200`) y en cada uno se reporta:
+
+- FPS entregado por cliente (mínimo, mediana y media) y hueco p95 entre frames
+- latencia de `camera_meta` (marca de tiempo del servidor -> llegada)
+- ida y vuelta de `request_status` -> `status_update` y de `search_user_by_pin`
+- CPU y RSS del proceso del servidor (si corre en la misma máquina)
+
+Los clientes corren en `--procesos` procesos con asyncio para que el generador no sea el
+cuello de botella. El límite de intentos de PIN es por sesión, pero el tope global de fallos
+por minuto responde "Demasiados intentos" a la mayoría de las búsquedas; eso también se cuenta.
+
+Uso:
+    python backend/app.py &
+    python benchmarks/bench_socketio.py --url http://localhost:5000 --clientes 10,50,100,200
+    python benchmarks/bench_socketio.py --clientes 300 --res baja --fps 2 --procesos 4 --json carga.json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import random
+import time
+import urllib.request
+
+import psutil
+import socketio
+
+
+def percentil(valores, q):
+    if not valores:
+        return None
+    valores = sorted(valores)
+    return round(valores[min(int(len(valores) * q), len(valores) - 1)], 1)
+
+
+class ClienteVista:
+    """Un navegador de la vista en vivo"""
+
+    def __init__(self, args):
+        self.args = args
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.frames = 0
+        self.bytes = 0
+        self.huecos = []
+        self.ultimo_frame = None
+        self.meta_ms = []
+        self.status_ms = []
+        self.pin_ms = []
+        self.pin_respuestas = {}
+        self._status_pendientes = []
+        self._pin_pendientes = []
+        self.desconectado = False
+
+        @self.sio.on('camera_frame')
+        def on_frame(datos):
+            ahora = time.monotonic()
+            if self.ultimo_frame is not None:
+                self.huecos.append((ahora - self.ultimo_frame) * 1000)
+            self.ultimo_frame = ahora
+            self.frames += 1
+            self.bytes += len(datos) if isinstance(datos, (bytes, bytearray)) else len(str(datos))
+            return True  # ack: el servidor espera la confirmación para mandar el siguiente
+
+        @self.sio.on('camera_meta')
+        def on_meta(datos):
+            if 'timestamp' in datos:
+                self.meta_ms.append((time.time() - datos['timestamp']) * 1000)
+            return True  # En modo mjpeg el hub espera este ack para mandar los siguientes
+
+        @self.sio.on('status_update')
+        def on_status(datos):
+            if self._status_pendientes:
+                self.status_ms.append((time.monotonic() - self._status_pendientes.pop(0)) * 1000)
+
+        @self.sio.on('user_found_by_pin')
+        def on_pin(datos):
+            if self._pin_pendientes:
+                self.pin_ms.append((time.monotonic() - self._pin_pendientes.pop(0)) * 1000)
+            if datos.get('success'):
+                clave = 'encontrado'
+            elif 'Demasiados' in datos.get('message', ''):
+                clave = 'bloqueado'
+            else:
+                clave = 'no_encontrado'
+            self.pin_respuestas[clave] = self.pin_respuestas.get(clave, 0) + 1
+
+        @self.sio.on('disconnect')
+        def on_disconnect(*_):
+            self.desconectado = True
+
+    async def conectar(self):
+        consulta = f"fps={self.args.fps}&res={self.args.res}"
+        inicio = time.monotonic()
+        await self.sio.connect(f"{self.args.url}?{consulta}", transports=['websocket'],
+                               wait_timeout=10)
+        return (time.monotonic() - inicio) * 1000
+
+    async def correr(self, fin):
+        # Desfasar a los clientes como si hubieran abierto la página en momentos distintos
+        proximo_status = time.monotonic() + random.uniform(0, self.args.intervalo_status)
+        proximo_pin = time.monotonic() + random.expovariate(1 / self.args.intervalo_pin)
+        while time.monotonic() < fin and not self.desconectado:
+            ahora = time.monotonic()
+            if ahora >= proximo_status:
+                self._status_pendientes.append(ahora)
+                await self.sio.emit('request_status')
+                proximo_status += self.args.intervalo_status
+            if ahora >= proximo_pin:
+                if self.args.pines and random.random() < 0.5:
+                    pin = random.choice(self.args.pines)
+                else:
+                    pin = f"{random.randint(0, 999999):06d}"
+                self._pin_pendientes.append(ahora)
+                await self.sio.emit('search_user_by_pin', {'pin': pin})
+                proximo_pin = ahora + random.expovariate(1 / self.args.intervalo_pin)
+            await asyncio.sleep(min(proximo_status, proximo_pin, fin) - time.monotonic())
+
+    async def cerrar(self):
+        try:
+            await self.sio.disconnect()
+        except Exception:
+            pass
+
+
+async def _escalon(args, n, segundos):
+    clientes = [ClienteVista(args) for _ in range(n)]
+    conexiones = []
+    fallidos = 0
+    for cliente in clientes:
+        try:
+            conexiones.append(await cliente.conectar())
+        except Exception:
+            fallidos += 1
+        await asyncio.sleep(1 / args.rampa)
+
+    conectados = [c for c in clientes if c.sio.connected]
+    inicio = time.monotonic()
+    for c in conectados:
+        c.frames, c.bytes, c.huecos, c.ultimo_frame = 0, 0, [], None
+    await asyncio.gather(*(c.correr(inicio + segundos) for c in conectados))
+    duracion = time.monotonic() - inicio
+    await asyncio.gather(*(c.cerrar() for c in clientes))
+
+    respuestas = {}
+    for c in conectados:
+        for clave, v in c.pin_respuestas.items():
+            respuestas[clave] = respuestas.get(clave, 0) + v
+    return {
+        'conexion_ms': conexiones,
+        'fallidos': fallidos,
+        'caidos': sum(c.desconectado for c in conectados),
+        'fps': [c.frames / duracion for c in conectados],
+        'kb_s': sum(c.bytes for c in conectados) / duracion / 1024,
+        'huecos': [h for c in conectados for h in c.huecos],
+        'meta_ms': [m for c in conectados for m in c.meta_ms],
+        'status_ms': [s for c in conectados for s in c.status_ms],
+        'pin_ms': [p for c in conectados for p in c.pin_ms],
+        'pin_respuestas': respuestas
+    }
+
+
+def _trabajador(args, n, segundos, resultados):
+    resultados.put(asyncio.run(_escalon(args, n, segundos)))
+
+
+def proceso_servidor(args):
+    """El proceso del backend, por --pid o buscando app.py en la línea de comandos"""
+    if args.pid:
+        return psutil.Process(args.pid)
+    for p in psutil.process_iter(['cmdline']):
+        if any(parte.endswith('app.py') for parte in (p.info['cmdline'] or [])):
+            return p
+    return None
+
+
+def metricas_servidor(url):
+    """p95 de las etapas de emisión desde /api/metrics (si METRICS está activo)"""
+    try:
+        with urllib.request.urlopen(f"{url}/api/metrics", timeout=5) as respuesta:
+            etapas = json.load(respuesta).get('etapas', {})
+        return {f"servidor_{e}_p95_ms": etapas[e]['p95_ms']
+                for e in ('emision_frame', 'emision_meta', 'jpeg') if e in etapas}
+    except Exception:
+        return {}
+
+
+def correr_escalon(args, n, servidor):
+    """Reparte `n` clientes en procesos y muestrea el servidor mientras corren"""
+    procesos = min(args.procesos, n)
+    cola = multiprocessing.Queue()
+    hijos = [
+        multiprocessing.Process(target=_trabajador,
+                                args=(args, n // procesos + (i < n % procesos), args.segundos, cola))
+        for i in range(procesos)
+    ]
+    for h in hijos:
+        h.start()
+
+    cpu = []
+    if servidor:
+        servidor.cpu_percent()
+    limite = time.monotonic() + args.segundos + n / args.rampa + 30
+    partes = []
+    while len(partes) < procesos and time.monotonic() < limite:
+        if servidor:
+            cpu.append(servidor.cpu_percent())
+        try:
+            partes.append(cola.get(timeout=1.0))
+        except Exception:
+            pass
+    for h in hijos:
+        h.join(timeout=5)
+
+    fps = [f for p in partes for f in p['fps']]
+    respuestas = {}
+    for p in partes:
+        for clave, v in p['pin_respuestas'].items():
+            respuestas[clave] = respuestas.get(clave, 0) + v
+
+    # El primer muestreo del servidor incluye la rampa de conexión
+    cpu = cpu[1:] or cpu
+    resultado = {
+        'clientes': n,
+        'conectados': len(fps),
+        'fallidos': sum(p['fallidos'] for p in partes),
+        'caidos': sum(p['caidos'] for p in partes),
+        'conexion_p95_ms': percentil([c for p in partes for c in p['conexion_ms']], 0.95),
+        'fps_min': round(min(fps), 2) if fps else None,
+        'fps_p50': percentil(fps, 0.5),
+        'fps_media': round(sum(fps) / len(fps), 2) if fps else None,
+        'hueco_p95_ms': percentil([h for p in partes for h in p['huecos']], 0.95),
+        'kb_s_total': round(sum(p['kb_s'] for p in partes), 1),
+        'meta_p50_ms': percentil([m for p in partes for m in p['meta_ms']], 0.5),
+        'meta_p95_ms': percentil([m for p in partes for m in p['meta_ms']], 0.95),
+        'status_p50_ms': percentil([s for p in partes for s in p['status_ms']], 0.5),
+        'status_p95_ms': percentil([s for p in partes for s in p['status_ms']], 0.95),
+        'pin_p95_ms': percentil([x for p in partes for x in p['pin_ms']], 0.95),
+        'pin_respuestas': respuestas,
+        'servidor_cpu_pct': round(sum(cpu) / len(cpu), 1) if cpu else None,
+        'servidor_cpu_max_pct': max(cpu) if cpu else None,
+    }
+    if servidor:
+        resultado['servidor_rss_mb'] = round(servidor.memory_info().rss / 2 ** 20, 1)
+        resultado['servidor_hilos'] = servidor.num_threads()
+    resultado.update(metricas_servidor(args.url))
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://localhost:5000')
+    parser.add_argument('--clientes', default='10,50,100,200', help='Escalones de clientes simultáneos')
+    parser.add_argument('--segundos', type=float, default=30.0, help='Duración de cada escalón')
+    parser.add_argument('--rampa', type=float, default=20.0, help='Conexiones nuevas por segundo')
+    parser.add_argument('--fps', default='15', help='?fps= de cada cliente')
+    parser.add_argument('--res', default='alta', choices=('alta', 'media', 'baja'))
+    parser.add_argument('--intervalo-status', type=float, default=30.0,
+                        help='s entre request_status (app.js usa 30)')
+    parser.add_argument('--intervalo-pin', type=float, default=60.0,
+                        help='s promedio entre búsquedas de PIN por cliente')
+    parser.add_argument('--pines', type=lambda s: s.split(','), default=[],
+                        help='PINs válidos separados por coma (la mitad de las búsquedas)')
+    parser.add_argument('--procesos', type=int, default=max(multiprocessing.cpu_count() // 2, 1))
+    parser.add_argument('--pid', type=int, help='PID del servidor (si no, se busca app.py)')
+    parser.add_argument('--json', help='Guardar los resultados en este archivo')
+    args = parser.parse_args()
+
+    servidor = proceso_servidor(args)
+    if servidor is None:
+        print("⚠️ No se encontró el proceso del servidor: sin CPU/RSS")
+
+    resultados = []
+    for n in (int(x) for x in args.clientes.split(',')):
+        r = correr_escalon(args, n, servidor)
+        resultados.append(r)
+        print(f"\n== {n} clientes ({r['conectados']} conectados, {r['fallidos']} fallidos, "
+              f"{r['caidos']} caídos) ==")
+        for clave, valor in r.items():
+            if clave not in ('clientes', 'conectados', 'fallidos', 'caidos') and valor is not None:
+                print(f"  {clave:26s} {valor}")
+        time.sleep(2)  # Dejar que el servidor libere las sesiones anteriores
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(resultados, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
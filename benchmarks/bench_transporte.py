@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark del transporte de la vista previa: JPEG binario vs data URL base64
+
+Uso:
+    python benchmarks/bench_transporte.py [--video ruta.mp4] [--frames 300]
+"""
+import argparse
+import base64
+import json
+import time
+
+import cv2
+import numpy as np
+
+
+def cargar_frames(video, n):
+    """Frames de un video grabado o, si no hay, frames sintéticos de 640x480"""
+    frames = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < n:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+
+    if not frames:
+        rng = np.random.default_rng(0)
+        base = rng.integers(0, 255, (480, 640, 3), dtype=np.uint8)
+        base = cv2.GaussianBlur(base, (31, 31), 0)
+        frames = [np.roll(base, i * 4, axis=1) for i in range(n)]
+
+    return frames
+
+
+def medir(frames, calidad):
+    binario = {'bytes': 0, 'segundos': 0.0}
+    legado = {'bytes': 0, 'segundos': 0.0}
+
+    for frame in frames:
+        t0 = time.perf_counter()
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, calidad])
+        jpeg = buffer.tobytes()
+        t1 = time.perf_counter()
+
+        # Transporte legado: base64 + data URL dentro de JSON
+        data_url = f"data:image/jpeg;base64,{base64.b64encode(jpeg).decode('utf-8')}"
+        payload = json.dumps({'frame': data_url, 'fps': 15.0, 'progreso': 0})
+        t2 = time.perf_counter()
+
+        binario['bytes'] += len(jpeg)
+        binario['segundos'] += t1 - t0
+        legado['bytes'] += len(payload)
+        legado['segundos'] += t2 - t0
+
+    return binario, legado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--video', help='Video o dispositivo para cv2.VideoCapture')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--calidad', type=int, default=80)
+    args = parser.parse_args()
+
+    frames = cargar_frames(args.video, args.frames)
+    binario, legado = medir(frames, args.calidad)
+    n = len(frames)
+
+    print(f"Frames: {n}")
+    for nombre, r in (('binario', binario), ('base64', legado)):
+        print(f"  {nombre:8s} {r['bytes'] / n / 1024:8.1f} KB/frame  "
+              f"{r['segundos'] / n * 1000:6.2f} ms/frame")
+    print(f"Ahorro en el cable: {(1 - binario['bytes'] / legado['bytes']) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""
+Sustitutos en proceso del hardware y la nube para correr backend/app.py sin ellos
+
+- Lector PC/SC (`smartcard`): un lector con tarjetas que el escenario acerca y retira.
+- Cliente paho (`paho.mqtt.client`): conecta al instante y permite inyectar mensajes.
+- `firebase_admin.db`: árbol en memoria con get/set/update multi-ruta (incluido
+  `{".sv": {"increment": n}}`), consultas por hijo y listeners, con latencia opcional.
+- Cámara: `cv2.VideoCapture` sobre un video o un directorio de imágenes, a ritmo de cámara.
+
+`instalar()` registra los módulos falsos en `sys.modules`; debe llamarse antes de
+importar `app`.
+"""
+import copy
+import os
+import queue
+import sys
+import threading
+import time
+import types
+
+
+# ---------- smartcard ----------
+class NoCardException(Exception):
+    pass
+
+
+class CardConnectionException(Exception):
+    pass
+
+
+class TarjeteroSimulado:
+    """Lo que "ve" el lector: una tarjeta a la vez, presente durante un rato"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._uid = None
+        self._hasta = 0.0
+        self.lecturas = 0
+
+    def presentar(self, uid_hex, segundos=1.0):
+        with self._lock:
+            self._uid = uid_hex
+            self._hasta = time.monotonic() + segundos
+
+    def actual(self):
+        with self._lock:
+            if self._uid and time.monotonic() < self._hasta:
+                return self._uid
+            return None
+
+
+class _ConexionSimulada:
+    def __init__(self, tarjetero, latencia):
+        self._tarjetero = tarjetero
+        self._latencia = latencia
+
+    def connect(self):
+        if self._tarjetero.actual() is None:
+            raise NoCardException("sin tarjeta")
+
+    def transmit(self, apdu):
+        time.sleep(self._latencia)
+        uid = self._tarjetero.actual()
+        if uid is None:
+            raise CardConnectionException("tarjeta retirada")
+        self._tarjetero.lecturas += 1
+        return list(bytes.fromhex(uid)), 0x90, 0x00
+
+
+class _LectorSimulado:
+    def __init__(self, tarjetero, latencia):
+        self._tarjetero = tarjetero
+        self._latencia = latencia
+
+    def createConnection(self):
+        return _ConexionSimulada(self._tarjetero, self._latencia)
+
+    def __str__(self):
+        return "Lector simulado PC/SC"
+
+
+# ---------- paho ----------
+class _Mensaje:
+    __slots__ = ('topic', 'payload', 'qos')
+
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+        self.qos = 0
+
+
+class ClienteMqttSimulado:
+    """Misma interfaz que usa app.py; los mensajes se entregan en un hilo de "red" propio"""
+
+    instancias = []
+
+    def __init__(self, *args, **kwargs):
+        self.on_connect = None
+        self.on_message = None
+        self.publicados = []
+        self._entrada = queue.SimpleQueue()
+        ClienteMqttSimulado.instancias.append(self)
+
+    def username_pw_set(self, *args, **kwargs):
+        pass
+
+    def tls_set(self, *args, **kwargs):
+        pass
+
+    def tls_insecure_set(self, *args, **kwargs):
+        pass
+
+    def connect(self, *args, **kwargs):
+        return 0
+
+    def connect_async(self, *args, **kwargs):
+        pass
+
+    def loop_start(self):
+        threading.Thread(target=self._loop, name='paho-simulado', daemon=True).start()
+        if self.on_connect:
+            self.on_connect(self, None, {}, 0, None)
+
+    def loop_stop(self):
+        self._entrada.put(None)
+
+    def disconnect(self):
+        pass
+
+    def subscribe(self, topic, qos=0):
+        return 0, 1
+
+    def publish(self, topic, payload=None, qos=0, retain=False):
+        self.publicados.append((time.monotonic(), topic, payload))
+
+    def inyectar(self, topic, payload):
+        """Simula un mensaje recibido del broker"""
+        self._entrada.put(_Mensaje(topic, payload))
+
+    def _loop(self):
+        while True:
+            msg = self._entrada.get()
+            if msg is None:
+                return
+            if self.on_message:
+                self.on_message(self, None, msg)
+
+
+# ---------- firebase_admin.db ----------
+def _partes(ruta):
+    return [p for p in (ruta or '').split('/') if p]
+
+
+class _Evento:
+    def __init__(self, event_type, path, data):
+        self.event_type = event_type
+        self.path = path
+        self.data = data
+
+
+class _Registro:
+    def __init__(self, base, ruta, callback):
+        self._base = base
+        self.ruta = ruta
+        self.callback = callback
+
+    def close(self):
+        self._base.quitar_listener(self)
+
+
+class BaseSimulada:
+    """Realtime Database en memoria compartida por todas las referencias"""
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self.raiz = {}
+        self.llamadas = 0
+        self._lock = threading.RLock()
+        self._listeners = []
+
+    def _esperar(self):
+        self.llamadas += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def leer(self, ruta):
+        self._esperar()
+        with self._lock:
+            nodo = self.raiz
+            for parte in _partes(ruta):
+                if not isinstance(nodo, dict) or parte not in nodo:
+                    return None
+                nodo = nodo[parte]
+            return copy.deepcopy(nodo)
+
+    def _escribir_uno(self, ruta, valor):
+        partes = _partes(ruta)
+        if not partes:
+            self.raiz = valor if isinstance(valor, dict) else {}
+            return
+        nodo = self.raiz
+        for parte in partes[:-1]:
+            if not isinstance(nodo.get(parte), dict):
+                nodo[parte] = {}
+            nodo = nodo[parte]
+        hoja = partes[-1]
+        if isinstance(valor, dict) and isinstance(valor.get('.sv'), dict) and 'increment' in valor['.sv']:
+            actual = nodo.get(hoja)
+            valor = (actual if isinstance(actual, (int, float)) else 0) + valor['.sv']['increment']
+        if valor is None:
+            nodo.pop(hoja, None)
+        else:
+            nodo[hoja] = copy.deepcopy(valor)
+
+    def escribir(self, cambios, base='', tipo='put'):
+        """Actualización multi-ruta atómica: {ruta relativa a `base`: valor}"""
+        self._esperar()
+        with self._lock:
+            rutas = []
+            for ruta, valor in cambios.items():
+                completa = '/'.join(_partes(base) + _partes(ruta))
+                self._escribir_uno(completa, valor)
+                rutas.append(completa)
+            self._notificar(rutas, tipo)
+
+    def agregar_listener(self, ruta, callback):
+        registro = _Registro(self, ruta, callback)
+        with self._lock:
+            self._listeners.append(registro)
+            inicial = self.leer(ruta)
+        callback(_Evento('put', '/', inicial))
+        return registro
+
+    def quitar_listener(self, registro):
+        with self._lock:
+            if registro in self._listeners:
+                self._listeners.remove(registro)
+
+    def _valor(self, partes):
+        nodo = self.raiz
+        for parte in partes:
+            nodo = nodo.get(parte) if isinstance(nodo, dict) else None
+        return copy.deepcopy(nodo)
+
+    def _notificar(self, rutas, tipo='put'):
+        """Como el SDK: un `set` llega como 'put' por ruta; un `update` como un solo
+        'patch' en la raíz del listener con claves multi-segmento ("A/usuario_puntos")"""
+        for registro in list(self._listeners):
+            base = _partes(registro.ruta)
+            debajo = [_partes(ruta) for ruta in rutas if _partes(ruta)[:len(base)] == base]
+            if not debajo:
+                continue
+            if tipo == 'patch':
+                registro.callback(_Evento('patch', '/', {
+                    '/'.join(partes[len(base):]): self._valor(partes) for partes in debajo
+                }))
+                continue
+            for partes in debajo:
+                registro.callback(_Evento('put', '/' + '/'.join(partes[len(base):]), self._valor(partes)))
+
+
+class ReferenciaSimulada:
+    def __init__(self, base, ruta='/'):
+        self._base = base
+        self.path = '/' + '/'.join(_partes(ruta))
+        self._orden = None
+        self._igual = None
+        self._limite = None
+
+    def child(self, ruta):
+        return ReferenciaSimulada(self._base, f"{self.path}/{ruta}")
+
+    def get(self):
+        datos = self._base.leer(self.path)
+        if self._orden is None or not isinstance(datos, dict):
+            return datos
+        encontrados = {k: v for k, v in datos.items()
+                       if isinstance(v, dict) and v.get(self._orden) == self._igual}
+        if self._limite:
+            encontrados = dict(list(encontrados.items())[:self._limite])
+        return encontrados
+
+    def set(self, valor):
+        self._base.escribir({self.path: valor})
+
+    def update(self, cambios):
+        self._base.escribir(cambios, base=self.path, tipo='patch')
+
+    def delete(self):
+        self._base.escribir({self.path: None})
+
+    def listen(self, callback):
+        return self._base.agregar_listener(self.path, callback)
+
+    def order_by_child(self, hijo):
+        ref = ReferenciaSimulada(self._base, self.path)
+        ref._orden = hijo
+        return ref
+
+    def equal_to(self, valor):
+        self._igual = valor
+        return self
+
+    def limit_to_first(self, n):
+        self._limite = n
+        return self
+
+
+# ---------- Cámara ----------
+class CamaraSimulada:
+    """`cv2.VideoCapture` sobre frames en memoria que avanzan a `fps` por segundo"""
+
+    def __init__(self, frames, fps=30.0):
+        self._frames = frames
+        self._fps = fps
+        self._inicio = None
+        self._indice = -1
+        self._abierta = bool(frames)
+
+    def isOpened(self):
+        return self._abierta
+
+    def set(self, *args):
+        return True
+
+    def get(self, *args):
+        return 0
+
+    def grab(self):
+        if not self._abierta:
+            return False
+        ahora = time.monotonic()
+        if self._inicio is None:
+            self._inicio = ahora
+        # Como una cámara real: grab() espera al siguiente frame del sensor
+        siguiente = int((ahora - self._inicio) * self._fps) + 1
+        espera = self._inicio + siguiente / self._fps - ahora
+        if espera > 0:
+            time.sleep(espera)
+        self._indice = siguiente
+        return True
+
+    def retrieve(self):
+        frame = self._frames[self._indice % len(self._frames)]
+        return True, frame.copy()
+
+    def read(self):
+        return self.retrieve() if self.grab() else (False, None)
+
+    def release(self):
+        self._abierta = False
+
+
+def cargar_frames(fuente, maximo=300, ancho=640, alto=480):
+    """Frames de un video, de un directorio de imágenes o, sin fuente, sintéticos en movimiento"""
+    import cv2
+    import numpy as np
+
+    frames = []
+    if fuente and os.path.isdir(fuente):
+        for nombre in sorted(os.listdir(fuente))[:maximo]:
+            frame = cv2.imread(os.path.join(fuente, nombre))
+            if frame is not None:
+                frames.append(cv2.resize(frame, (ancho, alto)))
+    elif fuente:
+        cap = cv2.VideoCapture(fuente)
+        while len(frames) < maximo:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(cv2.resize(frame, (ancho, alto)))
+        cap.release()
+
+    if not frames:
+        rng = np.random.default_rng(0)
+        base = cv2.GaussianBlur(rng.integers(0, 255, (alto, ancho, 3), dtype=np.uint8), (31, 31), 0)
+        frames = [np.roll(base, i * 4, axis=1) for i in range(min(maximo, 120))]
+    return frames
+
+
+class DetectorSimulado:
+    """Sustituto del modelo: tarda `latencia` y detecta `clase` mientras `activo` sea True"""
+
+    def __init__(self, latencia=0.08, clase='plastico'):
+        self.latencia = latencia
+        self.clase = clase
+        self.activo = True
+        self.conf = 0.5
+        self.imgsz = 320
+
+    def ajustar(self, conf=None, imgsz=None):
+        if conf is not None:
+            self.conf = conf
+        if imgsz is not None:
+            self.imgsz = imgsz
+
+    def detectar(self, frame):
+        time.sleep(self.latencia)
+        if not self.activo:
+            return []
+        alto, ancho = frame.shape[:2]
+        return [(self.clase, (ancho // 4, alto // 4, ancho * 3 // 4, alto * 3 // 4), 0.92)]
+
+
+# ---------- Instalación ----------
+def instalar(tarjetero, base, latencia_nfc=0.01):
+    """Registra smartcard, paho y firebase_admin falsos en sys.modules"""
+    smartcard = types.ModuleType('smartcard')
+    sistema = types.ModuleType('smartcard.System')
+    sistema.readers = lambda: [_LectorSimulado(tarjetero, latencia_nfc)]
+    excepciones = types.ModuleType('smartcard.Exceptions')
+    excepciones.NoCardException = NoCardException
+    excepciones.CardConnectionException = CardConnectionException
+    smartcard.System = sistema
+    smartcard.Exceptions = excepciones
+
+    paho = types.ModuleType('paho')
+    paho_mqtt = types.ModuleType('paho.mqtt')
+    cliente = types.ModuleType('paho.mqtt.client')
+    cliente.Client = ClienteMqttSimulado
+    cliente.CallbackAPIVersion = types.SimpleNamespace(VERSION1=1, VERSION2=2)
+    paho.mqtt = paho_mqtt
+    paho_mqtt.client = cliente
+
+    firebase_admin = types.ModuleType('firebase_admin')
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    credenciales = types.ModuleType('firebase_admin.credentials')
+    credenciales.Certificate = lambda ruta: ruta
+    db = types.ModuleType('firebase_admin.db')
+    db.reference = lambda ruta='/': ReferenciaSimulada(base, ruta)
+    firebase_admin.credentials = credenciales
+    firebase_admin.db = db
+
+    sys.modules.update({
+        'smartcard': smartcard, 'smartcard.System': sistema, 'smartcard.Exceptions': excepciones,
+        'paho': paho, 'paho.mqtt': paho_mqtt, 'paho.mqtt.client': cliente,
+        'firebase_admin': firebase_admin, 'firebase_admin.credentials': credenciales,
+        'firebase_admin.db': db
+    })
@@ -3,9 +3,14 @@
 Configuración centralizada para la aplicación de reciclaje inteligente
 """
 
+import logging
 import os
+import threading
+import time
 from pathlib import Path
 
+logger = logging.getLogger(__name__)
+
 # Rutas base
 BASE_DIR = Path(__file__).parent.parent
 CONFIG_DIR = BASE_DIR / "config"
@@ -13,6 +18,23 @@ FRONTEND_DIR = BASE_DIR / "frontend"
 BACKEND_DIR = BASE_DIR / "backend"
 MODELO_DIR = BASE_DIR / "modelo"
 
+
+def leer_env(ruta):
+    """Lee un archivo CLAVE=valor (comentarios con #); {} si no existe"""
+    valores = {}
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            for linea in f:
+                linea = linea.strip()
+                if not linea or linea.startswith('#') or '=' not in linea:
+                    continue
+                clave, valor = linea.split('=', 1)
+                valores[clave.strip()] = valor.strip().strip('"').strip("'")
+    except OSError:
+        pass
+    return valores
+
+
 class Config:
     """Configuración base"""
     
@@ -49,6 +71,10 @@ class Config:
     CAMERA_HEIGHT = int(os.getenv('CAMERA_HEIGHT', 480))
     CAMERA_FPS = int(os.getenv('CAMERA_FPS', 30))
     
+    # Vista previa: tamaño de la pantalla del kiosco (0 = resolución de la cámara)
+    PREVIEW_WIDTH = int(os.getenv('PREVIEW_WIDTH', 320))
+    PREVIEW_HEIGHT = int(os.getenv('PREVIEW_HEIGHT', 480))
+    
     # YOLO
     YOLO_MODEL_PATH = os.getenv('YOLO_MODEL_PATH', str(MODELO_DIR / 'best.onnx'))
     YOLO_CONFIDENCE = float(os.getenv('YOLO_CONFIDENCE', 0.5))
@@ -63,11 +89,18 @@ class Config:
     NFC_TIMEOUT = float(os.getenv('NFC_TIMEOUT', 0.5))
     
     # Puntos por material
-    PUNTOS_PLASTICO = int(os.getenv('PUNTOS_PLASTICO', 20))
-    PUNTOS_ALUMINIO = int(os.getenv('PUNTOS_ALUMINIO', 30))
+    PUNTOS_PLASTICO = int(os.getenv('PUNTOS_PLASTICO', 3))
+    PUNTOS_ALUMINIO = int(os.getenv('PUNTOS_ALUMINIO', 4))
+    
+    # Rendimiento (ajustables en caliente, ver LiveConfig)
+    PREVIEW_FPS = int(os.getenv('PREVIEW_FPS', 15))
+    JPEG_QUALITY = int(os.getenv('JPEG_QUALITY', 80))
+    INFERENCE_STRIDE = int(os.getenv('INFERENCE_STRIDE', 1))
     
-    # WebSocket
-    WEBSOCKET_ASYNC_MODE = os.getenv('WEBSOCKET_ASYNC_MODE', 'threading')
+    # WebSocket: 'threading' (Werkzeug) o servidor cooperativo 'eventlet' / 'gevent'.
+    # Se elige al arrancar: variable de entorno o, si no está, environment.env
+    WEBSOCKET_ASYNC_MODE = os.getenv('WEBSOCKET_ASYNC_MODE') or leer_env(
+        CONFIG_DIR / 'environment.env').get('WEBSOCKET_ASYNC_MODE', 'threading')
     WEBSOCKET_CORS_ORIGINS = os.getenv('WEBSOCKET_CORS_ORIGINS', '*')
     
     # Logging
@@ -143,6 +176,164 @@ def get_config(config_name=None):
     
     return config_map.get(config_name, ProductionConfig)
 
+# Ajustes que se pueden cambiar con el kiosco andando: tipo, mínimo y máximo
+AJUSTES_EN_VIVO = {
+    'YOLO_CONFIDENCE': (float, 0.05, 0.99),
+    'YOLO_IMG_SIZE': (int, 128, 1280),
+    'INFERENCE_STRIDE': (int, 1, 10),
+    'CAMERA_FPS': (int, 1, 60),
+    'PREVIEW_FPS': (int, 1, 30),
+    'JPEG_QUALITY': (int, 30, 95),
+    'DETECTION_TIME_THRESHOLD': (float, 0.5, 60.0),
+    'PUNTOS_PLASTICO': (int, 0, 1000),
+    'PUNTOS_ALUMINIO': (int, 0, 1000),
+}
+
+# Los puntos son reglas de negocio: se cambian en el archivo, no por HTTP
+AJUSTES_SOLO_ARCHIVO = {'PUNTOS_PLASTICO', 'PUNTOS_ALUMINIO'}
+
+
+def convertir_ajuste(clave, valor):
+    """Valida y convierte un ajuste en vivo; ValueError si no corresponde"""
+    if clave not in AJUSTES_EN_VIVO:
+        raise ValueError(f"{clave} no se puede ajustar en caliente")
+    tipo, minimo, maximo = AJUSTES_EN_VIVO[clave]
+    try:
+        convertido = tipo(float(valor)) if tipo is int else tipo(valor)
+    except (TypeError, ValueError):
+        raise ValueError(f"{clave}: {valor!r} no es {tipo.__name__}")
+    if not minimo <= convertido <= maximo:
+        raise ValueError(f"{clave}: {convertido} fuera de rango ({minimo} a {maximo})")
+    if clave == 'YOLO_IMG_SIZE' and convertido % 32:
+        raise ValueError(f"{clave}: {convertido} no es múltiplo de 32")
+    return convertido
+
+
+class LiveConfig:
+    """Ajustes de rendimiento y de negocio que cambian sin reiniciar.
+
+    Cada valor sale, de menor a mayor prioridad, del default de `Config`,
+    del archivo `config/environment.env`, de la variable de entorno del
+    proceso y de lo fijado por `actualizar()` (endpoint de administración).
+    `vigilar()` relee el archivo cuando cambia su fecha de modificación.
+    Los suscriptores reciben `{clave: valor}` solo con lo que cambió; los
+    valores se leen como atributos (`ajustes.JPEG_QUALITY`).
+    """
+
+    def __init__(self, ruta=None, entorno=None):
+        self.ruta = Path(ruta) if ruta else CONFIG_DIR / 'environment.env'
+        entorno = os.environ if entorno is None else entorno
+        self._entorno = {c: entorno[c] for c in AJUSTES_EN_VIVO if c in entorno}
+        self._fijados = {}
+        self._suscriptores = []
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._activo = False
+        self.recargas = 0
+        self.ultimo_error = None
+        self._valores = {clave: getattr(Config, clave) for clave in AJUSTES_EN_VIVO}
+        self._recalcular(self._leer_archivo())
+
+    def __getattr__(self, clave):
+        try:
+            return self.__dict__['_valores'][clave]
+        except KeyError:
+            raise AttributeError(clave)
+
+    def _leer_archivo(self):
+        try:
+            self._mtime = self.ruta.stat().st_mtime
+        except OSError:
+            self._mtime = None
+        return {c: v for c, v in leer_env(self.ruta).items() if c in AJUSTES_EN_VIVO}
+
+    def _recalcular(self, archivo):
+        """Combina las fuentes; devuelve lo que cambió respecto de los valores actuales"""
+        valores = {clave: getattr(Config, clave) for clave in AJUSTES_EN_VIVO}
+        errores = []
+        for fuente in (archivo, self._entorno, self._fijados):
+            for clave, valor in fuente.items():
+                try:
+                    valores[clave] = convertir_ajuste(clave, valor)
+                except ValueError as e:
+                    errores.append(str(e))
+        self.ultimo_error = '; '.join(errores) or None
+        for error in errores:
+            logger.warning(f"[CONFIG] ⚠️ {error}")
+
+        with self._lock:
+            cambios = {c: v for c, v in valores.items() if self._valores.get(c) != v}
+            self._valores = valores  # Se reemplaza completo: los lectores ven uno u otro
+        return cambios
+
+    def _notificar(self, cambios, origen):
+        if not cambios:
+            return
+        self.recargas += 1
+        logger.info(f"[CONFIG] 🔄 Ajustes desde {origen}: {cambios}")
+        for fn in list(self._suscriptores):
+            try:
+                fn(cambios)
+            except Exception as e:
+                logger.error(f"[CONFIG] ❌ Error aplicando {cambios}: {e}")
+
+    def suscribir(self, fn):
+        self._suscriptores.append(fn)
+
+    def recargar(self):
+        """Relee el archivo y aplica lo que cambió"""
+        cambios = self._recalcular(self._leer_archivo())
+        self._notificar(cambios, self.ruta.name)
+        return cambios
+
+    def actualizar(self, valores):
+        """Fija ajustes en tiempo de ejecución (None devuelve la clave a su fuente); todo o nada"""
+        convertidos = {}
+        for clave, valor in valores.items():
+            if clave in AJUSTES_SOLO_ARCHIVO:
+                raise ValueError(f"{clave} solo se cambia en {self.ruta.name}")
+            if valor is not None:
+                convertidos[clave] = convertir_ajuste(clave, valor)
+            elif clave not in AJUSTES_EN_VIVO:
+                raise ValueError(f"{clave} no se puede ajustar en caliente")
+            else:
+                convertidos[clave] = None
+        for clave, valor in convertidos.items():
+            if valor is None:
+                self._fijados.pop(clave, None)
+            else:
+                self._fijados[clave] = valor
+        cambios = self._recalcular(self._leer_archivo())
+        self._notificar(cambios, 'api')
+        return cambios
+
+    def _vigilar(self, periodo):
+        while self._activo:
+            time.sleep(periodo)
+            try:
+                mtime = self.ruta.stat().st_mtime
+            except OSError:
+                mtime = None
+            if mtime != self._mtime:
+                self.recargar()
+
+    def vigilar(self, periodo=2.0):
+        """Revisa el archivo cada `periodo` segundos en un hilo aparte"""
+        self._activo = True
+        threading.Thread(target=self._vigilar, args=(periodo,), name='config', daemon=True).start()
+
+    def stop(self):
+        self._activo = False
+
+    def snapshot(self):
+        return {
+            'valores': dict(self._valores),
+            'fijados': dict(self._fijados),
+            'archivo': str(self.ruta),
+            'recargas': self.recargas,
+            'ultimo_error': self.ultimo_error
+        }
+
 # Configuración de materiales
 MATERIAL_CONFIG = {
     'plastico': {
@@ -11,6 +11,10 @@ class ReciclajeApp {
         this.detectionTimeout = null;
         this.modalTimeout = null;
         this.nfcActive = false;
+        this.previewTransport = 'binary';
+        this.frameUrl = null;
+        this.frameAck = null;
+        this.overlayMode = 'servidor';
 
         // Referencias DOM
         this.elements = {
@@ -21,6 +25,7 @@ class ReciclajeApp {
 
             // Camera
             cameraFeed: document.getElementById('camera-feed'),
+            detectionCanvas: document.getElementById('detection-canvas'),
             fpsDisplay: document.getElementById('fps-display'),
             detectionInfo: document.getElementById('detection-info'),
             materialName: document.getElementById('material-name'),
@@ -80,7 +85,14 @@ class ReciclajeApp {
      */
     initSocket() {
         try {
+            // Vista previa por cliente: p. ej. http://IP:5000/?fps=2&res=baja
+            const params = new URLSearchParams(window.location.search);
+            const query = {};
+            if (params.get('fps')) query.fps = params.get('fps');
+            if (params.get('res')) query.res = params.get('res');
+
             this.socket = io({
+                query: query,
                 transports: ['websocket', 'polling'],
                 timeout: 5000,
                 reconnection: true,
@@ -126,13 +138,22 @@ class ReciclajeApp {
         // Estado inicial
         this.socket.on('initial_state', (data) => {
             console.log('📊 Estado inicial recibido:', data);
+            this.setPreviewTransport(data.preview_transport);
+            this.overlayMode = data.overlay_mode || 'servidor';
             this.updateAppState(data.app_state);
             this.hideLoading();
         });
 
-        // Frame de cámara
-        this.socket.on('camera_frame', (data) => {
-            this.updateCameraFrame(data);
+        // Frame de cámara (JPEG binario o data URL legado); se confirma al pintarlo
+        this.socket.on('camera_frame', (data, ack) => {
+            this.updateCameraFrame(data, ack);
+        });
+
+        // Metadatos de cámara (FPS, progreso de detección); en modo MJPEG llegan solos
+        // y se confirman aquí para recibir los siguientes
+        this.socket.on('camera_meta', (data, ack) => {
+            this.updateCameraMeta(data);
+            if (typeof ack === 'function') ack();
         });
 
         // Material detectado
@@ -226,6 +247,12 @@ class ReciclajeApp {
      * Vincular eventos DOM
      */
     bindEvents() {
+        // Confirmar cada frame cuando el navegador terminó de decodificarlo
+        if (this.elements.cameraFeed) {
+            this.elements.cameraFeed.addEventListener('load', () => this.ackFrame());
+            this.elements.cameraFeed.addEventListener('error', () => this.ackFrame());
+        }
+
         // Cerrar modales al hacer clic fuera
         document.addEventListener('click', (e) => {
             if (e.target.classList.contains('modal')) {
@@ -251,18 +278,68 @@ class ReciclajeApp {
         });
     }
 
+    /**
+     * Seleccionar transporte de la vista previa
+     */
+    setPreviewTransport(transport) {
+        this.previewTransport = transport || 'binary';
+
+        // En modo MJPEG el navegador decodifica el stream directamente
+        if (this.previewTransport === 'mjpeg' && this.elements.cameraFeed) {
+            this.elements.cameraFeed.src = '/video_feed';
+        }
+    }
+
     /**
      * Actualizar frame de cámara
      */
-    updateCameraFrame(data) {
-        if (this.elements.cameraFeed && data.frame) {
+    updateCameraFrame(data, ack) {
+        if (!this.elements.cameraFeed || !data) {
+            if (typeof ack === 'function') ack();
+            return;
+        }
+
+        // El servidor no envía el siguiente frame hasta recibir esta confirmación
+        this.ackFrame();
+        this.frameAck = typeof ack === 'function' ? ack : null;
+
+        if (data instanceof ArrayBuffer) {
+            // JPEG crudo: usar un object URL y liberar el anterior
+            const url = URL.createObjectURL(new Blob([data], { type: 'image/jpeg' }));
+            if (this.frameUrl) {
+                URL.revokeObjectURL(this.frameUrl);
+            }
+            this.frameUrl = url;
+            this.elements.cameraFeed.src = url;
+        } else if (data.frame) {
             this.elements.cameraFeed.src = data.frame;
         }
+    }
+
+    /**
+     * Confirmar al servidor el frame pendiente
+     */
+    ackFrame() {
+        if (this.frameAck) {
+            const ack = this.frameAck;
+            this.frameAck = null;
+            ack();
+        }
+    }
 
+    /**
+     * Actualizar metadatos de cámara
+     */
+    updateCameraMeta(data) {
         if (this.elements.fpsDisplay) {
             this.elements.fpsDisplay.textContent = `${data.fps} FPS`;
         }
 
+        // Cajas de detección dibujadas en el navegador
+        if (this.overlayMode === 'cliente') {
+            this.drawDetections(data.cajas || []);
+        }
+
         // Actualizar información de detección
         if (data.deteccion_activa) {
             this.showDetectionProgress(data.deteccion_activa, data.progreso);
@@ -274,6 +351,56 @@ class ReciclajeApp {
         this.updateCameraStatus(true);
     }
 
+    /**
+     * Dibujar cajas normalizadas (0-1) sobre el canvas, respetando object-fit: cover
+     */
+    drawDetections(cajas) {
+        const canvas = this.elements.detectionCanvas;
+        const img = this.elements.cameraFeed;
+        if (!canvas || !img) return;
+
+        const cw = canvas.clientWidth;
+        const ch = canvas.clientHeight;
+        if (canvas.width !== cw || canvas.height !== ch) {
+            canvas.width = cw;
+            canvas.height = ch;
+        }
+
+        const ctx = canvas.getContext('2d');
+        ctx.clearRect(0, 0, cw, ch);
+        if (!cajas.length || !img.naturalWidth) return;
+
+        const iw = img.naturalWidth;
+        const ih = img.naturalHeight;
+        const escala = Math.max(cw / iw, ch / ih);
+        const dx = (cw - iw * escala) / 2;
+        const dy = (ch - ih * escala) / 2;
+
+        ctx.lineWidth = 2;
+        ctx.font = '14px sans-serif';
+        ctx.textBaseline = 'bottom';
+
+        cajas.forEach(caja => {
+            const config = this.materialConfig[caja.clase];
+            const color = config ? config.color : '#00BCD4';
+            const x = dx + caja.x1 * iw * escala;
+            const y = dy + caja.y1 * ih * escala;
+            const w = (caja.x2 - caja.x1) * iw * escala;
+            const h = (caja.y2 - caja.y1) * ih * escala;
+            const etiqueta = `${caja.clase} ${caja.conf.toFixed(2)}`;
+
+            ctx.strokeStyle = color;
+            ctx.strokeRect(x, y, w, h);
+
+            const tw = ctx.measureText(etiqueta).width + 6;
+            const ty = Math.max(y, 18);
+            ctx.fillStyle = color;
+            ctx.fillRect(x, ty - 18, tw, 18);
+            ctx.fillStyle = '#ffffff';
+            ctx.fillText(etiqueta, x + 3, ty - 2);
+        });
+    }
+
     /**
      * Mostrar progreso de detección
      */